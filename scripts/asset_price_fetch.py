@@ -9,6 +9,8 @@ from pathlib import Path
 from datetime import datetime, timezone
 from ib_insync import Stock, IB, Future, Contract
 
+from atomic_io import write_csv
+
 
 TARGET_FOLDER = r"D:\TradingData"
 
@@ -124,7 +126,7 @@ async def main(data_type = 1):
         else:
             df = pd.DataFrame([row])
         
-        df.to_csv(csv_path, index=False)
+        write_csv(df, csv_path)
         print(f"✅  Added row for {row['date']} → {csv_path}")
         
         # define the daily‐only columns
@@ -134,7 +136,7 @@ async def main(data_type = 1):
         daily_df = pd.DataFrame([{k: row[k] for k in daily_cols}])
         
         daily_path = Path(r"D:\TradingData\ratios.csv")
-        daily_df.to_csv(daily_path, index=False)
+        write_csv(daily_df, daily_path)
         
         print(f"✅  Updated the csv file: {daily_path}")
         
@@ -0,0 +1,155 @@
+"""
+Reader-safe commits for the pipeline's output files.
+
+Every file the pipeline writes is read while it is being written: NinjaTrader
+polls the levels and GEX CSVs, the API tails metrics and regimes. Writers
+therefore never leave a half-written file where a reader can see it:
+
+    rewrite  the new content goes to a temp file in the same folder, is
+             fsynced and then swapped in with os.replace
+    append   the new rows go out in one write and are fsynced
+
+and after either, the writer publishes a commit record next to the file,
+`{name}.seq`, holding "<seq> <length>": a sequence number that goes up by one
+with every commit and the byte length of the committed content. The record is
+itself swapped in atomically.
+
+A reader that keeps the last `seq` it saw skips an unchanged file by reading
+a few bytes, and reads no further than `length`, so rows still being appended
+are never parsed. Files without a record (older data, other writers) are
+compared by mtime and size instead.
+
+    write_csv(df, path)                      # atomic rewrite + commit
+    with append_commit(path) as f: ...       # append + commit
+    seq, length = committed(path)
+"""
+
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+###############################################################################
+# 1.  Constants
+###############################################################################
+
+SEQ_SUFFIX = ".seq"
+REPLACE_RETRIES = 20     # Windows refuses os.replace while a reader holds the target open
+REPLACE_BACKOFF_S = 0.05
+
+
+###############################################################################
+# 2.  Commit records
+###############################################################################
+
+def seq_path(path) -> Path:
+    path = Path(path)
+    if path.is_dir():
+        return path / f"_commit{SEQ_SUFFIX}"
+    return path.with_name(path.name + SEQ_SUFFIX)
+
+
+def committed(path):
+    """(seq, length) last published for `path`, or None when it has no commit record"""
+    try:
+        seq, length = seq_path(path).read_text().split()
+        return int(seq), int(length)
+    except (OSError, ValueError):
+        return None
+
+
+def version(path):
+    """Cheap change token: the commit seq if published, else (mtime_ns, size); None if missing"""
+    record = committed(path)
+    if record is not None:
+        return record[0]
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def publish(path, length: int = None) -> int:
+    """Bump the commit record of `path` (length defaults to its current size); returns the new seq"""
+    path = Path(path)
+    previous = committed(path)
+    seq = previous[0] + 1 if previous else 1
+    if length is None:
+        length = 0 if path.is_dir() else path.stat().st_size
+    record = seq_path(path)
+    tmp = record.with_name(f"{record.name}.{uuid.uuid4().hex[:8]}.tmp")
+    tmp.write_text(f"{seq} {length}\n")
+    replace(tmp, record)
+    return seq
+
+
+def read_committed(path) -> bytes:
+    """The committed bytes of `path`: everything up to the published length, or the whole file"""
+    record = committed(path)
+    with open(path, "rb") as f:
+        return f.read() if record is None else f.read(record[1])
+
+
+###############################################################################
+# 3.  Writers
+###############################################################################
+
+def replace(src, dst):
+    """os.replace, retried while a reader on Windows still has `dst` open"""
+    for attempt in range(REPLACE_RETRIES):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if attempt == REPLACE_RETRIES - 1:
+                raise
+            time.sleep(REPLACE_BACKOFF_S)
+
+
+@contextmanager
+def atomic_open(path, mode: str = "w", **kwargs):
+    """
+    Open a temp file next to `path`; on a clean exit it is fsynced, swapped in
+    for `path` and committed. On an exception `path` is left untouched.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(tmp, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    publish(path)
+
+
+@contextmanager
+def append_commit(path, mode: str = "a", **kwargs):
+    """Open `path` for appending; on a clean exit the new bytes are fsynced and committed"""
+    path = Path(path)
+    with open(path, mode, **kwargs) as f:
+        yield f
+        f.flush()
+        os.fsync(f.fileno())
+    publish(path)
+
+
+def write_csv(df, path, **to_csv_kwargs):
+    """df.to_csv(path), committed atomically"""
+    to_csv_kwargs.setdefault("index", False)
+    with atomic_open(path, "w", newline="", encoding="utf-8") as f:
+        df.to_csv(f, **to_csv_kwargs)
+
+
+def append_csv(df, path, **to_csv_kwargs):
+    """Append the rows of `df` (no header) in one write, then commit"""
+    to_csv_kwargs.setdefault("index", False)
+    text = df.to_csv(header=False, **to_csv_kwargs)
+    with append_commit(path, "a", newline="", encoding="utf-8") as f:
+        f.write(text)
@@ -4,6 +4,12 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
+from day_store import get_day_store, STORES, BASE_DIR
+
+# regimes columns the labelling and scoring read; everything else is left on disk
+REGIME_COLUMNS = ["timestamp", "spot", "pin_anchor", "pin_band_pts", "in_pin_band",
+                  "compression_score", "breakout_ok", "flip_risk"]
+
 
 def parse_args():
     p = argparse.ArgumentParser(description="Backtest regimes and signals with walk-forward splits")
@@ -23,18 +29,33 @@ def parse_args():
     p.add_argument("--use_breakout_v2", default='Y', help="Use v2 breakout labeling (Y/N)")
     p.add_argument("--breakout_confirm_bars", type=int, default=1)
     p.add_argument("--breakout_buffer_pts", type=float, default=0.25)
+    # Storage: csv reads --regimes_dir; parquet/matrix/sqlite read the day store under --data_dir
+    p.add_argument("--store", default="csv", choices=STORES)
+    p.add_argument("--data_dir", default=str(BASE_DIR), help="Day store root for --store parquet/matrix/sqlite")
+    p.add_argument("--start", default=None, help="First day to include (YYYYMMDD)")
+    p.add_argument("--end", default=None, help="Last day to include (YYYYMMDD)")
     return p.parse_args()
 
 
-def _read_csv(path: Path) -> pd.DataFrame:
+def _read_csv(path: Path, columns: list[str] = None) -> pd.DataFrame:
     if not path.exists():
         return pd.DataFrame()
-    df = pd.read_csv(path)
+    df = pd.read_csv(path, usecols=(lambda c: c in columns) if columns else None)
     if "timestamp" in df.columns:
         df["timestamp"] = df["timestamp"].astype(str)
     return df
 
 
+def read_regimes(day, store=None, columns: list[str] = REGIME_COLUMNS) -> pd.DataFrame:
+    """Regimes of one (sym, ymd, metrics_path, regimes_path) day, projected to `columns`"""
+    sym, ymd, _, rp = day
+    if store is None:
+        return _read_csv(rp, columns)
+    # timestamps stay int64 epoch minutes: sorting and merging is all they are used for;
+    # on sqlite this is a range scan of the (ticker, ts) index
+    return store.read("regimes", sym, ymd, columns=columns, timestamp="epoch")
+
+
 def list_days(regimes_dir: Path, symbols: list[str]) -> list[tuple[str, str, Path, Path]]:
     days = []
     for csv_path in sorted(regimes_dir.glob("*_GEX_????????_regimes.csv")):
@@ -47,6 +68,11 @@ def list_days(regimes_dir: Path, symbols: list[str]) -> list[tuple[str, str, Pat
     return days
 
 
+def list_store_days(store, symbols: list[str]) -> list[tuple[str, str, Path, Path]]:
+    return [(sym, ymd, store.path("metrics", sym, ymd), store.path("regimes", sym, ymd))
+            for sym, ymd in store.days("regimes", symbols)]
+
+
 def weekly_key(ymd: str) -> str:
     dt = datetime.strptime(ymd, "%Y%m%d")
     year, week, _ = dt.isocalendar()
@@ -186,7 +212,9 @@ def main():
     out_dir.mkdir(parents=True, exist_ok=True)
 
     # Collect day list
-    days = list_days(regimes_dir, a.symbols)
+    store = get_day_store(a.store, a.data_dir) if a.store != "csv" else None
+    days = list_store_days(store, a.symbols) if store else list_days(regimes_dir, a.symbols)
+    days = [d for d in days if (not a.start or d[1] >= a.start) and (not a.end or d[1] <= a.end)]
     if not days:
         print("No regimes found to backtest.")
         return
@@ -207,9 +235,8 @@ def main():
                 continue
             # Concatenate regimes of split
             regimes_list = []
-            for sym, ymd, mp, rp in split_days:
-                r = _read_csv(rp)
-                regimes_list.append(r)
+            for day in split_days:
+                regimes_list.append(read_regimes(day, store))
             R = pd.concat(regimes_list, ignore_index=True) if regimes_list else pd.DataFrame()
             if R.empty:
                 continue
@@ -0,0 +1,104 @@
+"""
+Cold-start benchmark for the Lambda handlers.
+
+Every run is a fresh interpreter, as on a Lambda cold start: it records the
+import time of the handler module and the time until the first response of
+one request (both in ms), plus which heavy packages the process ended up
+loading. Cached data comes from a throwaway SQLite store seeded here, so no
+AWS account or IB gateway is needed.
+
+    python benchmark_cold_start.py --runs 10
+    python benchmark_cold_start.py --targets cache_handler --runs 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC))
+
+DATE = "2025-01-17"
+HEAVY = ("ib_insync", "boto3", "fastapi", "pydantic", "pandas", "numpy")
+
+
+def _event(path, params=None):
+    """Minimal API Gateway REST (v1) proxy event"""
+    return {
+        "resource": path, "path": path, "httpMethod": "GET",
+        "headers": {"host": "localhost"}, "multiValueHeaders": {},
+        "queryStringParameters": params, "multiValueQueryStringParameters":
+            {k: [v] for k, v in params.items()} if params else None,
+        "requestContext": {"resourcePath": path, "httpMethod": "GET", "path": path, "stage": "prod",
+                           "identity": {"sourceIp": "127.0.0.1"}},
+        "body": None, "isBase64Encoded": False,
+    }
+
+
+CACHE_PARAMS = {"ticker": "SPY", "expiry": "front", "source": "cache", "date": DATE}
+
+# name -> (module, handler attribute, event)
+TARGETS = {
+    "main:ping": ("main", "api_handler", _event("/ping")),
+    "main:cache": ("main", "api_handler", _event("/api/option-levels", CACHE_PARAMS)),
+    "cache_handler": ("cache_handler", "handler", _event("/api/option-levels", CACHE_PARAMS)),
+}
+
+CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+module = __import__({module!r})
+t1 = time.perf_counter()
+resp = getattr(module, {attr!r})(json.loads({event!r}), None)
+t2 = time.perf_counter()
+print(json.dumps({{"import_ms": (t1 - t0) * 1000, "first_byte_ms": (t2 - t1) * 1000,
+                  "total_ms": (t2 - t0) * 1000, "status": resp["statusCode"],
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def seed_store(path):
+    from helpers.levels_store import SQLiteStore, item_key
+    payload = {"ticker": "SPY", "expiry": "20250117", "center_price": 590.0, "width": 2,
+               "strikes": [{"strike": 588.0 + i, "call_OI": 1000 + i, "put_OI": 900 + i,
+                            "iv": None, "GEX": None} for i in range(5)]}
+    SQLiteStore(path).put_many([(item_key(DATE, "SPY", "front"), payload)])
+
+
+def run_once(target, env):
+    module, attr, event = TARGETS[target]
+    code = CHILD.format(module=module, attr=attr, event=json.dumps(event), heavy=HEAVY)
+    out = subprocess.run([sys.executable, "-c", code], cwd=SRC, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"{target} failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and time to first response of the Lambda handlers")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per target (default 5)")
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"Comma-separated, from {', '.join(TARGETS)}")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "levels.db"
+        seed_store(db)
+        env = dict(os.environ, CACHE_BACKEND="sqlite", LEVELS_STORE_PATH=str(db),
+                   PYTHONPATH=str(SRC), PYTHONDONTWRITEBYTECODE="1")
+        env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+        print(f"{'target':<16}{'import ms':>11}{'1st resp ms':>13}{'total ms':>10}  status  loaded")
+        for target in [t.strip() for t in args.targets.split(",") if t.strip()]:
+            runs = [run_once(target, env) for _ in range(args.runs)]
+            med = {k: statistics.median(r[k] for r in runs) for k in ("import_ms", "first_byte_ms", "total_ms")}
+            print(f"{target:<16}{med['import_ms']:>11.1f}{med['first_byte_ms']:>13.1f}{med['total_ms']:>10.1f}"
+                  f"  {runs[-1]['status']:>6}  {', '.join(runs[-1]['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 ﻿from math import sqrt
 
+INDEX_STRIKE_STEPS = {"NDX": 25}  # strike grid of the index chains; SPX follows --spx_step
+
 def calculate_gex(strike, call_oi, call_gamma, put_oi, put_gamma):
     """Calculate Gamma Exposure for a strike level"""
     if None in [call_oi, call_gamma, put_oi, put_gamma]:
@@ -8,10 +8,16 @@
 #      – fill to 12 by combined OI
 #      – weaker side set to 0 if ≥5 × imbalance
 # ---------------------------------------------------------
+import csv
+import io
+import math
+import os
 from pathlib import Path
 import pandas as pd
 from datetime import datetime
 
+from atomic_io import append_commit, atomic_open, write_csv
+
 BAND_PCT = 0.4
 N_CALL = 6
 N_PUT = 6
@@ -93,11 +99,72 @@ def workable_oi_levels(
 
     # ── 6. save to CSV ────────────────────────────────────────────────────────
     out_path = Path(out_dir) / f"{ticker.upper()}_OI_levels.csv"
-    pd.DataFrame(final_rows).to_csv(out_path, index=False)
+    write_csv(pd.DataFrame(final_rows), out_path)
     print(f"✅  Saved {len(final_rows)} levels → {out_path}")
 
 
-def append_oi_data(results, ticker, expiry, data_dir: str = "./data", spot: int | None = None):
+def _cell(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return value
+
+
+def _append_rows(csv_path: Path, columns: list, rows: list) -> int:
+    """
+    Append `rows` (dicts) to `csv_path` without reading or rewriting what is
+    already there; the header is written only when the file is new.
+
+    The existing header is checked on open: rows follow the file's column
+    order, and only a column the file does not have yet makes it rewrite the
+    header once. A torn last line (crash mid-write) is cut off. New rows go
+    out in one write and are fsynced and committed (atomic_io) before
+    returning.
+    """
+    csv_path = Path(csv_path)
+    header = None
+    if csv_path.exists() and csv_path.stat().st_size > 0:
+        with open(csv_path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.seek(0)
+                data = f.read()
+                end = data.rfind(b"\n") + 1
+                print(f"⚠️  Dropping torn last line of {csv_path.name}: {data[end:][:80]!r}")
+                f.truncate(end)
+            f.seek(0)
+            header = next(csv.reader([f.readline().decode("utf-8-sig")]), None)
+
+    if header is not None:
+        missing = [c for c in columns if c not in header]
+        if missing:
+            print(f"⚠️  {csv_path.name} has no column(s) {', '.join(missing)}; widening its header")
+            _widen_header(csv_path, header, header + missing)
+            header = header + missing
+        columns = header
+
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    if header is None:
+        writer.writerow(columns)
+    writer.writerows([_cell(r.get(c)) for c in columns] for r in rows)
+    with append_commit(csv_path, "a", newline="", encoding="utf-8") as f:
+        f.write(buf.getvalue())
+    return len(rows)
+
+
+def _widen_header(csv_path: Path, old: list, new: list):
+    # read it all first: Windows will not replace a file we still have open
+    with open(csv_path, newline="", encoding="utf-8-sig") as src:
+        rows = list(csv.reader(src))[1:]
+    pad = [""] * (len(new) - len(old))
+    with atomic_open(csv_path, "w", newline="", encoding="utf-8") as dst:
+        writer = csv.writer(dst, lineterminator="\n")
+        writer.writerow(new)
+        writer.writerows(values + pad for values in rows)
+
+
+def append_oi_data(results, ticker, expiry, data_dir: str = "./data", spot: int | None = None,
+                   store: str | None = None):
     """
     Append a batch of OI results to data/{ticker}_oi.csv, creating the file if needed.
 
@@ -105,6 +172,8 @@ def append_oi_data(results, ticker, expiry, data_dir: str = "./data", spot: int
              result['call']['oi'] and result['put']['oi'] exist.
     ticker:  the symbol string, e.g. "ES" or "NQ"
     data_dir: path to directory where CSVs live
+    store:   'sqlite' (or DAY_STORE) appends to the store's oi table instead;
+             the other stores keep the monthly CSV
     """
     now = datetime.now()
     yyyymm     = now.strftime('%Y%m')         # e.g. 202507
@@ -139,31 +208,34 @@ def append_oi_data(results, ticker, expiry, data_dir: str = "./data", spot: int
     base_columns = ["expiry", "timestamp", "strike", "call_oi", "put_oi"]
     if rows and "spot" in rows[0]:
         base_columns.append("spot")
-    new_df = pd.DataFrame(rows, columns=base_columns)
 
-    # Load existing (if any) and append
-    if csv_path.exists():
-        df = pd.read_csv(csv_path)
-        df = pd.concat([df, new_df], ignore_index=True)
-    else:
-        df = new_df
+    from day_store import get_day_store
+    day_store = get_day_store(store, TARGET_FOLDER)
+    if "oi" in day_store.kinds:
+        day_store.write("oi", ticker, default_ts[:8], pd.DataFrame(rows, columns=base_columns), mode="append")
+        log_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        print(f"[{log_time}] ✅  Appended {len(rows)} rows → {day_store.path('oi', ticker, default_ts[:8])}")
+        return
 
-    # Write back out
-    df.to_csv(csv_path, index=False)
+    # Append only the new rows; the month's file is never re-read
+    appended = _append_rows(csv_path, base_columns, rows)
     log_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{log_time}] ✅  Appended {len(new_df)} rows → {csv_path!r}")
+    print(f"[{log_time}] ✅  Appended {appended} rows → {csv_path!r}")
 
 
 def gex_data_save(results,
                   ticker: str,
                   base_dir: str = r"D:\TradingData",
-                  spot: int | None = None) -> None:
+                  spot: int | None = None,
+                  store: str | None = None) -> None:
     """
     Append a snapshot of GEX data to a daily file located at
     {base_dir}\YYYYMM\{TICKER}_GEX_YYYYMMDD.csv
 
     Columns: timestamp (YYYYMMDDhhmm), strike, call_gex, put_gex
     Each call simply *appends* the current run to the file for that day.
+    store='parquet', 'matrix' or 'sqlite' (or DAY_STORE) appends to that day store
+    instead; 'matrix' writes the snapshot as one O(1) row of the day's GEX matrix.
     """
     now = datetime.now()
     yyyymm     = now.strftime('%Y%m')         # e.g. 202507
@@ -193,15 +265,15 @@ def gex_data_save(results,
     columns = ["timestamp", "strike", "call_gex", "put_gex", "net_gex"]
     if rows and "spot" in rows[0]:
         columns.append("spot")
-    new_df = pd.DataFrame(rows, columns=columns)
 
     # ── 3. append (or create) ────────────────────────────────────────────────
-    if csv_path.exists():
-        df = pd.read_csv(csv_path)
-        df = pd.concat([df, new_df], ignore_index=True)
-    else:
-        df = new_df
-
-    df.to_csv(csv_path, index=False)
+    from day_store import get_day_store
+    day_store = get_day_store(store, base_dir)
+    if day_store.name != "csv":
+        day_store.write("gex", ticker, yyyymmdd, pd.DataFrame(rows, columns=columns), mode="append")
+        log_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        print(f"[{log_time}] ✅  Appended {len(rows)} rows → {day_store.path('gex', ticker, yyyymmdd)}")
+        return
+    appended = _append_rows(csv_path, columns, rows)
     log_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{log_time}] ✅  Appended {len(new_df)} rows → {csv_path}")   
\ No newline at end of file
+    print(f"[{log_time}] ✅  Appended {appended} rows → {csv_path}")   
\ No newline at end of file
@@ -1,8 +1,11 @@
-﻿from ib_insync import IB, Option, Stock
+﻿from ib_insync import IB, Option
 import asyncio
 import numpy as np
 from typing import Dict
 from calculation_helpers import calculate_gex
+from pacing import PacingScheduler
+from helpers.contract_cache import get_contract_cache
+from helpers.spot_price import get_spot_service
 
 GENERIC_TICKS = "100,101,104,105,106"
 
@@ -11,44 +14,69 @@ def generate_strike_range(center_value, range_up, range_down):
     return list(range(center_value - range_down, center_value + range_up + 1))
 
 
-async def get_reliable_ticker(ib, contract, check_greeks=False, timeout=10, max_attempts=3):
-    """Enhanced version that ensures no NaN values"""
-    ticker = ib.reqMktData(contract, genericTickList=GENERIC_TICKS, snapshot=False)
+def _is_set(value):
+    return value is not None and not np.isnan(value)
 
-    for attempt in range(max_attempts):
-        try:
-            await asyncio.wait_for(ticker.updateEvent, timeout)
 
-            if check_greeks:
-                if (ticker.modelGreeks and
-                        not np.isnan(ticker.modelGreeks.gamma) and
-                        not np.isnan(ticker.modelGreeks.impliedVol) and
-                        (not np.isnan(ticker.callOpenInterest) if contract.right == 'C' else
-                        not np.isnan(ticker.putOpenInterest))):
-                    return ticker
-            else:
-                if not np.isnan(ticker.callOpenInterest) if contract.right == 'C' else not np.isnan(
-                        ticker.putOpenInterest):
-                    return ticker
+def field_status(ticker, check_greeks=False):
+    """
+    Per-field completeness of an option ticker.
+    OI-only mode needs the open interest of the contract's right;
+    GEX mode also needs modelGreeks.gamma and modelGreeks.impliedVol.
+    """
+    right = ticker.contract.right
+    status = {'oi': _is_set(ticker.callOpenInterest if right == 'C' else ticker.putOpenInterest)}
+    if check_greeks:
+        greeks = ticker.modelGreeks
+        status['gamma'] = bool(greeks) and _is_set(greeks.gamma)
+        status['iv'] = bool(greeks) and _is_set(greeks.impliedVol)
+    return status
 
-            await asyncio.sleep(0.5)
-        except (asyncio.TimeoutError, AttributeError):
-            continue
 
-    print(f"Warning: Incomplete data for {contract.localSymbol}")
-    return ticker
+async def wait_for_fields(ticker, check_greeks=False, timeout=30):
+    """
+    Resolve as soon as every field the mode needs has arrived (or on timeout).
+    Returns the per-field completeness record.
+    """
+    if all(field_status(ticker, check_greeks).values()):
+        return field_status(ticker, check_greeks)
 
+    ready = asyncio.get_running_loop().create_future()
 
-async def process_strike_with_gex(ib, strike, expiry, ticker, gex_calculated=False):
-    """Process one strike price with both call and put"""
-    call_contract = Option(ticker, expiry, strike, 'C', "SMART")
-    put_contract = Option(ticker, expiry, strike, 'P', "SMART")
+    def on_update(t):
+        if not ready.done() and all(field_status(t, check_greeks).values()):
+            ready.set_result(True)
 
-    call_ticker, put_ticker = await asyncio.gather(
-        get_reliable_ticker(ib, call_contract, check_greeks=gex_calculated),
-        get_reliable_ticker(ib, put_contract, check_greeks=gex_calculated)
-    )
+    ticker.updateEvent += on_update
+    try:
+        await asyncio.wait_for(ready, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        ticker.updateEvent -= on_update
+
+    return field_status(ticker, check_greeks)
 
+
+async def get_reliable_ticker(ib, contract, check_greeks=False, timeout=30):
+    """
+    Subscribe, wait only until the needed fields are in, then free the line.
+    Returns (ticker, completeness); the ticker keeps its last values after the cancel.
+    """
+    ticker = ib.reqMktData(contract, genericTickList=GENERIC_TICKS, snapshot=False)
+    try:
+        complete = await wait_for_fields(ticker, check_greeks, timeout)
+    finally:
+        ib.cancelMktData(contract)
+
+    if not all(complete.values()):
+        missing = ", ".join(k for k, ok in complete.items() if not ok)
+        print(f"Warning: Incomplete data for {contract.localSymbol or contract.symbol} {contract.strike}{contract.right} ({missing})")
+    return ticker, complete
+
+
+def build_strike_result(strike, call_ticker, put_ticker, gex_calculated=False):
+    """Turn the call/put tickers of one strike into the row used by the CSV writers"""
     call_data = None
     put_data = None
 
@@ -57,20 +85,21 @@ async def process_strike_with_gex(ib, strike, expiry, ticker, gex_calculated=Fal
             'oi': call_ticker.callOpenInterest
         }
         if gex_calculated:
-            call_data['gamma'] = call_ticker.modelGreeks.gamma
-            call_data['iv'] = call_ticker.modelGreeks.impliedVol
+            call_data['gamma'] = getattr(call_ticker.modelGreeks, 'gamma', None) if call_ticker.modelGreeks else None
+            call_data['iv'] = getattr(call_ticker.modelGreeks, 'impliedVol', None) if call_ticker.modelGreeks else None
     if put_ticker:
         put_data = {
             'oi': put_ticker.putOpenInterest
         }
-
         if gex_calculated:
-            put_data['gamma'] = put_ticker.modelGreeks.gamma
-            put_data['iv'] = put_ticker.modelGreeks.impliedVol
+            put_data['gamma'] = getattr(put_ticker.modelGreeks, 'gamma', None) if put_ticker.modelGreeks else None
+            put_data['iv'] = getattr(put_ticker.modelGreeks, 'impliedVol', None) if put_ticker.modelGreeks else None
 
-    call_gex = None
-    put_gex = None
-    net_gex = None
+    return_object = {
+        'strike': strike,
+        'call': call_data,
+        'put': put_data
+    }
 
     if gex_calculated:
         call_gex, put_gex, net_gex = calculate_gex(
@@ -80,21 +109,39 @@ async def process_strike_with_gex(ib, strike, expiry, ticker, gex_calculated=Fal
             put_data['oi'] if put_data else None,
             put_data['gamma'] if put_data else None
         )
-
-    return_object = {
-        'strike': strike,
-        'call': call_data,
-        'put': put_data
-    }
-
-    if gex_calculated:
         return_object['call']['call_gex'] = call_gex
         return_object['put']['put_gex'] = put_gex
         return_object['net_gex'] = net_gex
-    
+
     return return_object
 
 
+def strike_contracts(contracts, strike):
+    """Pre-qualified (call, put) for `strike`; raises LookupError if the chain has no such strike"""
+    try:
+        return contracts[(strike, 'C')], contracts[(strike, 'P')]
+    except KeyError:
+        raise LookupError(f"No listed contracts for strike {strike}") from None
+
+
+async def process_strike_with_gex(ib, strike, expiry, ticker, gex_calculated=False, contracts=None):
+    """Process one strike price with both call and put"""
+    if contracts is not None:
+        call_contract, put_contract = strike_contracts(contracts, strike)
+    else:
+        call_contract = Option(ticker, expiry, strike, 'C', "SMART")
+        put_contract = Option(ticker, expiry, strike, 'P', "SMART")
+
+    (call_ticker, call_complete), (put_ticker, put_complete) = await asyncio.gather(
+        get_reliable_ticker(ib, call_contract, check_greeks=gex_calculated),
+        get_reliable_ticker(ib, put_contract, check_greeks=gex_calculated)
+    )
+
+    result = build_strike_result(strike, call_ticker, put_ticker, gex_calculated)
+    result['complete'] = {'call': call_complete, 'put': put_complete}
+    return result
+
+
 # This function is not being used
 async def ensure_critical_fields(ticker, timeout=15, max_attempts=4):
     """Wait specifically for modelGreeks and open interest data"""
@@ -129,31 +176,25 @@ async def fetch_option_data(ib: IB, contract) -> Dict:
     }
 
 
-async def batch_data(ib: IB, batch_size, expiry, ticker, centre_price, up_level, down_level, gex_calculated=False):
-    strike_range = generate_strike_range(centre_price, up_level, down_level)
-
-    results = []
-
-    for i in range(0, len(strike_range), batch_size):
-        batch = strike_range[i:i + batch_size]
-        batch_results = await asyncio.gather(
-            *[process_strike_with_gex(ib, strike, expiry, ticker, gex_calculated) for strike in batch],
-            return_exceptions=True
-        )
-        results.extend([r for r in batch_results if not isinstance(r, Exception)])
-        await asyncio.sleep(1)  # Brief pause between batches
-
-    return results
+async def batch_data(ib: IB, scheduler: PacingScheduler, expiry, ticker, centre_price, up_level, down_level, gex_calculated=False,
+                     strikes=None):
+    strike_range = strikes if strikes is not None else generate_strike_range(centre_price, up_level, down_level)
+    contracts = await get_contract_cache().options_async(ib, ticker, expiry, strike_range)
 
+    # one job per strike: 2 lines (call + put), 4 messages (subscribe + cancel each)
+    batch_results = await scheduler.run(
+        [lambda strike=strike: process_strike_with_gex(ib, strike, expiry, ticker, gex_calculated, contracts)
+         for strike in strike_range],
+        lines_per_job=2, messages_per_job=4
+    )
 
-async def fetch_stock_ticker(ib, ticker):
-    """Fetch the current stock price."""
-    contract = Stock(ticker, 'SMART', 'USD')
-    ticker_data = ib.reqMktData(contract, '233', snapshot=False)
+    return [r for r in batch_results if not isinstance(r, Exception)]
 
-    await asyncio.sleep(3)
 
-    return ticker_data
+async def fetch_spot_price(ib, ticker):
+    """Current spot from the shared streaming subscription (previous close if no trade arrives in time)."""
+    price, _ = await get_spot_service(ib).get_async(ticker)
+    return price
 
 async def fetch_atm_iv(ib: IB, ticker: str, expiry: str, spot: float,
                        right: str = "C", timeout: float = 5.0) -> float:
@@ -164,11 +205,8 @@ async def fetch_atm_iv(ib: IB, ticker: str, expiry: str, spot: float,
     strike = round(spot)
 
     contract = Option(ticker, expiry, strike, right, "SMART")
-    tk = ib.reqMktData(contract, genericTickList=GENERIC_TICKS, snapshot=False)
 
-    call_ticker = await asyncio.gather(
-        get_reliable_ticker(ib, contract, check_greeks=True)
-    )
+    call_ticker = await get_reliable_ticker(ib, contract, check_greeks=True)
     
     print(call_ticker)
 
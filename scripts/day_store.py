@@ -0,0 +1,782 @@
+"""
+Day store: where the pipeline keeps its per-ticker, per-day tables.
+
+Three kinds of table, one per pipeline stage:
+    gex      raw strike snapshots     (gex_data_save)
+    metrics  per-snapshot metrics     (derive_gex_metrics)
+    regimes  rolling regimes/signals  (rolling_gex_regimes)
+
+Interchangeable backends, picked with --store or DAY_STORE:
+    csv      the original layout, {base}/YYYYMM/[analysis/]{T}_GEX_YYYYMMDD[_kind].csv
+    parquet  {base}/parquet/{kind}/ticker={T}/day=YYYYMMDD/part-*.parquet, with
+             typed columns: timestamp as int64 epoch minutes (naive wall-clock
+             time, as written by the collectors), GEX columns as float32
+    matrix   gex days as memory-mapped strike × time matrices (gex_matrix.py),
+             {base}/matrix/ticker={T}/YYYYMMDD.gexm; metrics and regimes as parquet
+    sqlite   one WAL-mode database, {base}/gex.sqlite, a table per kind (plus
+             oi, the OI history) indexed on (ticker, ts); query() answers
+             cross-day, time-of-day range questions without touching files
+
+Both read and write pandas DataFrames whose `timestamp` is the pipeline's
+'YYYYMMDDhhmm' string; `read(..., timestamp="epoch")` keeps the raw int64
+instead, which is all sorting and merging need. `columns=` reads only the
+listed columns. `tail(kind, ticker, day, n)` reads only the last n snapshots,
+and a 'merge' write of rows at or after the last stored snapshot only touches
+the end of the day, so --latest cycles cost the same at 15:55 as at 09:35.
+
+Writes are reader-safe (atomic_io.py): CSV rewrites are swapped in whole,
+appends are committed with a `.seq` record, and a parquet rewrite lands as a
+'-base' part that hides every older part, so a reader never sees a day twice.
+Live appends add a part per snapshot; once a day has more than COMPACT_PARTS
+(PARQUET_COMPACT_PARTS, default 4) it is folded back into one, and `compact`
+folds whole days into a single part, e.g. after the close.
+
+    python day_store.py convert --ticker SPY --start 20250101 --end 20250331
+    python day_store.py bench --ticker SPY --kind regimes
+    python day_store.py compact --store parquet --start 20250716
+    python day_store.py query --store sqlite --kind regimes --ticker SPY \
+        --start 20250106 --end 20250110 --time 10:00-11:30
+"""
+
+import argparse
+import csv
+import io
+import os
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import gex_matrix
+from atomic_io import atomic_open, append_csv, committed, publish, replace, write_csv
+
+###############################################################################
+# 1.  Constants
+###############################################################################
+
+BASE_DIR = Path(os.environ.get("GEX_DATA_DIR", r"D:\TradingData"))
+DAY_STORE = os.environ.get("DAY_STORE", "csv")
+KINDS = ("gex", "metrics", "regimes")
+STORES = ("csv", "parquet", "matrix", "sqlite")
+# a parquet day is folded back into one file once live appends leave it in more parts than this
+COMPACT_PARTS = int(os.environ.get("PARQUET_COMPACT_PARTS", "4"))
+
+
+###############################################################################
+# 2.  Timestamps
+###############################################################################
+
+def ts_to_epoch_minutes(ts: pd.Series) -> pd.Series:
+    """'YYYYMMDDhhmm' strings (or numbers, possibly read back as '…0.0') -> int64 epoch minutes"""
+    text = ts.astype(str).str.split(".").str[0].str[:12]
+    dt = pd.to_datetime(text, format="%Y%m%d%H%M")
+    # unit-independent: datetime64 resolution differs across pandas versions
+    return ((dt - pd.Timestamp(0)) // pd.Timedelta(minutes=1)).astype("int64")
+
+
+def epoch_minutes_to_ts(minutes: pd.Series) -> pd.Series:
+    """int64 epoch minutes -> 'YYYYMMDDhhmm' strings"""
+    # a day has a few hundred snapshots but every strike repeats them: format each once
+    codes, uniques = pd.factorize(minutes.astype("int64"))
+    dt = pd.to_datetime(pd.Series(uniques), unit="m").dt
+    # datetime fields are int32: widen before building the 12-digit number
+    n = (dt.year.astype("int64") * 100_000_000 + dt.month * 1_000_000 + dt.day * 10_000
+         + dt.hour * 100 + dt.minute)
+    return pd.Series(n.astype(str).to_numpy()[codes], index=minutes.index, name=minutes.name)
+
+
+def _timestamps(df: pd.DataFrame, timestamp: str) -> pd.DataFrame:
+    """Convert the int64 `timestamp` column read from storage to the requested form"""
+    if "timestamp" not in df.columns or timestamp == "epoch":
+        return df
+    if timestamp == "str":
+        df["timestamp"] = epoch_minutes_to_ts(df["timestamp"])
+        return df
+    raise ValueError(f"timestamp must be 'str' or 'epoch', not {timestamp!r}")
+
+
+###############################################################################
+# 3.  CSV tails
+###############################################################################
+
+TAIL_BLOCK = 64 * 1024
+
+
+def read_csv_tail(path, snapshots: int = 1, columns=None):
+    """
+    (rows of the last `snapshots` timestamps, byte offset where they start) of
+    a CSV appended in timestamp order. Reads backwards from the end a block at
+    a time, so the cost follows the snapshot size, not the file size. Bytes
+    past the committed length and a torn last line (writer mid-append) are
+    left out.
+    """
+    path = Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        return pd.DataFrame(columns=columns), 0
+    record = committed(path)
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = f.tell()
+        names = next(csv.reader([header.decode("utf-8-sig")]), [])
+        col = [n.strip().lower() for n in names].index("timestamp")
+        pos = f.seek(0, os.SEEK_END)
+        if record is not None:
+            pos = max(start, min(pos, record[1]))
+        buf, torn = b"", None
+        while True:
+            lo = max(start, pos - TAIL_BLOCK)
+            f.seek(lo)
+            buf = f.read(pos - lo) + buf
+            pos = lo
+            if torn is None:
+                torn = len(buf) - (buf.rfind(b"\n") + 1)
+            # the first line of the buffer is partial until we reach the header
+            cut = 0 if pos == start else buf.find(b"\n") + 1
+            if cut == 0 and pos > start:
+                continue
+            lines = buf[cut:len(buf) - torn].splitlines(keepends=True)
+            stamps = [row[col] if len(row) > col else "" for row in csv.reader(l.decode() for l in lines)]
+            distinct = list(dict.fromkeys(stamps))
+            if len(distinct) > snapshots or pos == start:
+                break
+    keep = set(distinct[-snapshots:])
+    first = next((i for i, ts in enumerate(stamps) if ts in keep), len(lines))
+    offset = pos + cut + sum(len(l) for l in lines[:first])
+    usecols = (lambda c: c in columns) if columns else None
+    df = pd.read_csv(io.BytesIO(header + b"".join(lines[first:])), usecols=usecols)
+    if "timestamp" in df.columns:
+        df["timestamp"] = df["timestamp"].astype(str)
+    return df, offset
+
+
+def merge_csv(path, df: pd.DataFrame):
+    """
+    Merge `df` into a CSV kept in timestamp order, last row per timestamp
+    winning. Rows after the file's last snapshot are appended after reading
+    only the tail; rows repeating it replace it in a copy of the file's bytes
+    up to that snapshot; anything else falls back to reading and rewriting the
+    whole file. Every path commits atomically (atomic_io).
+    """
+    path = Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        write_csv(df, path)
+        return
+    new = df.assign(timestamp=df["timestamp"].astype(str))
+    new = new.drop_duplicates(subset=["timestamp"], keep="last").sort_values("timestamp")
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        clean_end = f.read(1) == b"\n"
+    tail, offset = read_csv_tail(path, 1)
+    header = list(tail.columns)
+    last = tail["timestamp"].iloc[-1] if len(tail) else None
+    first = new["timestamp"].iloc[0] if len(new) else None
+    if clean_end and set(new.columns) <= set(header) and (last is None or first is None or first >= last):
+        new = new.reindex(columns=header)
+        if first is None or first != last:
+            append_csv(new, path)
+            return
+        with open(path, "rb") as src:
+            kept = src.read(offset)
+        with atomic_open(path, "wb") as dst:
+            dst.write(kept)
+            dst.write(new.to_csv(header=False, index=False).encode("utf-8"))
+        return
+    write_csv(_merge(pd.read_csv(path), df), path)
+
+
+###############################################################################
+# 4.  Backends
+###############################################################################
+
+class CsvDayStore:
+    """The pipeline's original CSV files"""
+
+    name = "csv"
+    kinds = KINDS
+
+    def __init__(self, base_dir=BASE_DIR):
+        self.base_dir = Path(base_dir)
+
+    def path(self, kind: str, ticker: str, day: str) -> Path:
+        month = self.base_dir / day[:6]
+        if kind == "gex":
+            return month / f"{ticker.upper()}_GEX_{day}.csv"
+        return month / "analysis" / f"{ticker.upper()}_GEX_{day}_{kind}.csv"
+
+    def exists(self, kind, ticker, day) -> bool:
+        p = self.path(kind, ticker, day)
+        return p.exists() and p.stat().st_size > 0
+
+    def read(self, kind, ticker, day, columns=None, timestamp="str") -> pd.DataFrame:
+        p = self.path(kind, ticker, day)
+        if not p.exists() or p.stat().st_size == 0:
+            return pd.DataFrame(columns=columns)
+        usecols = (lambda c: c in columns) if columns else None
+        df = pd.read_csv(p, usecols=usecols)
+        if "timestamp" in df.columns:
+            if timestamp == "epoch":
+                df["timestamp"] = ts_to_epoch_minutes(df["timestamp"])
+            else:
+                df["timestamp"] = df["timestamp"].astype(str)
+        return df
+
+    def tail(self, kind, ticker, day, snapshots: int = 1, columns=None, timestamp="str") -> pd.DataFrame:
+        """The last `snapshots` timestamps of the day, read backwards from the end of the file"""
+        df, _ = read_csv_tail(self.path(kind, ticker, day), snapshots, columns)
+        if timestamp == "epoch" and "timestamp" in df.columns:
+            df["timestamp"] = ts_to_epoch_minutes(df["timestamp"])
+        return df
+
+    def write(self, kind, ticker, day, df: pd.DataFrame, mode: str = "replace"):
+        """mode: 'replace' the day, 'append' rows, or 'merge' (append, last row per timestamp wins)"""
+        p = self.path(kind, ticker, day)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        if mode == "append" and p.exists():
+            append_csv(df, p)
+            return
+        if mode == "merge":
+            merge_csv(p, df)
+            return
+        write_csv(df, p)
+
+    def days(self, kind, tickers=None) -> list:
+        """[(ticker, day), ...] present for `kind`, sorted by day"""
+        pattern = "*/*_GEX_????????.csv" if kind == "gex" else f"*/analysis/*_GEX_????????_{kind}.csv"
+        found = []
+        for p in self.base_dir.glob(pattern):
+            sym, _, day = p.stem.split("_")[:3]
+            if not tickers or sym in tickers:
+                found.append((sym, day))
+        return sorted(found, key=lambda x: (x[1], x[0]))
+
+
+class ParquetDayStore:
+    """Typed, column-projectable Parquet files, one directory per ticker and day"""
+
+    name = "parquet"
+    kinds = KINDS
+
+    def __init__(self, base_dir=BASE_DIR):
+        self.base_dir = Path(base_dir) / "parquet"
+
+    def path(self, kind: str, ticker: str, day: str) -> Path:
+        return self.base_dir / kind / f"ticker={ticker.upper()}" / f"day={day}"
+
+    def _all_parts(self, kind, ticker, day) -> list:
+        return sorted(self.path(kind, ticker, day).glob("part-*.parquet"))
+
+    def _parts(self, kind, ticker, day) -> list:
+        """Live parts: the newest '-base' part (a full rewrite of the day) and the appends after it"""
+        parts = self._all_parts(kind, ticker, day)
+        bases = [i for i, p in enumerate(parts) if p.stem.endswith("-base")]
+        return parts[bases[-1]:] if bases else parts
+
+    def exists(self, kind, ticker, day) -> bool:
+        return bool(self._parts(kind, ticker, day))
+
+    def read(self, kind, ticker, day, columns=None, timestamp="str") -> pd.DataFrame:
+        import pyarrow as pa
+        parts = self._parts(kind, ticker, day)
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        tables = [_read_part(part, columns) for part in parts]
+        table = tables[0] if len(tables) == 1 else pa.concat_tables(tables, promote_options="default")
+        return _timestamps(table.to_pandas(), timestamp)
+
+    def tail(self, kind, ticker, day, snapshots: int = 1, columns=None, timestamp="str") -> pd.DataFrame:
+        """The last `snapshots` timestamps of the day, from the newest parts only"""
+        import pyarrow as pa
+        want = list(dict.fromkeys(["timestamp", *columns])) if columns else None
+        tables, stamps = [], set()
+        for part in reversed(self._parts(kind, ticker, day)):
+            tables.insert(0, _read_part(part, want))
+            stamps.update(tables[0].column("timestamp").to_pylist())
+            if len(stamps) >= snapshots:
+                break
+        if not tables:
+            return pd.DataFrame(columns=columns)
+        table = tables[0] if len(tables) == 1 else pa.concat_tables(tables, promote_options="default")
+        df = table.to_pandas()
+        df = df[df["timestamp"].isin(sorted(stamps)[-snapshots:])].reset_index(drop=True)
+        if columns:
+            df = df[[c for c in columns if c in df.columns]]
+        return _timestamps(df, timestamp)
+
+    def write(self, kind, ticker, day, df: pd.DataFrame, mode: str = "replace"):
+        """mode: 'replace' the day, 'append' a new part, or 'merge' (last row per timestamp wins)"""
+        import pyarrow.parquet as pq
+        folder = self.path(kind, ticker, day)
+        folder.mkdir(parents=True, exist_ok=True)
+        if mode == "merge" and self.exists(kind, ticker, day):
+            last = self.tail(kind, ticker, day, 1, columns=["timestamp"], timestamp="epoch")["timestamp"]
+            if len(df) and ts_to_epoch_minutes(df["timestamp"]).min() > last.max():
+                # strictly newer rows: a new part, nothing old is read back
+                mode = "append"
+            else:
+                df = _merge(self.read(kind, ticker, day), df)
+        old = [] if mode == "append" else self._all_parts(kind, ticker, day)
+        # part names sort in write order; the temp name keeps readers off half-written files,
+        # and a rewrite is a '-base' part so readers skip the old parts until they are deleted
+        base = "" if mode == "append" else "-base"
+        name = f"part-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}{base}.parquet"
+        tmp = folder / (name + ".tmp")
+        pq.write_table(_to_table(df, kind), tmp, compression="zstd")
+        os.replace(tmp, folder / name)
+        publish(folder)
+        for p in old:
+            p.unlink(missing_ok=True)
+        if mode == "append":
+            # every open file costs a read; keep days appended live from piling up parts
+            self.compact(kind, ticker, day, COMPACT_PARTS)
+
+    def compact(self, kind, ticker, day, max_parts: int = 1) -> bool:
+        """Fold the parts of one day into a single file once it has more than `max_parts`"""
+        if len(self._parts(kind, ticker, day)) <= max_parts:
+            return False
+        self.write(kind, ticker, day, self.read(kind, ticker, day))
+        return True
+
+    def days(self, kind, tickers=None) -> list:
+        found = []
+        for d in (self.base_dir / kind).glob("ticker=*/day=*"):
+            sym, day = d.parent.name.split("=", 1)[1], d.name.split("=", 1)[1]
+            if (not tickers or sym in tickers) and any(d.glob("part-*.parquet")):
+                found.append((sym, day))
+        return sorted(found, key=lambda x: (x[1], x[0]))
+
+
+class MatrixDayStore(ParquetDayStore):
+    """Parquet, except that gex days are GEX matrices: O(1) appends, zero-copy reads"""
+
+    name = "matrix"
+
+    def path(self, kind: str, ticker: str, day: str) -> Path:
+        if kind != "gex":
+            return super().path(kind, ticker, day)
+        return self.base_dir.parent / "matrix" / f"ticker={ticker.upper()}" / f"{day}{gex_matrix.SUFFIX}"
+
+    def matrix(self, ticker, day) -> "gex_matrix.GexMatrix":
+        return gex_matrix.GexMatrix.open(self.path("gex", ticker, day))
+
+    def exists(self, kind, ticker, day) -> bool:
+        if kind != "gex":
+            return super().exists(kind, ticker, day)
+        return self.path(kind, ticker, day).exists()
+
+    def read(self, kind, ticker, day, columns=None, timestamp="str") -> pd.DataFrame:
+        if kind != "gex":
+            return super().read(kind, ticker, day, columns, timestamp)
+        if not self.exists(kind, ticker, day):
+            return pd.DataFrame(columns=columns)
+        with self.matrix(ticker, day) as m:
+            df = m.to_frame()
+        return _timestamps(df[columns] if columns else df, timestamp)
+
+    def tail(self, kind, ticker, day, snapshots: int = 1, columns=None, timestamp="str") -> pd.DataFrame:
+        if kind != "gex":
+            return super().tail(kind, ticker, day, snapshots, columns, timestamp)
+        if not self.exists(kind, ticker, day):
+            return pd.DataFrame(columns=columns)
+        with self.matrix(ticker, day) as m:
+            df = m.to_frame(start=-snapshots)
+        return _timestamps(df[columns] if columns else df, timestamp)
+
+    def write(self, kind, ticker, day, df: pd.DataFrame, mode: str = "replace"):
+        """mode: 'replace' the day, 'append' snapshots, or 'merge' (snapshots of new timestamps replace old ones)"""
+        if kind != "gex":
+            return super().write(kind, ticker, day, df, mode)
+        p = self.path(kind, ticker, day)
+        if mode == "merge" and p.exists():
+            old = self.read(kind, ticker, day, timestamp="epoch")
+            df = df.assign(timestamp=ts_to_epoch_minutes(df["timestamp"]))
+            df = pd.concat([old[~old["timestamp"].isin(df["timestamp"])], df], ignore_index=True)
+            mode = "replace"
+        if mode == "replace" and p.exists():
+            tmp = p.with_name(p.name + ".new")
+            tmp.unlink(missing_ok=True)
+            gex_matrix.append_frame(tmp, df)
+            # append_frame and read have closed their mappings: Windows cannot swap a mapped file
+            replace(tmp, p)
+            return
+        gex_matrix.append_frame(p, df)
+
+    def compact(self, kind, ticker, day, max_parts: int = 1) -> bool:
+        if kind == "gex":
+            return False  # a matrix is one file already
+        return super().compact(kind, ticker, day, max_parts)
+
+    def days(self, kind, tickers=None) -> list:
+        if kind != "gex":
+            return super().days(kind, tickers)
+        found = []
+        for p in (self.base_dir.parent / "matrix").glob(f"ticker=*/*{gex_matrix.SUFFIX}"):
+            sym = p.parent.name.split("=", 1)[1]
+            if not tickers or sym in tickers:
+                found.append((sym, p.stem))
+        return sorted(found, key=lambda x: (x[1], x[0]))
+
+
+class SqliteDayStore:
+    """
+    One SQLite database in WAL mode, {base}/gex.sqlite, with a table per kind
+    (gex, oi, metrics, regimes) keyed on (ticker, ts[, expiry][, strike]).
+    ts is int64 epoch minutes, so a day, a date range and a time-of-day window
+    are all range scans of the (ticker, ts) index instead of file globs.
+    """
+
+    name = "sqlite"
+    kinds = KINDS + ("oi",)
+    FILE = "gex.sqlite"
+    # columns that, after (ticker, ts), tell the rows of one snapshot apart
+    KEYS = {"gex": ("strike",), "oi": ("expiry", "strike")}
+
+    def __init__(self, base_dir=BASE_DIR):
+        self.base_dir = Path(base_dir)
+        self._conn = None
+
+    @property
+    def conn(self):
+        import sqlite3
+        if self._conn is None:
+            self.base_dir.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.base_dir / self.FILE, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        return self._conn
+
+    def path(self, kind: str, ticker: str, day: str) -> Path:
+        return self.base_dir / self.FILE
+
+    def _columns(self, kind) -> dict:
+        """{column: declared type} of the kind's table, without ticker/ts; {} if it does not exist yet"""
+        _check_kind(kind, self.kinds)
+        if self._conn is None and not (self.base_dir / self.FILE).exists():
+            return {}     # don't create the database just to look
+        rows = self.conn.execute(f'PRAGMA table_info("{kind}")').fetchall()
+        return {name: decl for _, name, decl, *_ in rows if name not in ("ticker", "ts")}
+
+    def _ensure(self, kind, df: pd.DataFrame) -> dict:
+        """Create the kind's table and its (ticker, ts, ...) index, or add the columns `df` brings"""
+        columns = self._columns(kind)
+        data = [c for c in df.columns if c != "timestamp"]
+        if not columns:
+            keys = self.KEYS.get(kind, ())
+            decls = ", ".join(f'"{c}" {_sql_type(df[c]) if c in df else "TEXT"}'
+                              for c in dict.fromkeys([*keys, *data]))
+            self.conn.execute(f'CREATE TABLE "{kind}" (ticker TEXT NOT NULL, ts INTEGER NOT NULL, {decls})')
+            key = ", ".join(["ticker", "ts", *(f'"{k}"' for k in keys)])
+            self.conn.execute(f'CREATE UNIQUE INDEX "{kind}_ticker_ts" ON "{kind}" ({key})')
+            return self._columns(kind)
+        for c in data:
+            if c not in columns:
+                self.conn.execute(f'ALTER TABLE "{kind}" ADD COLUMN "{c}" {_sql_type(df[c])}')
+        return self._columns(kind)
+
+    def _select(self, kind, where: str, params: list, columns=None, with_ticker=False,
+                timestamp="str") -> pd.DataFrame:
+        known = self._columns(kind)
+        if not known:
+            return pd.DataFrame(columns=columns)
+        names = [c for c in (columns or ["timestamp", *known]) if c == "timestamp" or c in known]
+        select = ", ".join(["ticker"] * with_ticker + ["ts AS timestamp" if c == "timestamp" else f'"{c}"'
+                                                       for c in names])
+        df = pd.read_sql_query(f'SELECT {select} FROM "{kind}" WHERE {where} ORDER BY ticker, ts, rowid',
+                               self.conn, params=params)
+        for c in names:
+            if known.get(c) == "BOOLEAN":
+                df[c] = df[c].astype(bool) if df[c].notna().all() else df[c].map({1: True, 0: False})
+        return _timestamps(df, timestamp)
+
+    def exists(self, kind, ticker, day) -> bool:
+        if not self._columns(kind):
+            return False
+        row = self.conn.execute(f'SELECT 1 FROM "{kind}" WHERE ticker = ? AND ts BETWEEN ? AND ? LIMIT 1',
+                                [ticker.upper(), *_day_bounds(day)]).fetchone()
+        return row is not None
+
+    def read(self, kind, ticker, day, columns=None, timestamp="str") -> pd.DataFrame:
+        return self._select(kind, "ticker = ? AND ts BETWEEN ? AND ?", [ticker.upper(), *_day_bounds(day)],
+                            columns, timestamp=timestamp)
+
+    def tail(self, kind, ticker, day, snapshots: int = 1, columns=None, timestamp="str") -> pd.DataFrame:
+        if not self._columns(kind):
+            return pd.DataFrame(columns=columns)
+        lo, hi = _day_bounds(day)
+        row = self.conn.execute(
+            f'SELECT MIN(ts) FROM (SELECT DISTINCT ts FROM "{kind}" WHERE ticker = ? AND ts BETWEEN ? AND ? '
+            f'ORDER BY ts DESC LIMIT ?)', [ticker.upper(), lo, hi, snapshots]).fetchone()
+        if row[0] is None:
+            return pd.DataFrame(columns=columns)
+        return self._select(kind, "ticker = ? AND ts BETWEEN ? AND ?", [ticker.upper(), row[0], hi],
+                            columns, timestamp=timestamp)
+
+    def write(self, kind, ticker, day, df: pd.DataFrame, mode: str = "replace"):
+        """mode: 'replace' the day, 'append' rows, or 'merge' (rows of new timestamps replace old ones)"""
+        ticker = ticker.upper()
+        ts = ts_to_epoch_minutes(df["timestamp"]) if len(df) else pd.Series([], dtype="int64")
+        with self.conn:    # one transaction: readers see all of it or none of it
+            columns = self._ensure(kind, df)
+            if mode == "replace":
+                self.conn.execute(f'DELETE FROM "{kind}" WHERE ticker = ? AND ts BETWEEN ? AND ?',
+                                  [ticker, *_day_bounds(day)])
+            elif mode == "merge":
+                self.conn.executemany(f'DELETE FROM "{kind}" WHERE ticker = ? AND ts = ?',
+                                      [(ticker, int(t)) for t in ts.unique()])
+            data = [c for c in df.columns if c in columns]
+            cols = ", ".join(["ticker", "ts", *(f'"{c}"' for c in data)])
+            marks = ", ".join("?" * (len(data) + 2))
+            values = df[data].astype(object).where(df[data].notna(), None)
+            self.conn.executemany(f'INSERT OR REPLACE INTO "{kind}" ({cols}) VALUES ({marks})',
+                                  [(ticker, int(t), *row) for t, row in
+                                   zip(ts, values.itertuples(index=False, name=None))])
+
+    def compact(self, kind, ticker, day, max_parts: int = 1) -> bool:
+        """Nothing to fold: every write already lands in the one table"""
+        return False
+
+    def days(self, kind, tickers=None) -> list:
+        if not self._columns(kind):
+            return []
+        rows = self.conn.execute(f'SELECT DISTINCT ticker, ts / 1440 FROM "{kind}"').fetchall()
+        found = [(sym, epoch_minutes_to_ts(pd.Series([d * 1440])).iloc[0][:8]) for sym, d in rows
+                 if not tickers or sym in tickers]
+        return sorted(found, key=lambda x: (x[1], x[0]))
+
+    def query(self, kind, tickers=None, start=None, end=None, time_from=None, time_to=None,
+              columns=None, timestamp="str") -> pd.DataFrame:
+        """
+        Rows of `tickers` (default all) with start <= timestamp <= end ('YYYYMMDD'
+        or 'YYYYMMDDhhmm', inclusive) whose time of day is within
+        [time_from, time_to] ('HH:MM'), with a `ticker` column, sorted by ticker
+        and timestamp
+        """
+        where, params = [], []
+        if tickers:
+            where.append(f"ticker IN ({', '.join('?' * len(tickers))})")
+            params += [t.upper() for t in tickers]
+        lo, hi = _range_bounds(start, end)
+        where.append("ts BETWEEN ? AND ?")
+        params += [lo, hi]
+        if time_from or time_to:
+            where.append("ts % 1440 BETWEEN ? AND ?")
+            params += [_minute_of_day(time_from or "00:00"), _minute_of_day(time_to or "23:59")]
+        return self._select(kind, " AND ".join(where), params, columns, with_ticker=True, timestamp=timestamp)
+
+
+def _check_kind(kind, kinds):
+    if kind not in kinds:
+        raise ValueError(f"Unknown kind '{kind}' (choose from {', '.join(kinds)})")
+
+
+def _day_bounds(day: str):
+    """(first, last) epoch minute of 'YYYYMMDD'"""
+    first = int(ts_to_epoch_minutes(pd.Series([f"{day}0000"])).iloc[0])
+    return first, first + 1439
+
+
+def _range_bounds(start=None, end=None):
+    """Inclusive epoch-minute bounds of 'YYYYMMDD' / 'YYYYMMDDhhmm' start and end (open when None)"""
+    lo = int(ts_to_epoch_minutes(pd.Series([start.ljust(12, "0")])).iloc[0]) if start else 0
+    if not end:
+        return lo, 2 ** 62
+    if len(end) == 8:
+        return lo, _day_bounds(end)[1]
+    return lo, int(ts_to_epoch_minutes(pd.Series([end])).iloc[0])
+
+
+def _minute_of_day(hhmm: str) -> int:
+    h, m = hhmm.replace(":", "")[:2], hhmm.replace(":", "")[2:4]
+    return int(h) * 60 + int(m)
+
+
+def _sql_type(col: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(col):
+        return "BOOLEAN"
+    if pd.api.types.is_integer_dtype(col):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(col):
+        return "REAL"
+    values = col.dropna()
+    if len(values) and values.map(lambda v: isinstance(v, (bool, np.bool_))).all():
+        return "BOOLEAN"
+    return "TEXT"
+
+
+def query_range(store, kind, tickers=None, start=None, end=None, time_from=None, time_to=None,
+                columns=None, timestamp="str") -> pd.DataFrame:
+    """
+    SqliteDayStore.query for any store: an indexed query on sqlite, a read of
+    every day in range (then filtered) on the file stores
+    """
+    if hasattr(store, "query"):
+        return store.query(kind, tickers, start, end, time_from, time_to, columns, timestamp)
+    frames = []
+    for sym, day in store.days(kind, tickers):
+        if (start and day < start[:8]) or (end and day > end[:8]):
+            continue
+        df = store.read(kind, sym, day, columns=columns, timestamp="epoch")
+        frames.append(df.assign(ticker=sym)[["ticker", *df.columns]])
+    if not frames:
+        return pd.DataFrame(columns=["ticker", *(columns or [])])
+    df = pd.concat(frames, ignore_index=True)
+    lo, hi = _range_bounds(start, end)
+    keep = df["timestamp"].between(lo, hi)
+    if time_from or time_to:
+        keep &= (df["timestamp"] % 1440).between(_minute_of_day(time_from or "00:00"),
+                                                 _minute_of_day(time_to or "23:59"))
+    return _timestamps(df[keep].sort_values(["ticker", "timestamp"], kind="stable").reset_index(drop=True),
+                       timestamp)
+
+
+def _merge(existing: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    combined = pd.concat([existing, new], ignore_index=True)
+    if "timestamp" in combined.columns:
+        combined["timestamp"] = combined["timestamp"].astype(str)
+        combined = combined.drop_duplicates(subset=["timestamp"], keep="last").sort_values("timestamp")
+    return combined
+
+
+def _read_part(part, columns=None):
+    """One parquet part, projected to the listed columns it has"""
+    import pyarrow.parquet as pq
+    # ParquetFile skips the dataset layer read_table goes through; closed so Windows can delete the part
+    with pq.ParquetFile(part) as f:
+        names = f.schema_arrow.names
+        return f.read(columns=[c for c in columns if c in names] if columns else None)
+
+
+def _to_table(df: pd.DataFrame, kind: str):
+    import pyarrow as pa
+    df = df.copy()
+    if "timestamp" in df.columns:
+        df["timestamp"] = ts_to_epoch_minutes(df["timestamp"])
+    for c in df.columns:
+        col = df[c]
+        if c != "timestamp" and "gex" in c.lower() and pd.api.types.is_numeric_dtype(col):
+            df[c] = col.astype(np.float32)
+        elif col.dtype == object:
+            # CSV round trips leave bools and strings as objects, often mixed with NaN
+            values = col.dropna()
+            if len(values) and values.map(lambda v: isinstance(v, (bool, np.bool_))).all():
+                df[c] = col.astype("boolean")
+            else:
+                df[c] = col.where(col.isna(), col.astype(str))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def get_day_store(name: str = None, base_dir=BASE_DIR):
+    name = (name or DAY_STORE).lower()
+    if name == "csv":
+        return CsvDayStore(base_dir)
+    if name == "parquet":
+        return ParquetDayStore(base_dir)
+    if name == "matrix":
+        return MatrixDayStore(base_dir)
+    if name == "sqlite":
+        return SqliteDayStore(base_dir)
+    raise ValueError(f"Unknown day store '{name}' (choose from {', '.join(STORES)})")
+
+
+###############################################################################
+# 5.  CLI: convert history, compare read speed, range queries
+###############################################################################
+
+def convert(src, dst, kinds, tickers, start=None, end=None, quiet=False):
+    count = 0
+    for kind in kinds:
+        for sym, day in src.days(kind, tickers):
+            if (start and day < start) or (end and day > end):
+                continue
+            dst.write(kind, sym, day, src.read(kind, sym, day), mode="replace")
+            count += 1
+            if not quiet:
+                print(f"✅ {kind} {sym} {day}")
+    print(f"Converted {count} day tables from {src.name} to {dst.name}")
+
+
+def compact_days(store, kinds, tickers, start=None, end=None, quiet=False):
+    """Fold every day's parts into one file, e.g. after the close"""
+    count = 0
+    for kind in kinds:
+        for sym, day in store.days(kind, tickers):
+            if (start and day < start) or (end and day > end):
+                continue
+            if store.compact(kind, sym, day):
+                count += 1
+                if not quiet:
+                    print(f"✅ {kind} {sym} {day}")
+    print(f"Compacted {count} day tables in {store.name}")
+
+
+def bench(stores, kind, tickers, columns=None):
+    for store in stores:
+        days = store.days(kind, tickers)
+        t0 = time.perf_counter()
+        frames = [store.read(kind, s, d, columns=columns, timestamp="epoch") for s, d in days]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        elapsed = time.perf_counter() - t0
+        mb = df.memory_usage(deep=True).sum() / 1e6
+        print(f"{store.name:<8} {len(days):>4} days  {len(df):>8} rows  {elapsed * 1000:>8.1f} ms  {mb:>7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert and benchmark GEX day stores")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("convert", help="Copy day tables from one store to another")
+    c.add_argument("--from", dest="src", default="csv", choices=STORES)
+    c.add_argument("--to", dest="dst", default="parquet", choices=STORES)
+    c.add_argument("--kinds", default=",".join(KINDS))
+    c.add_argument("--ticker", nargs="*", default=None, help="Tickers (default all)")
+    c.add_argument("--start", default=None, help="YYYYMMDD")
+    c.add_argument("--end", default=None, help="YYYYMMDD")
+    c.add_argument("--quiet", action="store_true")
+    b = sub.add_parser("bench", help="Time loading every day of one kind from each store")
+    b.add_argument("--kind", default="regimes", choices=KINDS)
+    b.add_argument("--ticker", nargs="*", default=None)
+    b.add_argument("--columns", default=None, help="Comma-separated projection, e.g. timestamp,spot,breakout_ok")
+    k = sub.add_parser("compact", help="Fold each day's appended parquet parts into one file")
+    k.add_argument("--store", default=DAY_STORE if DAY_STORE in ("parquet", "matrix") else "parquet",
+                   choices=("parquet", "matrix"))
+    k.add_argument("--kinds", default=",".join(KINDS))
+    k.add_argument("--ticker", nargs="*", default=None, help="Tickers (default all)")
+    k.add_argument("--start", default=None, help="YYYYMMDD")
+    k.add_argument("--end", default=None, help="YYYYMMDD")
+    k.add_argument("--quiet", action="store_true")
+    q = sub.add_parser("query", help="Rows of one kind across days, optionally within a time-of-day window")
+    q.add_argument("--store", default="sqlite", choices=STORES)
+    q.add_argument("--kind", default="regimes", choices=KINDS + ("oi",))
+    q.add_argument("--ticker", nargs="*", default=None)
+    q.add_argument("--start", default=None, help="YYYYMMDD[hhmm]")
+    q.add_argument("--end", default=None, help="YYYYMMDD[hhmm], inclusive")
+    q.add_argument("--time", default=None, help="Time-of-day window HH:MM-HH:MM, e.g. 10:00-11:30")
+    q.add_argument("--columns", default=None, help="Comma-separated projection")
+    q.add_argument("--out", default=None, help="Write the rows to this CSV instead of printing them")
+    for p in (c, b, k, q):
+        p.add_argument("--base_dir", default=str(BASE_DIR))
+    args = parser.parse_args()
+
+    if args.cmd == "convert":
+        convert(get_day_store(args.src, args.base_dir), get_day_store(args.dst, args.base_dir),
+                [k.strip() for k in args.kinds.split(",")], args.ticker, args.start, args.end, args.quiet)
+    elif args.cmd == "compact":
+        compact_days(get_day_store(args.store, args.base_dir), [k.strip() for k in args.kinds.split(",")],
+                     args.ticker, args.start, args.end, args.quiet)
+    elif args.cmd == "query":
+        time_from, time_to = args.time.split("-") if args.time else (None, None)
+        columns = [c.strip() for c in args.columns.split(",")] if args.columns else None
+        df = query_range(get_day_store(args.store, args.base_dir), args.kind, args.ticker,
+                         args.start, args.end, time_from, time_to, columns)
+        if args.out:
+            write_csv(df, args.out)
+            print(f"✅ {len(df)} rows → {args.out}")
+        else:
+            print(df.to_csv(index=False), end="")
+    else:
+        columns = [c.strip() for c in args.columns.split(",")] if args.columns else None
+        bench([get_day_store(s, args.base_dir) for s in STORES], args.kind, args.ticker, columns)
+
+
+if __name__ == "__main__":
+    main()
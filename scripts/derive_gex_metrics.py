@@ -4,6 +4,10 @@ from datetime import datetime
 import pandas as pd
 import math
 
+from day_store import get_day_store, epoch_minutes_to_ts, read_csv_tail, merge_csv, STORES
+import atomic_io
+from calculation_helpers import INDEX_STRIKE_STEPS  # same grid the collector uses
+
 BASE_DIR = Path(r"D:\TradingData")
 
 
@@ -11,7 +15,7 @@ def strike_step_for(ticker: str, default_spx_step: int = 10) -> int:
     t = ticker.upper()
     if t == "SPX":
         return default_spx_step
-    return 1
+    return INDEX_STRIKE_STEPS.get(t, 1)
 
 
 def find_zgamma(strikes, net_gex, spot):
@@ -153,8 +157,29 @@ def process_one_snap(df_snap, ticker, spx_step):
 
 
 def derive_for_day(ticker: str, yyyymmdd: str, spx_step: int = 10, latest_only: bool = False, full: bool = False,
-                   input_file: str = None, output_dir: str = None):
+                   input_file: str = None, output_dir: str = None, store: str = None):
     month = yyyymmdd[:6]
+    day_store = None if input_file or output_dir else get_day_store(store, BASE_DIR)
+    if day_store is not None and day_store.name != "csv":
+        # columnar store: typed snapshots in, metrics day table out
+        if not day_store.exists("gex", ticker, yyyymmdd):
+            print(f"Missing GEX day: {day_store.path('gex', ticker, yyyymmdd)}")
+            return None, None
+        existing_ts = set()
+        if not (latest_only or full):
+            existing_ts = set(day_store.read("metrics", ticker, yyyymmdd, columns=["timestamp"])["timestamp"])
+        if day_store.name == "matrix":
+            # unmapped once derived, so the collector can still grow (swap) the day file on Windows
+            with day_store.matrix(ticker, yyyymmdd) as m:
+                rows = _derive(*_matrix_snapshots(m), ticker, spx_step, latest_only, full, existing_ts)
+        else:
+            # --latest needs the newest snapshot only
+            df = day_store.tail("gex", ticker, yyyymmdd, 1) if latest_only else day_store.read("gex", ticker, yyyymmdd)
+            # stored as float32; compute in float64 like the CSV path
+            df = df.astype({c: "float64" for c in ("call_gex", "put_gex", "net_gex") if c in df.columns})
+            rows = _derive(*_grouped_snapshots(df), ticker, spx_step, latest_only, full, existing_ts)
+        return rows, day_store.path("metrics", ticker, yyyymmdd)
+
     # Resolve input
     if input_file:
         gex_path = Path(input_file)
@@ -164,7 +189,8 @@ def derive_for_day(ticker: str, yyyymmdd: str, spx_step: int = 10, latest_only:
         print(f"Missing GEX file: {gex_path}")
         return None, None
 
-    df = pd.read_csv(gex_path)
+    # --latest reads just the last snapshot's rows off the end of the file
+    df = read_csv_tail(gex_path, 1)[0] if latest_only else pd.read_csv(gex_path)
     # normalize columns
     cols = {c.lower(): c for c in df.columns}
     df = df.rename(columns={v: k for k, v in cols.items()})
@@ -177,8 +203,6 @@ def derive_for_day(ticker: str, yyyymmdd: str, spx_step: int = 10, latest_only:
     if missing:
         raise ValueError(f"Missing columns in {gex_path}: {missing}")
 
-    # decide which timestamps to compute
-    out_rows = []
     # Resolve output path
     if output_dir:
         analysis_dir = Path(output_dir)
@@ -186,29 +210,49 @@ def derive_for_day(ticker: str, yyyymmdd: str, spx_step: int = 10, latest_only:
     else:
         analysis_dir = BASE_DIR / month / "analysis"
         out_path = analysis_dir / f"{ticker.upper()}_GEX_{yyyymmdd}_metrics.csv"
-    all_ts = sorted(df["timestamp"].unique())
+    existing_ts = set()
+    if not (latest_only or full):
+        # incremental: only timestamps not already present in metrics file
+        if out_path.exists():
+            existing = pd.read_csv(out_path)
+            if "timestamp" in existing.columns:
+                existing_ts = set(existing["timestamp"].astype(str).tolist())
+    return _derive(*_grouped_snapshots(df), ticker, spx_step, latest_only, full, existing_ts), out_path
+
+
+def _grouped_snapshots(df):
+    """(sorted timestamps, timestamp -> snapshot rows) of a long GEX table"""
+    groups = df.groupby("timestamp")
+    return sorted(groups.groups), groups.get_group
+
+
+def _matrix_snapshots(m):
+    """Same as _grouped_snapshots, read row by row from a GEX matrix instead of regrouped"""
+    all_ts = epoch_minutes_to_ts(pd.Series(m.ts)).tolist()
+    rows = {ts: i for i, ts in enumerate(all_ts)}
+
+    def snapshot(ts):
+        _, strikes, call_g, put_g, net_g, spot = m.row(rows[ts])
+        return pd.DataFrame({"timestamp": ts, "strike": strikes, "call_gex": call_g.astype("float64"),
+                             "put_gex": put_g.astype("float64"), "net_gex": net_g.astype("float64"),
+                             "spot": spot})
+    return sorted(rows), snapshot
+
+
+def _derive(all_ts, snapshot, ticker, spx_step, latest_only, full, existing_ts):
+    # decide which timestamps to compute
+    out_rows = []
 
     if latest_only:
         target_ts = [all_ts[-1]] if all_ts else []
     elif full:
         target_ts = all_ts
     else:
-        # incremental: only timestamps not already present in metrics file
-        if out_path.exists():
-            existing = pd.read_csv(out_path)
-            if "timestamp" in existing.columns:
-                existing_ts = set(existing["timestamp"].astype(str).tolist())
-            else:
-                existing_ts = set()
-        else:
-            existing_ts = set()
         target_ts = [ts for ts in all_ts if ts not in existing_ts]
 
-    for ts, snap in df.groupby("timestamp"):
-        if ts not in target_ts:
-            continue
+    for ts in target_ts:
         # enforce numeric types
-        snap = snap.copy()
+        snap = snapshot(ts).copy()
         for c in ["strike", "call_gex", "put_gex", "net_gex", "spot"]:
             if c in snap.columns:
                 snap[c] = pd.to_numeric(snap[c], errors="coerce")
@@ -217,7 +261,7 @@ def derive_for_day(ticker: str, yyyymmdd: str, spx_step: int = 10, latest_only:
     out = pd.DataFrame(out_rows)
     if not out.empty:
         out = out.sort_values("timestamp")
-    return out, out_path
+    return out
 
 
 def main():
@@ -231,6 +275,8 @@ def main():
     parser.add_argument("--full", default='N', help="Recompute entire day (Y/N). Overrides --latest")
     parser.add_argument("--input_file", default=None, help="Optional explicit input GEX CSV path")
     parser.add_argument("--output", default=None, help="Optional output directory for metrics CSVs")
+    parser.add_argument("--store", default=None, choices=STORES,
+                        help="Day store to read snapshots from and write metrics to (default DAY_STORE or csv)")
     args = parser.parse_args()
     latest_only = str(args.latest).strip().upper().startswith('Y')
     full = str(args.full).strip().upper().startswith('Y')
@@ -240,29 +286,26 @@ def main():
     df, out_path = derive_for_day(
         args.ticker.upper(), args.date, args.spx_step,
         latest_only=latest_only, full=full,
-        input_file=args.input_file, output_dir=args.output
+        input_file=args.input_file, output_dir=args.output, store=args.store
     )
     if df is None:
         return
     write_csv = str(args.csv).strip().upper().startswith('Y')
+    day_store = get_day_store(args.store, BASE_DIR)
     if write_csv:
         if df.empty:
             if not args.quiet:
                 print("No new timestamps to write.")
             return
         out_path.parent.mkdir(parents=True, exist_ok=True)
-        if full or not out_path.exists():
+        if day_store.name != "csv" and not (args.input_file or args.output):
+            day_store.write("metrics", args.ticker, args.date, df, mode="replace" if full else "merge")
+        elif full or not out_path.exists():
             # overwrite for full recompute or first write
-            df.to_csv(out_path, index=False)
+            atomic_io.write_csv(df, out_path)
         else:
-            # append and de-dupe on timestamp
-            existing = pd.read_csv(out_path) if out_path.exists() else pd.DataFrame()
-            combined = pd.concat([existing, df], ignore_index=True)
-            if "timestamp" in combined.columns:
-                combined["timestamp"] = combined["timestamp"].astype(str)
-                combined = combined.drop_duplicates(subset=["timestamp"], keep="last")
-            combined = combined.sort_values("timestamp")
-            combined.to_csv(out_path, index=False)
+            # append and de-dupe on timestamp; a newer snapshot only touches the end of the file
+            merge_csv(out_path, df)
         if not args.quiet:
             print(f"✅ Wrote {len(df)} new rows → {out_path}")
     else:
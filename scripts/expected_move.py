@@ -4,7 +4,7 @@ from datetime import datetime
 from zoneinfo import ZoneInfo
 from ib_insync import IB, Stock
 from ib_connection import warmup, connect_ib
-from data_helpers import batch_data, fetch_stock_ticker
+from data_helpers import batch_data, fetch_spot_price
 
 from calculation_helpers import expected_move
 from data_helpers        import fetch_atm_iv, fetch_option_data
@@ -29,9 +29,7 @@ async def main(ticker, expiry, data_type, quiet):
 
             
         # spot
-        requested_ticker = await fetch_stock_ticker(ib, ticker)
-    
-        spot = requested_ticker.last
+        spot = await fetch_spot_price(ib, ticker)
 
         if not quiet:
             print(f"{ticker} spot price: {spot}")
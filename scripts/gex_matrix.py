@@ -0,0 +1,277 @@
+"""
+GEX matrix: one trading day of one ticker as a fixed-width binary file that
+readers open with numpy.memmap.
+
+The day is a preallocated snapshot × strike grid of call/put/net GEX plus a
+timestamp and spot per snapshot. Strikes sit on a regular grid
+(strike0 + i * step); cells of strikes a snapshot did not report are NaN.
+
+Layout (little-endian), every section at a fixed offset:
+
+    header   64 bytes: magic, version, n_strikes, capacity, count, strike0, step
+    ts       int64   [capacity]               epoch minutes (naive wall-clock)
+    spot     float64 [capacity]
+    call     float32 [capacity, n_strikes]
+    put      float32 [capacity, n_strikes]
+    net      float32 [capacity, n_strikes]
+
+Appending writes one row into each section and then bumps `count`, which is
+the commit point: readers only look at rows [0, count), so they never see a
+half-written snapshot. A snapshot outside the strike grid or past the
+capacity rewrites the file once with room to spare (new file + os.replace);
+open readers keep their old mapping until `refresh()`. Windows cannot rename
+over a mapped file, so the writer drops its own mappings before every swap
+and retries while another process's reader still has it open
+(atomic_io.replace); readers should `close()` (or use `with`) when done.
+
+    m = GexMatrix.open(path)          # zero-copy views, nothing is parsed
+    m.net[:, m.strike_index(500)]     # net GEX at 500 through the day
+    m.net.T                           # strike × time
+"""
+
+import os
+import struct
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import atomic_io
+
+###############################################################################
+# 1.  Constants
+###############################################################################
+
+MAGIC = b"GEXM"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxIII4xdd")    # magic, version, n_strikes, capacity, count, strike0, step
+HEADER_SIZE = 64
+COUNT_OFFSET = 16                          # where `count` sits inside HEADER
+
+CAPACITY = int(os.environ.get("GEX_MATRIX_CAPACITY", "400"))        # snapshots; a 1-minute day is 390
+PAD_STRIKES = int(os.environ.get("GEX_MATRIX_PAD_STRIKES", "25"))   # spare strikes each side of the first snapshot
+SUFFIX = ".gexm"
+EPOCH = datetime(1970, 1, 1)
+
+
+###############################################################################
+# 2.  Reader
+###############################################################################
+
+def _sections(n_strikes: int, capacity: int):
+    """[(name, dtype, shape, offset)] of the data sections"""
+    out, offset = [], HEADER_SIZE
+    for name, dtype, shape in (("ts", np.int64, (capacity,)),
+                               ("spot", np.float64, (capacity,)),
+                               ("call", np.float32, (capacity, n_strikes)),
+                               ("put", np.float32, (capacity, n_strikes)),
+                               ("net", np.float32, (capacity, n_strikes))):
+        out.append((name, dtype, shape, offset))
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return out, offset
+
+
+class GexMatrix:
+    """Memory-mapped view of one day file; `ts`, `spot`, `call`, `put`, `net` cover the committed rows"""
+
+    def __init__(self, path, mode: str = "r"):
+        self.path = Path(path)
+        self.mode = mode
+        self._map()
+
+    @classmethod
+    def open(cls, path, mode: str = "r") -> "GexMatrix":
+        return cls(path, mode)
+
+    def _map(self):
+        with open(self.path, "rb") as f:
+            magic, version, n_strikes, capacity, _, strike0, step = HEADER.unpack(f.read(HEADER.size))
+            self._inode = os.fstat(f.fileno()).st_ino
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a v{VERSION} GEX matrix")
+        self.n_strikes, self.capacity, self.strike0, self.step = n_strikes, capacity, strike0, step
+        # one mapping of the whole file; the header count and the sections are views into it
+        self._mm = np.memmap(self.path, dtype=np.uint8, mode=self.mode)
+        self._header = self._mm[COUNT_OFFSET:COUNT_OFFSET + 4].view(np.uint32)
+        self._arrays = {}
+        for name, dtype, shape, offset in _sections(n_strikes, capacity)[0]:
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            self._arrays[name] = self._mm[offset:offset + nbytes].view(dtype).reshape(shape)
+        self.count = int(self._header[0])
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        """Drop the mapping (arrays taken from it keep it alive until they go too)"""
+        self._arrays, self._header, self._mm = {}, None, None
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def refresh(self) -> int:
+        """Pick up rows appended (or a file rewritten) by another process; returns the row count"""
+        if os.stat(self.path).st_ino != self._inode:
+            self._map()
+        else:
+            self.count = int(self._header[0])
+        return self.count
+
+    def __len__(self):
+        return self.count
+
+    def __getattr__(self, name):
+        arrays = self.__dict__.get("_arrays", {})
+        if name in arrays:
+            return arrays[name][:self.count]
+        raise AttributeError(name)
+
+    @property
+    def strikes(self) -> np.ndarray:
+        return self.strike0 + self.step * np.arange(self.n_strikes)
+
+    def strike_index(self, strike: float) -> int:
+        i = int(round((strike - self.strike0) / self.step))
+        if not 0 <= i < self.n_strikes or abs(self.strike0 + i * self.step - strike) > 1e-6:
+            raise KeyError(strike)
+        return i
+
+    def row(self, i: int):
+        """(timestamp, strikes, call, put, net, spot) of snapshot `i`, reported strikes only"""
+        keep = ~np.isnan(self.net[i])
+        return (int(self.ts[i]), self.strikes[keep], self.call[i][keep], self.put[i][keep],
+                self.net[i][keep], float(self.spot[i]))
+
+    def to_frame(self, start: int = 0) -> pd.DataFrame:
+        """The long timestamp/strike/call_gex/put_gex/net_gex/spot table the CSV holds (timestamp as epoch minutes),
+        from snapshot `start` on (negative counts from the end)"""
+        start = max(0, self.count + start) if start < 0 else start
+        rows, cols = np.nonzero(~np.isnan(self.net[start:]))
+        rows += start
+        return pd.DataFrame({
+            "timestamp": self.ts[rows],
+            "strike": self.strikes[cols],
+            "call_gex": self.call[rows, cols],
+            "put_gex": self.put[rows, cols],
+            "net_gex": self.net[rows, cols],
+            "spot": self.spot[rows],
+        })
+
+
+###############################################################################
+# 3.  Writer
+###############################################################################
+
+def _cents(values) -> np.ndarray:
+    return np.round(np.asarray(values, dtype=np.float64) * 100).astype(np.int64)
+
+
+def _grid_for(strikes_cents: np.ndarray, base=None):
+    """(strike0, step, n_strikes) in cents covering `strikes_cents`, plus the grid `base` if given"""
+    unique = np.unique(strikes_cents)
+    lo, hi = int(unique[0]), int(unique[-1])
+    step = int(np.gcd.reduce(np.diff(unique))) if len(unique) > 1 else 100
+    if base is not None:
+        b0, bstep, bn = base
+        # the finer grid must still hit every old strike
+        step = int(np.gcd.reduce(np.concatenate(([step, bstep], np.abs(unique - b0)))))
+        lo, hi = min(lo, b0), max(hi, b0 + bstep * (bn - 1))
+    return lo - PAD_STRIKES * step, step, (hi - lo) // step + 1 + 2 * PAD_STRIKES
+
+
+def create(path, strike0: float, step: float, n_strikes: int, capacity: int = CAPACITY):
+    """Preallocate an empty day file (all cells NaN)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    sections, size = _sections(n_strikes, capacity)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, n_strikes, capacity, 0, strike0, step).ljust(HEADER_SIZE, b"\0"))
+        f.truncate(size)
+    for name, dtype, shape, offset in sections:
+        if name in ("spot", "call", "put", "net"):
+            a = np.memmap(tmp, dtype=dtype, mode="r+", offset=offset, shape=shape)
+            a[:] = np.nan
+            a.flush()
+            del a  # unmapped before the swap
+    atomic_io.replace(tmp, path)
+
+
+def _rewrite(path, old: GexMatrix, strike0: float, step: float, n_strikes: int, capacity: int):
+    """Copy the committed rows of `old` onto a bigger grid and swap the file in; closes `old`"""
+    tmp = path.with_name(path.name + ".grow")
+    create(tmp, strike0, step, n_strikes, capacity)
+    new = GexMatrix(tmp, "r+")
+    cols = np.round((old.strikes - strike0) / step).astype(np.int64)
+    n = old.count
+    new._arrays["ts"][:n] = old.ts
+    new._arrays["spot"][:n] = old.spot
+    for name in ("call", "put", "net"):
+        new._arrays[name][:n, cols] = getattr(old, name)
+    new._header[0] = n
+    new.flush()
+    new.close()
+    old.close()
+    atomic_io.replace(tmp, path)
+
+
+def append(path, timestamp: int, strikes, call, put, net, spot: float) -> int:
+    """
+    Append one snapshot (timestamp in epoch minutes) and return its row.
+    O(1) unless the snapshot falls outside the file's strike grid or capacity.
+    """
+    path = Path(path)
+    cents = _cents(strikes)
+    if not path.exists():
+        s0, step, n = _grid_for(cents)
+        create(path, s0 / 100, step / 100, n)
+    m = GexMatrix(path, "r+")
+    base = (int(round(m.strike0 * 100)), int(round(m.step * 100)), m.n_strikes)
+    offsets = cents - base[0]
+    off_grid = (offsets < 0).any() or (offsets >= base[1] * base[2]).any() or (offsets % base[1]).any()
+    if off_grid or m.count >= m.capacity:
+        s0, step, n = _grid_for(cents, base) if off_grid else base
+        capacity = 2 * m.capacity if m.count >= m.capacity else m.capacity
+        _rewrite(path, m, s0 / 100, step / 100, n, capacity)
+        m = GexMatrix(path, "r+")
+    i = m.count
+    cols = np.round((cents / 100 - m.strike0) / m.step).astype(np.int64)
+    m._arrays["ts"][i] = timestamp
+    m._arrays["spot"][i] = spot
+    for name, values in (("call", call), ("put", put), ("net", net)):
+        row = m._arrays[name][i]
+        row[:] = np.nan
+        row[cols] = values
+    m.flush()
+    # commit: readers see the row only once the data is on disk
+    m._header[0] = i + 1
+    m.flush()
+    m.close()
+    return i
+
+
+def epoch_minutes(timestamp) -> int:
+    """'YYYYMMDDhhmm' (or an epoch-minute number) -> epoch minutes"""
+    if isinstance(timestamp, (int, np.integer)):
+        return int(timestamp)
+    dt = datetime.strptime(str(timestamp).split(".")[0][:12], "%Y%m%d%H%M")
+    return (dt - EPOCH) // timedelta(minutes=1)
+
+
+def append_frame(path, df: pd.DataFrame) -> int:
+    """Append every snapshot of a long timestamp/strike/call_gex/put_gex/net_gex[/spot] table; returns snapshots appended"""
+    if df.empty:
+        return 0
+    order = np.argsort(df["timestamp"].to_numpy(), kind="stable")
+    ts = df["timestamp"].to_numpy()[order]
+    cols = [df[c].to_numpy(dtype=np.float64)[order] for c in ("strike", "call_gex", "put_gex", "net_gex")]
+    spot = df["spot"].to_numpy(dtype=np.float64)[order] if "spot" in df.columns else np.full(len(ts), np.nan)
+    starts = [0, *(np.flatnonzero(ts[1:] != ts[:-1]) + 1)]
+    for lo, hi in zip(starts, [*starts[1:], len(ts)]):
+        append(path, epoch_minutes(ts[lo]), *(c[lo:hi] for c in cols), float(spot[lo]))
+    return len(starts)
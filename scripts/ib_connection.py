@@ -1,6 +1,10 @@
 ﻿import asyncio
+import os
 from ib_insync import IB, Stock
 
+IB_HOST = os.environ.get("IB_HOST", "127.0.0.1")
+IB_PORT = int(os.environ.get("IB_PORT", "4001"))   # point at scripts/mock_gateway.py for offline runs
+
 async def warmup (ib, data_type):
     ib.reqMarketDataType(data_type)  # 1 = live
     ib.reqMktData(Stock('SPY','SMART','USD'), '', snapshot=True)
@@ -8,7 +12,7 @@ async def warmup (ib, data_type):
 ###############################################################################
 #  Connection helpers
 ###############################################################################
-async def connect_ib(host: str = "127.0.0.1", port: int = 4001, client_id: int = 17) -> IB:
+async def connect_ib(host: str = IB_HOST, port: int = IB_PORT, client_id: int = 17) -> IB:
     """Return a connected & warmed‑up IB instance."""
     ib = IB()
     await ib.connectAsync(host, port, clientId=client_id)
@@ -0,0 +1,628 @@
+"""
+Local stand-in for TWS / IB Gateway, for offline benchmarks of the fetch layer.
+
+Speaks the part of the TWS socket protocol ib_insync uses here: handshake,
+startApi, the connect-time sync requests, contract details, secDefOptParams,
+market data (prices, OI, greeks, IV), historical bars and currentTime.
+Chains are synthetic or replayed from a JSON recording (see --record / --dump).
+Responses are delayed by latency + jitter and fields can be dropped at
+configurable rates, so slow or incomplete gateways can be reproduced.
+
+    python mock_gateway.py --port 4002 --latency 0.05 --jitter 0.05 --missing-rate 0.05
+    IB_PORT=4002 python option_async_multi.py --tickers SPY,QQQ --quiet
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import struct
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from pacing import IB_MAX_LINES, IB_MAX_MSG_RATE
+from helpers.contract_cache import INDEXES
+
+###############################################################################
+# 1.  Constants
+###############################################################################
+
+SERVER_VERSION = 176          # ib_insync 0.9.86 speaks 157..176
+ACCOUNT = "DU0000001"
+CONID_UNDERLYING = 1000
+CONID_OPTION = 10_000_000
+
+# symbol -> (spot, strike step, base IV) for the synthetic book
+SYNTHETIC = {
+    "SPY": (500.0, 1.0, 0.15),
+    "QQQ": (430.0, 1.0, 0.19),
+    "IWM": (210.0, 1.0, 0.22),
+    "SPX": (5000.0, 5.0, 0.15),
+    "NDX": (18000.0, 25.0, 0.19),
+}
+SYNTHETIC_EXPIRIES = 5
+SYNTHETIC_WIDTH_PCT = 0.15     # strikes listed within ±15 % of spot
+
+# tick types (see ib_insync.wrapper)
+TICK_BID, TICK_ASK, TICK_LAST, TICK_CLOSE = 1, 2, 4, 9
+TICK_VOLUME, TICK_CALL_OI, TICK_PUT_OI = 8, 27, 28
+TICK_OPTION_IV = 24
+TICK_MODEL_OPTION = 13
+
+MISSING_FIELDS = ("last", "close", "oi", "greeks", "iv")
+
+
+###############################################################################
+# 2.  Option book
+###############################################################################
+
+def _norm_pdf(x):
+    return math.exp(-0.5 * x * x) / math.sqrt(2 * math.pi)
+
+
+def _norm_cdf(x):
+    return 0.5 * (1 + math.erf(x / math.sqrt(2)))
+
+
+def black_scholes(spot, strike, years, iv, right):
+    """(price, delta, gamma, vega, theta) with zero rates"""
+    years = max(years, 1 / 365)
+    sd = iv * math.sqrt(years)
+    d1 = (math.log(spot / strike) + 0.5 * sd * sd) / sd
+    d2 = d1 - sd
+    gamma = _norm_pdf(d1) / (spot * sd)
+    vega = spot * _norm_pdf(d1) * math.sqrt(years) / 100
+    theta = -spot * _norm_pdf(d1) * iv / (2 * math.sqrt(years)) / 365
+    if right == "C":
+        return spot * _norm_cdf(d1) - strike * _norm_cdf(d2), _norm_cdf(d1), gamma, vega, theta
+    return strike * _norm_cdf(-d2) - spot * _norm_cdf(-d1), _norm_cdf(d1) - 1, gamma, vega, theta
+
+
+def _weekdays(start, n):
+    days, day = [], start
+    while len(days) < n:
+        if day.weekday() < 5:
+            days.append(day.strftime("%Y%m%d"))
+        day += timedelta(days=1)
+    return days
+
+
+def synthetic_symbol(symbol, spot, step, base_iv, n_expiries=SYNTHETIC_EXPIRIES,
+                     width_pct=SYNTHETIC_WIDTH_PCT, seed=0):
+    """Chain for one symbol with a smile, OI peaked near the money and round-strike bumps"""
+    rng = random.Random(f"{seed}|{symbol}")
+    today = date.today()
+    lo = math.floor(spot * (1 - width_pct) / step) * step
+    strikes = [round(lo + i * step, 2) for i in range(int(2 * spot * width_pct / step) + 2)]
+    expirations = {}
+    for n, exp in enumerate(_weekdays(today, n_expiries)):
+        years = (datetime.strptime(exp, "%Y%m%d").date() - today).days / 365
+        rows = {}
+        for strike in strikes:
+            moneyness = math.log(strike / spot)
+            iv = base_iv * (1 + 2.5 * moneyness * moneyness - 0.4 * moneyness)
+            bump = 3 if strike % (step * 10) == 0 else 1
+            legs = {}
+            for right in ("C", "P"):
+                price, delta, gamma, vega, theta = black_scholes(spot, strike, years, iv, right)
+                legs[right] = {
+                    "oi": int(rng.uniform(0.3, 1.0) * bump * 20000 * math.exp(-40 * moneyness * moneyness) / (n + 1)),
+                    "iv": round(iv, 6), "delta": delta, "gamma": gamma, "vega": vega, "theta": theta,
+                    "price": round(max(price, 0.01), 2),
+                }
+            rows[str(strike)] = legs
+        expirations[exp] = rows
+    return {"spot": spot, "close": round(spot * (1 - rng.uniform(-0.01, 0.01)), 2), "expirations": expirations}
+
+
+def synthetic_book(symbols=None, seed=0):
+    symbols = symbols or list(SYNTHETIC)
+    return {"symbols": {s: synthetic_symbol(s, *SYNTHETIC[s], seed=seed) for s in symbols}}
+
+
+class OptionBook:
+    """Recorded or synthetic chains with stable conIds"""
+
+    def __init__(self, data):
+        self.symbols = {}
+        self.by_conid = {}
+        next_option = CONID_OPTION
+        for i, (symbol, entry) in enumerate(sorted(data["symbols"].items())):
+            symbol = symbol.upper()
+            exchange, opt_exchange, trading_class = INDEXES.get(symbol, ("SMART", "SMART", symbol))
+            sym = {
+                "symbol": symbol,
+                "conId": CONID_UNDERLYING + i,
+                "secType": "IND" if symbol in INDEXES else "STK",
+                "exchange": exchange,
+                "optionExchange": entry.get("optionExchange", opt_exchange),
+                "tradingClass": entry.get("tradingClass", trading_class),
+                "spot": entry["spot"],
+                "close": entry.get("close", entry["spot"]),
+                "options": {},  # (expiry, strike, right) -> leg
+            }
+            self.by_conid[sym["conId"]] = (sym, None)
+            for exp, rows in sorted(entry["expirations"].items()):
+                for strike, legs in rows.items():
+                    for right, leg in legs.items():
+                        key = (exp, float(strike), right)
+                        leg = dict(leg, conId=next_option, key=key)
+                        sym["options"][key] = leg
+                        self.by_conid[next_option] = (sym, leg)
+                        next_option += 1
+            self.symbols[symbol] = sym
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def expirations(self, sym):
+        return sorted({k[0] for k in sym["options"]})
+
+    def strikes(self, sym):
+        return sorted({k[1] for k in sym["options"]})
+
+    def match(self, c):
+        """(sym, leg) pairs matching a request contract, like reqContractDetails"""
+        if c["conId"]:
+            hit = self.by_conid.get(c["conId"])
+            return [hit] if hit else []
+        sym = self.symbols.get(c["symbol"].upper())
+        if sym is None:
+            return []
+        if c["secType"] != "OPT":
+            return [(sym, None)] if c["secType"] in ("", sym["secType"]) else []
+        if c["tradingClass"] and c["tradingClass"] != sym["tradingClass"]:
+            return []
+        if c["expiry"] and c["strike"] and c["right"]:
+            leg = sym["options"].get((c["expiry"], c["strike"], c["right"]))
+            return [(sym, leg)] if leg else []
+        return [(sym, leg) for key, leg in sym["options"].items()
+                if (not c["expiry"] or key[0] == c["expiry"])
+                and (not c["strike"] or key[1] == c["strike"])
+                and (not c["right"] or key[2] == c["right"])]
+
+
+###############################################################################
+# 3.  Wire format
+###############################################################################
+
+def encode(*fields):
+    """One length-prefixed API message"""
+    payload = "".join(f"{'' if f is None else f}\0" for f in fields).encode()
+    return struct.pack(">I", len(payload)) + payload
+
+
+def _strike(value):
+    try:
+        return float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+def parse_contract(fields, i):
+    """Request contract as sent by ib_insync (12 fields starting at i)"""
+    (con_id, symbol, sec_type, expiry, strike, right, multiplier,
+     exchange, primary, currency, local_symbol, trading_class) = fields[i:i + 12]
+    return {
+        "conId": int(con_id or 0), "symbol": symbol, "secType": sec_type, "expiry": expiry,
+        "strike": _strike(strike), "right": {"CALL": "C", "PUT": "P"}.get(right, right),
+        "exchange": exchange, "tradingClass": trading_class,
+    }, i + 12
+
+
+def contract_details_fields(req_id, sym, leg, exchange):
+    if leg is None:
+        return [10, req_id, sym["symbol"], sym["secType"], "", 0, "", exchange or sym["exchange"], "USD",
+                sym["symbol"], sym["symbol"], sym["symbol"], sym["conId"], 0.01, "",
+                "", sym["exchange"], 1, 0, sym["symbol"], "ARCA" if sym["secType"] == "STK" else "",
+                "", "", "", "", "US/Eastern", "", "", "", "", 0,
+                "", "", "", "", "", "", "", "", ""]
+    exp, strike, right = leg["key"]
+    local = f"{sym['symbol']:<6}{exp[2:]}{right}{int(round(strike * 1000)):08d}"
+    return [10, req_id, sym["symbol"], "OPT", exp, strike, right, exchange or sym["optionExchange"], "USD",
+            local, sym["tradingClass"], sym["tradingClass"], leg["conId"], 0.01, "100",
+            "", f"SMART,{sym['optionExchange']}", 1, sym["conId"], sym["symbol"], "",
+            exp[:6], "", "", "", "US/Eastern", "", "", "", "", 0,
+            "", sym["symbol"], sym["secType"], "", exp, "", "1", "1", "1"]
+
+
+###############################################################################
+# 4.  Gateway
+###############################################################################
+
+class GatewayStats:
+    def __init__(self):
+        self.requests = Counter()
+        self.lines_peak = 0
+        self.pacing_violations = 0
+        self.rejected_lines = 0
+        self.connections = 0
+
+    def format(self):
+        top = ", ".join(f"{name}={n}" for name, n in self.requests.most_common())
+        return (f"🧪 connections={self.connections} peak_lines={self.lines_peak} "
+                f"pacing_violations={self.pacing_violations} rejected_lines={self.rejected_lines}\n   {top}")
+
+
+REQUEST_NAMES = {
+    1: "reqMktData", 2: "cancelMktData", 9: "reqContractDetails", 20: "reqHistoricalData",
+    49: "reqCurrentTime", 59: "reqMarketDataType", 78: "reqSecDefOptParams",
+}
+
+
+class MockGateway:
+    """
+    Serves one OptionBook to any number of API clients.
+
+    latency / jitter   seconds added to every response (uniform jitter)
+    missing            field -> probability that the field never arrives on a line
+    tick_interval      seconds between updates on streaming lines (0 = no updates)
+    """
+
+    def __init__(self, book, latency=0.02, jitter=0.02, missing=None, tick_interval=1.0,
+                 max_lines=IB_MAX_LINES, max_msg_rate=IB_MAX_MSG_RATE, seed=None):
+        self.book = book
+        self.latency = latency
+        self.jitter = jitter
+        self.missing = {f: 0.0 for f in MISSING_FIELDS}
+        self.missing.update(missing or {})
+        self.tick_interval = tick_interval
+        self.max_lines = max_lines
+        self.max_msg_rate = max_msg_rate
+        self.rng = random.Random(seed)
+        self.stats = GatewayStats()
+
+    def delay(self):
+        return self.latency + self.rng.uniform(0, self.jitter)
+
+    def dropped(self, field):
+        return self.rng.random() < self.missing[field]
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"🧪 Mock gateway on {host}:{port} serving {', '.join(self.book.symbols)}")
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        session = _Session(self, writer)
+        self.stats.connections += 1
+        try:
+            if await reader.readexactly(4) != b"API\0":
+                return
+            await session.read_message(reader)  # "v157..176"
+            writer.write(encode(SERVER_VERSION, datetime.now().strftime("%Y%m%d %H:%M:%S EST")))
+            while True:
+                fields = await session.read_message(reader)
+                session.dispatch(fields)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            session.close()
+            writer.close()
+
+
+class _Session:
+    """State of one API client connection"""
+
+    def __init__(self, gateway, writer):
+        self.gw = gateway
+        self.writer = writer
+        self.lines = {}  # reqId -> (sym, leg, generic ticks)
+        self.timers = set()
+        self.second, self.received = 0, 0
+        self.ticker_task = None
+        self.handlers = {
+            71: self.start_api, 61: lambda f: self.send(62, 1), 5: lambda f: self.send(53, 1),
+            99: lambda f: self.send(102), 6: lambda f: self.send(54, 1, f[3]),
+            76: lambda f: self.send(74, 1, f[2]), 7: lambda f: self.send(55, 1, f[2]),
+            17: lambda f: self.send(15, 1, ACCOUNT),
+            49: lambda f: self.later(self.send, 49, 1, int(time.time())),
+            9: self.contract_details, 78: self.sec_def_opt_params,
+            1: self.market_data, 2: self.cancel_market_data, 20: self.historical_data,
+        }
+
+    async def read_message(self, reader):
+        size = struct.unpack(">I", await reader.readexactly(4))[0]
+        return (await reader.readexactly(size)).decode(errors="replace").split("\0")[:-1]
+
+    def close(self):
+        for handle in self.timers:
+            handle.cancel()
+        if self.ticker_task:
+            self.ticker_task.cancel()
+
+    # ── sending ──────────────────────────────────────────────────────────────
+    def send(self, *fields):
+        if not self.writer.is_closing():
+            self.writer.write(encode(*fields))
+
+    def later(self, callback, *args):
+        loop = asyncio.get_running_loop()
+
+        def fire():
+            self.timers.discard(handle)
+            callback(*args)
+
+        handle = loop.call_later(self.gw.delay(), fire)
+        self.timers.add(handle)
+
+    def error(self, req_id, code, text):
+        self.send(4, 2, req_id, code, text, "")
+
+    # ── requests ─────────────────────────────────────────────────────────────
+    def pace(self):
+        """Count messages per wall-clock second, like the gateway's 50 msg/s limit"""
+        second = int(time.monotonic())
+        if second != self.second:
+            self.second, self.received = second, 0
+        self.received += 1
+        if self.received == self.gw.max_msg_rate + 1:
+            self.gw.stats.pacing_violations += 1
+            self.error(-1, 100, "Max rate of messages per second has been exceeded")
+
+    def dispatch(self, fields):
+        msg_id = int(fields[0])
+        self.gw.stats.requests[REQUEST_NAMES.get(msg_id, f"msg{msg_id}")] += 1
+        self.pace()
+        handler = self.handlers.get(msg_id)
+        if handler:
+            handler(fields)
+
+    def start_api(self, fields):
+        self.send(9, 1, 1)
+        self.send(15, 1, ACCOUNT)
+
+    def contract_details(self, fields):
+        req_id = fields[2]
+        contract, _ = parse_contract(fields, 3)
+        matches = self.gw.book.match(contract)
+
+        def respond():
+            if not matches:
+                self.error(req_id, 200, "No security definition has been found for the request")
+                return
+            for sym, leg in matches:
+                self.send(*contract_details_fields(req_id, sym, leg, contract["exchange"]))
+            self.send(52, 1, req_id)
+
+        self.later(respond)
+
+    def sec_def_opt_params(self, fields):
+        req_id, symbol = fields[1], fields[2].upper()
+        sym = self.gw.book.symbols.get(symbol)
+
+        def respond():
+            if sym is not None:
+                expirations = self.gw.book.expirations(sym)
+                strikes = self.gw.book.strikes(sym)
+                for exchange in dict.fromkeys((sym["optionExchange"], "SMART")):
+                    self.send(75, req_id, exchange, sym["conId"], sym["tradingClass"], "100",
+                              len(expirations), *expirations, len(strikes), *strikes)
+            self.send(76, req_id)
+
+        self.later(respond)
+
+    def market_data(self, fields):
+        req_id = fields[2]
+        contract, i = parse_contract(fields, 3)
+        if contract["secType"] == "BAG":
+            self.error(req_id, 321, "Combo market data is not supported by the mock gateway")
+            return
+        has_dnc = fields[i] == "1"
+        i += 4 if has_dnc else 1
+        generic_ticks, snapshot = fields[i], fields[i + 1] == "1"
+
+        matches = self.gw.book.match(contract)
+        if len(matches) != 1:
+            self.later(self.error, req_id, 200, "No security definition has been found for the request")
+            return
+        if not snapshot and len(self.lines) >= self.gw.max_lines:
+            self.gw.stats.rejected_lines += 1
+            self.later(self.error, req_id, 101, "Max number of tickers has been reached")
+            return
+        sym, leg = matches[0]
+        # fields dropped for this line stay missing for its whole lifetime, like a slow farm
+        dropped = {f for f in MISSING_FIELDS if self.gw.dropped(f)}
+        if not snapshot:
+            self.lines[req_id] = (sym, leg, generic_ticks, dropped)
+            self.gw.stats.lines_peak = max(self.gw.stats.lines_peak, len(self.lines))
+            if self.gw.tick_interval > 0 and self.ticker_task is None:
+                self.ticker_task = asyncio.ensure_future(self.stream_updates())
+
+        def respond():
+            if not snapshot and req_id not in self.lines:
+                return  # cancelled before the first ticks
+            self.send(58, 1, req_id, 1)
+            self.send_ticks(req_id, sym, leg, generic_ticks, dropped)
+            if snapshot:
+                self.send(57, 1, req_id)
+
+        self.later(respond)
+
+    def cancel_market_data(self, fields):
+        self.lines.pop(fields[2], None)
+
+    def send_ticks(self, req_id, sym, leg, generic_ticks, dropped, drift=0.0):
+        if leg is None:
+            last = sym["spot"] * (1 + drift)
+            if "last" not in dropped:
+                self.send(1, 6, req_id, TICK_LAST, round(last, 2), 100, 0)
+            self.send(1, 6, req_id, TICK_BID, round(last - 0.01, 2), 500, 0)
+            self.send(1, 6, req_id, TICK_ASK, round(last + 0.01, 2), 500, 0)
+            if "close" not in dropped:
+                self.send(1, 6, req_id, TICK_CLOSE, sym["close"], 0, 0)
+            return
+        price = max(0.01, leg["price"] * (1 + 5 * drift))
+        self.send(1, 6, req_id, TICK_BID, round(price * 0.98, 2), 10, 0)
+        self.send(1, 6, req_id, TICK_ASK, round(price * 1.02, 2), 10, 0)
+        ticks = generic_ticks.split(",")
+        if "101" in ticks and "oi" not in dropped:
+            self.send(2, 6, req_id, TICK_CALL_OI if leg["key"][2] == "C" else TICK_PUT_OI, leg["oi"])
+        if "106" in ticks and "iv" not in dropped:
+            self.send(45, 6, req_id, TICK_OPTION_IV, leg["iv"])
+        if "greeks" not in dropped:
+            self.send(21, req_id, TICK_MODEL_OPTION, 0, leg["iv"], leg["delta"], round(price, 4), 0,
+                      leg["gamma"], leg["vega"], leg["theta"], sym["spot"] * (1 + drift))
+
+    async def stream_updates(self):
+        """Random-walk refresh of every open line, one underlying drift per symbol"""
+        drifts = {}
+        while True:
+            await asyncio.sleep(self.gw.tick_interval)
+            for symbol in {sym["symbol"] for sym, *_ in self.lines.values()}:
+                drifts[symbol] = drifts.get(symbol, 0.0) + self.gw.rng.gauss(0, 0.0005)
+            for req_id, (sym, leg, generic_ticks, dropped) in list(self.lines.items()):
+                self.send_ticks(req_id, sym, leg, generic_ticks, dropped, drifts[sym["symbol"]])
+
+    def historical_data(self, fields):
+        req_id = fields[1]
+        contract, i = parse_contract(fields, 2)
+        end, bar_size, duration = fields[i + 1], fields[i + 2], fields[i + 3]
+        matches = self.gw.book.match(contract)
+        if len(matches) != 1:
+            self.later(self.error, req_id, 162, "Historical Market Data Service error message:No data")
+            return
+        sym, leg = matches[0]
+        bars = self.bars(leg["price"] if leg else sym["close"], bar_size, duration)
+
+        def respond():
+            start = bars[0][0] if bars else ""
+            flat = [v for bar in bars for v in bar]
+            self.send(17, req_id, start, end or (bars[-1][0] if bars else ""), len(bars), *flat)
+
+        self.later(respond)
+
+    def bars(self, close, bar_size, duration):
+        unit_s = {"sec": 1, "secs": 1, "min": 60, "mins": 60, "hour": 3600, "hours": 3600,
+                  "day": 86400, "week": 604800}
+        dur_s = {"S": 1, "D": 86400, "W": 604800, "M": 2592000, "Y": 31536000}
+        try:
+            n, unit = bar_size.split()
+            step = int(n) * unit_s[unit]
+            amount, kind = duration.split()
+            count = min(1000, max(1, int(amount) * dur_s[kind] // step))
+        except (KeyError, ValueError):
+            step, count = 86400, 2
+        now = datetime.now().replace(second=0, microsecond=0)
+        price, rows = close, []
+        for k in range(count):
+            at = now - timedelta(seconds=step * k)
+            label = at.strftime("%Y%m%d") if step >= 86400 else at.strftime("%Y%m%d  %H:%M:%S")
+            move = self.gw.rng.gauss(0, 0.002) * price
+            rows.append((label, round(price - move, 2), round(price + abs(move), 2),
+                         round(price - abs(move), 2), round(price, 2), 1000, round(price, 2), 10))
+            price -= move
+        return rows[::-1]
+
+
+###############################################################################
+# 5.  Recording from a live gateway
+###############################################################################
+
+async def record(host, port, client_id, symbols, n_expiries, width_pct, timeout=15.0, batch=90):
+    """Snapshot OI, IV and greeks of the nearest chains into the OptionBook JSON format"""
+    from ib_insync import IB
+    from helpers.contract_cache import get_contract_cache
+    from helpers.market_data import OPTION_TICKS, has_greeks, option_oi
+    from helpers.spot_price import get_spot_service
+
+    ib = IB()
+    await ib.connectAsync(host, port, clientId=client_id)
+    cache = get_contract_cache()
+    book = {"symbols": {}}
+    try:
+        for symbol in symbols:
+            spot, _ = await get_spot_service(ib).get_async(symbol)
+            chain = await cache.chain_async(ib, symbol)
+            strikes = [s for s in chain["strikes"] if abs(s - spot) <= spot * width_pct]
+            entry = {"spot": spot, "close": spot, "tradingClass": chain["tradingClass"],
+                     "optionExchange": chain["exchange"], "expirations": {}}
+            for expiry in chain["expirations"][:n_expiries]:
+                contracts = list((await cache.options_async(ib, symbol, expiry, strikes,
+                                                            trading_class=chain["tradingClass"])).values())
+                rows = entry["expirations"][expiry] = {}
+                for start in range(0, len(contracts), batch):
+                    chunk = contracts[start:start + batch]
+                    tickers = [ib.reqMktData(c, OPTION_TICKS, snapshot=False) for c in chunk]
+                    deadline = time.monotonic() + timeout
+                    while time.monotonic() < deadline and not all(
+                            option_oi(t) is not None and has_greeks(t) for t in tickers):
+                        await asyncio.sleep(0.2)
+                    for c in chunk:
+                        ib.cancelMktData(c)
+                    for t in tickers:
+                        g = t.modelGreeks
+                        if g is None:
+                            continue
+                        rows.setdefault(str(t.contract.strike), {})[t.contract.right] = {
+                            "oi": int(option_oi(t) or 0), "iv": g.impliedVol, "delta": g.delta,
+                            "gamma": g.gamma, "vega": g.vega, "theta": g.theta,
+                            "price": g.optPrice if g.optPrice and g.optPrice > 0 else 0.01,
+                        }
+                print(f"📼 {symbol} {expiry}: {len(rows)} strikes")
+            book["symbols"][symbol] = entry
+    finally:
+        get_spot_service(ib).close()
+        ib.disconnect()
+    return book
+
+
+###############################################################################
+# 6.  CLI
+###############################################################################
+
+def parse_missing(text, default):
+    missing = {f: default for f in MISSING_FIELDS}
+    for item in filter(None, (text or "").split(",")):
+        field, rate = item.split("=")
+        if field not in missing:
+            raise ValueError(f"Unknown field '{field}', expected one of {', '.join(MISSING_FIELDS)}")
+        missing[field] = float(rate)
+    return missing
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock IB gateway serving recorded or synthetic option chains")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4002, help="Listen port (default 4002; live gateway is 4001)")
+    parser.add_argument("--book", help="Recorded chain JSON (default: synthetic SPY, QQQ, IWM, SPX, NDX)")
+    parser.add_argument("--symbols", help="Comma-separated symbols for the synthetic book")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic book and the jitter")
+    parser.add_argument("--latency", type=float, default=0.02, help="Base response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Uniform extra latency in seconds")
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="Probability each field never arrives on a line")
+    parser.add_argument("--missing", help="Per-field overrides, e.g. oi=0.1,greeks=0.2 (fields: last, close, oi, greeks, iv)")
+    parser.add_argument("--tick-interval", type=float, default=1.0, help="Seconds between streaming updates (0 = none)")
+    parser.add_argument("--max-lines", type=int, default=IB_MAX_LINES)
+    parser.add_argument("--dump", help="Write the synthetic book to this JSON file and exit")
+    parser.add_argument("--record", help="Write chains recorded from the live gateway at --record-port to this JSON file and exit")
+    parser.add_argument("--record-port", type=int, default=4001)
+    parser.add_argument("--record-expiries", type=int, default=3)
+    parser.add_argument("--record-width", type=float, default=0.05, help="Recorded strikes within ± this fraction of spot")
+    args = parser.parse_args()
+
+    symbols = [s.strip().upper() for s in args.symbols.split(",")] if args.symbols else None
+
+    if args.record:
+        recorded = asyncio.run(record(args.host, args.record_port, 19, symbols or ["SPY", "QQQ", "SPX"],
+                                      args.record_expiries, args.record_width))
+        with open(args.record, "w") as f:
+            json.dump(recorded, f)
+        print(f"📼 Recorded {', '.join(recorded['symbols'])} to {args.record}")
+    elif args.dump:
+        with open(args.dump, "w") as f:
+            json.dump(synthetic_book(symbols, args.seed), f)
+        print(f"💾 Synthetic book written to {args.dump}")
+    else:
+        book = OptionBook.load(args.book) if args.book else OptionBook(synthetic_book(symbols, args.seed))
+        gateway = MockGateway(book, args.latency, args.jitter, parse_missing(args.missing, args.missing_rate),
+                              args.tick_interval, args.max_lines, seed=args.seed)
+        try:
+            asyncio.run(gateway.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            print(gateway.stats.format())
@@ -5,22 +5,17 @@ from datetime import datetime
 from zoneinfo import ZoneInfo
 from csv_helpers import workable_oi_levels, append_oi_data, gex_data_save
 from ib_connection import warmup, connect_ib
-from data_helpers import batch_data, fetch_stock_ticker
+from data_helpers import batch_data, fetch_spot_price
+from pacing import PacingScheduler, format_report
 
 ###############################################################################
-# 1.  Constants
-###############################################################################
-
-BATCH_SIZE = 5  # Process xx strikes at a time
-
-###############################################################################
-# 2.  Helpers
+# 1.  Helpers
 ###############################################################################
 def is_yes(flag: str) -> bool:
     return flag.strip().upper().startswith("Y")
     
 ###############################################################################
-# 3.  Main
+# 2.  Main
 ###############################################################################
 async def main(ticker, expiry, data_type = 1, up_level= 7, down_level = 7, csv_update = 'N', check_gex = 'N', quiet: bool = False):
     
@@ -41,9 +36,7 @@ async def main(ticker, expiry, data_type = 1, up_level= 7, down_level = 7, csv_u
         if not quiet:
             print(f"\nCollecting Option data for: {ticker} Expiry: {expiry}")
 
-        requested_ticker = await fetch_stock_ticker(ib, ticker)
-        
-        spot_price = requested_ticker.last
+        spot_price = await fetch_spot_price(ib, ticker)
         if not quiet:
             print(f"{ticker} spot price: {spot_price}")
         
@@ -55,7 +48,10 @@ async def main(ticker, expiry, data_type = 1, up_level= 7, down_level = 7, csv_u
         
         calculate_gex = is_yes(check_gex)
         
-        results = await batch_data(ib, BATCH_SIZE, expiry, ticker, centre_price, up_level, down_level, calculate_gex)
+        scheduler = PacingScheduler()
+        results = await batch_data(ib, scheduler, expiry, ticker, centre_price, up_level, down_level, calculate_gex)
+        if not quiet:
+            print(format_report(scheduler.report()))
 
 
         ###########################
@@ -1,21 +1,25 @@
 import asyncio
 import argparse
+import time
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
-from ib_insync import Contract, Option
-
 from ib_connection import connect_ib, warmup
-from data_helpers import batch_data, fetch_stock_ticker, get_reliable_ticker
-from calculation_helpers import calculate_gex
+from data_helpers import batch_data, fetch_spot_price, generate_strike_range
+from calculation_helpers import INDEX_STRIKE_STEPS
 from csv_helpers import workable_oi_levels, append_oi_data, gex_data_save
+from subscription_manager import StrikeLadder
+from pacing import PacingScheduler, format_report
+from helpers.contract_cache import get_contract_cache, option_exchange, INDEXES
+from helpers.spot_price import get_spot_service
 
 
 ###############################################################################
 # 1.  Constants
 ###############################################################################
 
-BATCH_SIZE = 5  # Process xx strikes at a time
+DEFAULT_TICKERS = "SPY,QQQ,SPX"
+LADDER_TIMEOUT = 10  # Seconds to wait for newly subscribed strikes in streaming mode
 
 
 ###############################################################################
@@ -30,101 +34,61 @@ def round_to_nearest(value: float, step: int) -> int:
     return int(round(value / step) * step)
 
 
-async def fetch_spx_ticker(ib):
-    """Fetch SPX index spot via CBOE index contract."""
-    contract = Contract(symbol='SPX', secType='IND', exchange='CBOE', currency='USD')
-    tk = ib.reqMktData(contract, '233', snapshot=False)
-    await asyncio.sleep(3)
-    return tk
-
-
-async def process_strike_with_gex_spx(ib, strike, expiry, gex_calculated=False):
-    """SPX option strike fetch using CBOE exchange and optional GEX calc."""
-    call_contract = Option('SPX', expiry, strike, 'C', 'CBOE')
-    put_contract = Option('SPX', expiry, strike, 'P', 'CBOE')
-
-    call_ticker, put_ticker = await asyncio.gather(
-        get_reliable_ticker(ib, call_contract, check_greeks=gex_calculated),
-        get_reliable_ticker(ib, put_contract, check_greeks=gex_calculated)
-    )
-
-    call_data = None
-    put_data = None
-
-    if call_ticker:
-        call_data = {
-            'oi': call_ticker.callOpenInterest
-        }
-        if gex_calculated:
-            call_data['gamma'] = getattr(call_ticker.modelGreeks, 'gamma', None) if call_ticker.modelGreeks else None
-            call_data['iv'] = getattr(call_ticker.modelGreeks, 'impliedVol', None) if call_ticker.modelGreeks else None
-    if put_ticker:
-        put_data = {
-            'oi': put_ticker.putOpenInterest
-        }
-        if gex_calculated:
-            put_data['gamma'] = getattr(put_ticker.modelGreeks, 'gamma', None) if put_ticker.modelGreeks else None
-            put_data['iv'] = getattr(put_ticker.modelGreeks, 'impliedVol', None) if put_ticker.modelGreeks else None
-
-    # Defer GEX calculation to CSV helpers stage (same as option_async behavior)
-    return_object = {
-        'strike': strike,
-        'call': call_data,
-        'put': put_data
-    }
-
-    if gex_calculated and call_data and put_data:
-        call_gex, put_gex, net_gex = calculate_gex(
-            strike,
-            call_data.get('oi') if call_data else None,
-            call_data.get('gamma') if call_data else None,
-            put_data.get('oi') if put_data else None,
-            put_data.get('gamma') if put_data else None
-        )
-        return_object['call'] = return_object.get('call', {})
-        return_object['put'] = return_object.get('put', {})
-        return_object['call']['call_gex'] = call_gex
-        return_object['put']['put_gex'] = put_gex
-        return_object['net_gex'] = net_gex
-
-    return return_object
-
-
-async def batch_data_spx(ib, batch_size, expiry, centre_price, up_level, down_level, gex_calculated=False, step=10):
-    strikes = list(range(centre_price - down_level * step, centre_price + up_level * step + step, step))
-    results = []
-    for i in range(0, len(strikes), batch_size):
-        batch = strikes[i:i + batch_size]
-        batch_results = await asyncio.gather(
-            *[process_strike_with_gex_spx(ib, strike, expiry, gex_calculated) for strike in batch],
-            return_exceptions=True
-        )
-        results.extend([r for r in batch_results if not isinstance(r, Exception)])
-        await asyncio.sleep(1)
-    return results
+def parse_tickers(value: str) -> list:
+    return [t.strip().upper() for t in value.split(",") if t.strip()]
+
+
+def index_strike_step(ticker: str, spx_step: int) -> int:
+    return spx_step if ticker == 'SPX' else INDEX_STRIKE_STEPS.get(ticker, spx_step)
+
+
+def generate_index_strike_range(centre_price, up_level, down_level, step=10):
+    return list(range(centre_price - down_level * step, centre_price + up_level * step + step, step))
+
+
+async def batch_data_index(ib, scheduler, ticker, expiry, centre_price, up_level, down_level, gex_calculated=False, step=10):
+    """Index chains (SPX, NDX) trade on their own strike step; contracts come pre-qualified from the cache."""
+    strikes = generate_index_strike_range(centre_price, up_level, down_level, step)
+    return await batch_data(ib, scheduler, expiry, ticker, centre_price, up_level, down_level, gex_calculated,
+                            strikes=strikes)
 
 
 ###############################################################################
 # 3.  Main
 ###############################################################################
 
-async def run_for_symbol(ib, ticker, expiry, up_level, down_level, csv_update, check_gex, quiet, spx_step):
+async def run_for_symbol(ib, scheduler, ticker, expiry, up_level, down_level, csv_update, check_gex, quiet, spx_step, ladder=None):
     calculate_gex = is_yes(check_gex)
 
-    if ticker == 'SPX':
-        requested_ticker = await fetch_spx_ticker(ib)
-        spot_price = requested_ticker.last
+    if ticker in INDEXES:
+        step = index_strike_step(ticker, spx_step)
+        spot_price = await fetch_spot_price(ib, ticker)
         if not quiet:
             print(f"{ticker} spot price: {spot_price}")
-        centre_price = round_to_nearest(spot_price, spx_step)
-        results = await batch_data_spx(ib, BATCH_SIZE, expiry, centre_price, up_level, down_level, calculate_gex, step=spx_step)
+        await get_contract_cache().warm_async(ib, ticker, spot_price)  # no-op after the first run of the day
+        centre_price = round_to_nearest(spot_price, step)
+        if ladder is None:
+            results = await batch_data_index(ib, scheduler, ticker, expiry, centre_price, up_level, down_level, calculate_gex, step=step)
+        else:
+            strikes = generate_index_strike_range(centre_price, up_level, down_level, step)
     else:
-        requested_ticker = await fetch_stock_ticker(ib, ticker)
-        spot_price = requested_ticker.last
+        spot_price = await fetch_spot_price(ib, ticker)
         if not quiet:
             print(f"{ticker} spot price: {spot_price}")
+        await get_contract_cache().warm_async(ib, ticker, spot_price)
         centre_price = round(spot_price)
-        results = await batch_data(ib, BATCH_SIZE, expiry, ticker, centre_price, up_level, down_level, calculate_gex)
+        if ladder is None:
+            results = await batch_data(ib, scheduler, expiry, ticker, centre_price, up_level, down_level, calculate_gex)
+        else:
+            strikes = generate_strike_range(centre_price, up_level, down_level)
+
+    if ladder is not None:
+        # Streaming mode: only strikes that entered the window need to warm up
+        added, removed = await ladder.update_window(strikes)
+        complete = await ladder.wait_ready(check_greeks=calculate_gex, timeout=LADDER_TIMEOUT)
+        if not quiet:
+            print(f"{ticker} ladder: +{len(added)} / -{len(removed)} contracts, complete={complete}")
+        results = ladder.snapshot(calculate_gex)
 
     if not quiet:
         print(f"\n{ticker} Spot Price: {spot_price:.2f}")
@@ -158,36 +122,76 @@ async def run_for_symbol(ib, ticker, expiry, up_level, down_level, csv_update, c
     return results, spot_price
 
 
-async def main(expiry, data_type=1, up_level=7, down_level=7, csv_update='N', check_gex='N', quiet=False, spx_step=10):
+async def collect_symbol(ib, scheduler, ticker, expiry, up_level, down_level, csv_update, check_gex, quiet, spx_step,
+                         ladder=None):
+    """Run one symbol; a failure is reported and does not stop the other symbols."""
+    if not quiet:
+        print(f"\nCollecting Option data for: {ticker} Expiry: {expiry}")
+    start = time.monotonic()
+    try:
+        await run_for_symbol(ib, scheduler, ticker, expiry, up_level, down_level, csv_update, check_gex, quiet,
+                             spx_step, ladder=ladder)
+    except Exception as e:
+        print(f"❌ {ticker} failed: {e}")
+        return False
+    if not quiet:
+        print(f"{ticker} done in {time.monotonic() - start:.1f}s")
+    return True
+
+
+async def main(expiry, data_type=1, up_level=7, down_level=7, csv_update='N', check_gex='N', quiet=False, spx_step=10,
+               interval=0, tickers=DEFAULT_TICKERS):
     try:
         ib = await connect_ib()
     except Exception as e:
         print(f"❌ Failed to connect to IB: {e}")
         return
 
+    ladders = {}
+    # one pacing budget for every symbol on this connection
+    scheduler = PacingScheduler()
     try:
         await warmup(ib, data_type)
         if not quiet:
             print("Warming up market data. Please wait...")
         await asyncio.sleep(2)
         
-        tickers = ['SPY', 'QQQ', 'SPX']
-        
-        for t in tickers:
+        tickers = parse_tickers(tickers)
+
+        if interval > 0:
+            # Streaming mode: keep one ladder per symbol subscribed across cycles
+            ladders = {t: StrikeLadder(ib, t, expiry, exchange=option_exchange(t), scheduler=scheduler)
+                       for t in tickers}
+
+        while True:
+            cycle_start = time.monotonic()
+            # symbols run concurrently; each writes its CSVs as soon as it finishes
+            await asyncio.gather(*(
+                collect_symbol(ib, scheduler, t, expiry, up_level, down_level, csv_update, check_gex, quiet, spx_step,
+                               ladder=ladders.get(t))
+                for t in tickers
+            ))
             if not quiet:
-                print(f"\nCollecting Option data for: {t} Expiry: {expiry}")
-            await run_for_symbol(ib, t, expiry, up_level, down_level, csv_update, check_gex, quiet, spx_step)
+                print(f"Cycle for {', '.join(tickers)} took {time.monotonic() - cycle_start:.1f}s")
+                print(format_report(scheduler.report()))
+            if interval <= 0:
+                break
+            await asyncio.sleep(max(0.0, interval * 60 - (time.monotonic() - cycle_start)))
 
     except Exception as e:
         print(f"❌ Something wrong happened: {e}")
         return
     finally:
+        for ladder in ladders.values():
+            await ladder.close()
+        get_spot_service(ib).close()
         ib.disconnect()
 
 
 if __name__ == "__main__":
     datetime.now(ZoneInfo("America/New_York"))
-    parser = argparse.ArgumentParser(description="Multi‑ticker IB option‑chain snapshot (SPY, QQQ, SPX)")
+    parser = argparse.ArgumentParser(description="Multi‑ticker IB option‑chain snapshot (SPY, QQQ, SPX by default)")
+    parser.add_argument("--tickers", default=DEFAULT_TICKERS, help=f"Comma-separated symbols (default {DEFAULT_TICKERS})")
     parser.add_argument("--expiry", default=datetime.today().strftime('%Y%m%d'), help="YYYYMMDD; omit for first available")
     parser.add_argument("--data", type=int, default=1, help="type of market data to request")
     parser.add_argument("--up_level", type=int, default=7, help="Half‑width in strike units (default 7)")
@@ -196,8 +200,11 @@ if __name__ == "__main__":
     parser.add_argument("--gex", default='N', help="Calculate and append GEX CSV (Y/N)")
     parser.add_argument("--quiet", action="store_true", help="Suppress per‑strike console output")
     parser.add_argument("--spx_step", type=int, default=10, help="SPX strike step size (default 10)")
+    parser.add_argument("--interval", type=float, default=0,
+                        help="Minutes between snapshots; >0 keeps the strike ladders subscribed and loops (default 0 = one shot)")
     args = parser.parse_args()
 
-    asyncio.run(main(args.expiry, args.data, args.up_level, args.down_level, args.csv, args.gex, args.quiet, args.spx_step))
+    asyncio.run(main(args.expiry, args.data, args.up_level, args.down_level, args.csv, args.gex, args.quiet, args.spx_step,
+                     args.interval, args.tickers))
 
 
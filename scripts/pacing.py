@@ -0,0 +1,196 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+###############################################################################
+# 1.  Constants
+###############################################################################
+
+IB_MAX_MSG_RATE = 50   # API messages per second accepted by TWS / Gateway
+IB_MAX_LINES = 100     # default simultaneous market-data lines per account
+
+DEFAULT_MSG_RATE = 40  # stay under the gateway limit so pacing violations never fire
+LATENCY_TOLERANCE = 1.5  # back off once latency exceeds this multiple of the best seen
+EWMA_ALPHA = 0.3
+
+
+###############################################################################
+# 2.  Scheduler
+###############################################################################
+
+class PacingScheduler:
+    """
+    Adaptive, pacing-aware scheduler for IB market-data jobs.
+
+    • a token bucket keeps outgoing messages under `msg_rate` per second
+    • a line budget caps simultaneously open market-data lines at `max_lines`
+    • the number of jobs in flight grows by one while response latency stays
+      near the best observed and halves when it degrades or a job fails
+    One instance is meant to be shared by everything on the same connection.
+    """
+
+    def __init__(self, msg_rate=DEFAULT_MSG_RATE, max_lines=IB_MAX_LINES, burst=None,
+                 initial_concurrency=8, min_concurrency=2):
+        self.msg_rate = msg_rate
+        self.max_lines = max_lines
+        self.burst = burst or msg_rate
+        self.min_concurrency = min_concurrency
+        self.concurrency = initial_concurrency
+
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._cond = asyncio.Condition()
+        self._in_flight = 0
+        self._lines = 0
+        self._held = 0  # the part of _lines held by long-lived subscriptions
+        self._latency_ewma = None
+        self._latency_best = None
+        self._reset_cycle()
+
+    def _reset_cycle(self):
+        self._cycle_start = time.monotonic()
+        self._messages = 0
+        self._jobs = 0
+        self._failures = 0
+        self._peak_lines = self._lines
+        self._peak_in_flight = self._in_flight
+        self._latencies = []
+
+    # ── message pacing ────────────────────────────────────────────────────────
+    async def throttle(self, messages=1):
+        """Wait until `messages` API messages may be sent without exceeding the rate"""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.msg_rate)
+            self._stamp = now
+            if self._tokens >= messages:
+                self._tokens -= messages
+                self._messages += messages
+                return
+            await asyncio.sleep((messages - self._tokens) / self.msg_rate)
+
+    # ── market-data lines ─────────────────────────────────────────────────────
+    def _check_fits(self, lines, what):
+        """Raise if `lines` can never fit: only short jobs free their lines, held ones stay taken"""
+        if self._held + lines > self.max_lines:
+            raise RuntimeError(
+                f"{what} needs {lines} market-data lines but only {self.max_lines - self._held} of "
+                f"{self.max_lines} can ever be free ({self._held} held by open subscriptions); "
+                f"subscribe fewer strikes or tickers"
+            )
+
+    async def hold_lines(self, lines):
+        """
+        Reserve lines for long-lived subscriptions (released with `release_lines`).
+        Waits for short jobs to free lines; raises RuntimeError when the lines
+        already held leave no room for `lines`.
+        """
+        async with self._cond:
+            await self._cond.wait_for(
+                lambda: self._held + lines > self.max_lines or self._lines + lines <= self.max_lines
+            )
+            self._check_fits(lines, "Subscription")
+            self._lines += lines
+            self._held += lines
+            self._peak_lines = max(self._peak_lines, self._lines)
+
+    async def release_lines(self, lines):
+        async with self._cond:
+            lines = min(lines, self._held)
+            self._lines -= lines
+            self._held -= lines
+            self._cond.notify_all()
+
+    @asynccontextmanager
+    async def _slot(self, lines):
+        async with self._cond:
+            await self._cond.wait_for(
+                lambda: self._held + lines > self.max_lines
+                or (self._in_flight < self.concurrency and self._lines + lines <= self.max_lines)
+            )
+            self._check_fits(lines, "Job")
+            self._in_flight += 1
+            self._lines += lines
+            self._peak_lines = max(self._peak_lines, self._lines)
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._in_flight -= 1
+                self._lines -= lines
+                self._cond.notify_all()
+
+    # ── adaptation ────────────────────────────────────────────────────────────
+    def _adapt(self, latency):
+        ceiling = max(self.min_concurrency, self.max_lines)
+        if latency is None:
+            self._failures += 1
+            self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+            return
+        self._latencies.append(latency)
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self._latency_ewma
+        if self._latency_best is None or self._latency_ewma < self._latency_best:
+            self._latency_best = self._latency_ewma
+
+        if self._latency_ewma > LATENCY_TOLERANCE * self._latency_best:
+            self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+            # forget the old baseline so a slower but stable gateway can recover
+            self._latency_best = self._latency_ewma
+        else:
+            self.concurrency = min(ceiling, self.concurrency + 1)
+
+    # ── job execution ─────────────────────────────────────────────────────────
+    async def run(self, factories, lines_per_job=2, messages_per_job=2):
+        """
+        Run coroutine factories with as many in flight as pacing allows.
+        Returns results in order; a failed job yields its exception instead.
+        """
+        async def one(factory):
+            async with self._slot(lines_per_job):
+                await self.throttle(messages_per_job)
+                start = time.monotonic()
+                self._jobs += 1
+                try:
+                    result = await factory()
+                except Exception as exc:
+                    self._adapt(None)
+                    return exc
+                self._adapt(time.monotonic() - start)
+                return result
+
+        return await asyncio.gather(*(one(f) for f in factories))
+
+    # ── reporting ─────────────────────────────────────────────────────────────
+    def report(self, reset=True) -> dict:
+        """Budget usage since the last report"""
+        elapsed = max(time.monotonic() - self._cycle_start, 1e-9)
+        lat = sorted(self._latencies)
+        report = {
+            "elapsed_s": round(elapsed, 2),
+            "jobs": self._jobs,
+            "failures": self._failures,
+            "messages": self._messages,
+            "msg_rate": round(self._messages / elapsed, 1),
+            "msg_budget_pct": round(100.0 * self._messages / (elapsed * IB_MAX_MSG_RATE), 1),
+            "peak_lines": self._peak_lines,
+            "line_budget_pct": round(100.0 * self._peak_lines / self.max_lines, 1),
+            "peak_in_flight": self._peak_in_flight,
+            "concurrency": self.concurrency,
+            "latency_avg_s": round(sum(lat) / len(lat), 3) if lat else None,
+            "latency_p95_s": round(lat[int(0.95 * (len(lat) - 1))], 3) if lat else None,
+        }
+        if reset:
+            self._reset_cycle()
+        return report
+
+
+def format_report(report: dict) -> str:
+    return (f"pacing: {report['jobs']} jobs ({report['failures']} failed) in {report['elapsed_s']}s | "
+            f"{report['messages']} msgs = {report['msg_budget_pct']}% of rate budget | "
+            f"peak lines {report['peak_lines']} = {report['line_budget_pct']}% | "
+            f"in flight {report['peak_in_flight']} (limit {report['concurrency']}) | "
+            f"latency avg {report['latency_avg_s']}s p95 {report['latency_p95_s']}s")
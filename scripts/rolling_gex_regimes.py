@@ -5,6 +5,9 @@ import math
 import numpy as np
 from pandas.errors import EmptyDataError
 
+from day_store import get_day_store, read_csv_tail, merge_csv, STORES
+import atomic_io
+
 BASE_DIR = Path(r"D:\TradingData")
 
 
@@ -102,7 +105,13 @@ def classify_with_reasons(df: pd.DataFrame,
                           compression_exit: float = 0.56,
                           expansion_score_max: float = 58.0,
                           expansion_ramp_max: float = 70.0,
-                          window: int = 4) -> pd.DataFrame:
+                          window: int = 4,
+                          known_labels: dict = None) -> pd.DataFrame:
+    """
+    known_labels: {timestamp: primary_regime} already on record (the tail of the
+    regimes file). The hysteresis carries those forward instead of the labels
+    recomputed here, so a tail of the day classifies like the whole day.
+    """
     labels = []
     reasons = []
     prev_label = None
@@ -133,7 +142,7 @@ def classify_with_reasons(df: pd.DataFrame,
 
         labels.append(label)
         reasons.append(reason)
-        prev_label = label
+        prev_label = label if known_labels is None else known_labels.get(df["timestamp"].iloc[i], label)
 
     out = pd.DataFrame({
         "primary_regime": labels,
@@ -239,19 +248,54 @@ def derive_regimes_for_day(ticker: str,
                            expansion_ramp_max: float = 70.0,
                            compression_enter: float = 0.60,
                            compression_exit: float = 0.56,
-                           zgamma_min_drift: float = 0.3):
+                           zgamma_min_drift: float = 0.3,
+                           store: str = None):
     month = yyyymmdd[:6]
-    if input_file:
-        metrics_path = Path(input_file)
+    day_store = None if input_file or output_dir else get_day_store(store, BASE_DIR)
+    columnar = day_store is not None and day_store.name != "csv"
+    if columnar:
+        if not day_store.exists("metrics", ticker, yyyymmdd):
+            print(f"Missing metrics day: {day_store.path('metrics', ticker, yyyymmdd)}")
+            return None, None
+        regimes_path = day_store.path("regimes", ticker, yyyymmdd)
     else:
-        metrics_path = BASE_DIR / month / "analysis" / f"{ticker.upper()}_GEX_{yyyymmdd}_metrics.csv"
-    if not metrics_path.exists():
-        print(f"Missing metrics file: {metrics_path}")
-        return None, None
-
-    df = pd.read_csv(metrics_path)
-    # Normalize types
-    df["timestamp"] = df["timestamp"].astype(str)
+        if input_file:
+            metrics_path = Path(input_file)
+        else:
+            metrics_path = BASE_DIR / month / "analysis" / f"{ticker.upper()}_GEX_{yyyymmdd}_metrics.csv"
+        if not metrics_path.exists():
+            print(f"Missing metrics file: {metrics_path}")
+            return None, None
+        if output_dir:
+            regimes_path = Path(output_dir) / f"{ticker.upper()}_GEX_{yyyymmdd}_regimes.csv"
+        else:
+            regimes_path = BASE_DIR / month / "analysis" / f"{ticker.upper()}_GEX_{yyyymmdd}_regimes.csv"
+
+    def load(kind, snapshots=None, columns=None):
+        # snapshots=N reads only the last N timestamps off the end of the day
+        if columnar:
+            if snapshots:
+                return day_store.tail(kind, ticker, yyyymmdd, snapshots, columns=columns)
+            return day_store.read(kind, ticker, yyyymmdd, columns=columns)
+        path = metrics_path if kind == "metrics" else regimes_path
+        if snapshots:
+            return read_csv_tail(path, snapshots, columns)[0]
+        df = pd.read_csv(path)
+        # Normalize types
+        df["timestamp"] = df["timestamp"].astype(str)
+        return df
+
+    # --latest: the newest snapshot plus the history its diffs, rolling stats and tags look back over
+    history = max(window, flip_consec) + 2
+    known_labels = None
+    df = load("metrics", history if latest_only else None)
+    if latest_only and df["timestamp"].nunique() >= history:
+        # not the whole day: the hysteresis picks up from the label already written for the previous snapshot
+        prev = load("regimes", 2, columns=["timestamp", "primary_regime"])
+        known_labels = dict(zip(prev["timestamp"], prev["primary_regime"])) if "primary_regime" in prev else {}
+        if sorted(df["timestamp"].unique())[-2] not in known_labels:
+            # regimes file is behind the metrics: classify the whole day as before
+            df, known_labels = load("metrics"), None
     # Ensure required base fields exist
     needed = ["timestamp", "spot", "total_net_gex", "zgamma", "ramp", "compression_score"]
     for col in needed:
@@ -263,7 +307,8 @@ def derive_regimes_for_day(ticker: str,
 
     # Primary regime with reasons (hysteresis)
     pr = classify_with_reasons(dfr, compression_enter=compression_enter, compression_exit=compression_exit,
-                               expansion_score_max=expansion_score_max, expansion_ramp_max=expansion_ramp_max, window=window)
+                               expansion_score_max=expansion_score_max, expansion_ramp_max=expansion_ramp_max, window=window,
+                               known_labels=known_labels)
     dfr = pd.concat([dfr, pr], axis=1)
 
     tags_df = compute_tags_and_gate(
@@ -290,19 +335,15 @@ def derive_regimes_for_day(ticker: str,
     ]
     out = dfr[out_cols].copy()
 
-    if output_dir:
-        analysis_dir = Path(output_dir)
-        regimes_path = analysis_dir / f"{ticker.upper()}_GEX_{yyyymmdd}_regimes.csv"
-    else:
-        analysis_dir = BASE_DIR / month / "analysis"
-        regimes_path = analysis_dir / f"{ticker.upper()}_GEX_{yyyymmdd}_regimes.csv"
-
     # Determine target timestamps
     all_ts = out["timestamp"].tolist()
     if latest_only:
         target_ts = [all_ts[-1]] if all_ts else []
     elif full:
         target_ts = all_ts
+    elif columnar:
+        existing_ts = set(day_store.read("regimes", ticker, yyyymmdd, columns=["timestamp"])["timestamp"])
+        target_ts = [ts for ts in all_ts if ts not in existing_ts]
     else:
         if regimes_path.exists() and regimes_path.stat().st_size > 0:
             try:
@@ -343,6 +384,8 @@ def main():
     parser.add_argument("--full", default='N', help="Recompute entire day (Y/N). Overrides --latest")
     parser.add_argument("--input_file", default=None, help="Optional explicit input metrics CSV path")
     parser.add_argument("--output", default=None, help="Optional output directory for regimes CSVs")
+    parser.add_argument("--store", default=None, choices=STORES,
+                        help="Day store to read metrics from and write regimes to (default DAY_STORE or csv)")
     args = parser.parse_args()
 
     latest_only = str(args.latest).strip().upper().startswith('Y')
@@ -363,7 +406,8 @@ def main():
         expansion_ramp_max=args.expansion_ramp_max,
         compression_enter=args.compression_enter,
         compression_exit=args.compression_exit,
-        zgamma_min_drift=args.zgamma_min_drift
+        zgamma_min_drift=args.zgamma_min_drift,
+        store=args.store
     )
     if out is None:
         return
@@ -375,22 +419,14 @@ def main():
                 print("No new regime rows to write.")
             return
         regimes_path.parent.mkdir(parents=True, exist_ok=True)
-        if full or not regimes_path.exists():
-            out.to_csv(regimes_path, index=False)
+        day_store = get_day_store(args.store, BASE_DIR)
+        if day_store.name != "csv" and not (args.input_file or args.output):
+            day_store.write("regimes", args.ticker, args.date, out, mode="replace" if full else "merge")
+        elif full or not regimes_path.exists():
+            atomic_io.write_csv(out, regimes_path)
         else:
-            if regimes_path.exists() and regimes_path.stat().st_size > 0:
-                try:
-                    existing = pd.read_csv(regimes_path)
-                except EmptyDataError:
-                    existing = pd.DataFrame()
-            else:
-                existing = pd.DataFrame()
-            combined = pd.concat([existing, out], ignore_index=True)
-            if "timestamp" in combined.columns:
-                combined["timestamp"] = combined["timestamp"].astype(str)
-                combined = combined.drop_duplicates(subset=["timestamp"], keep="last")
-            combined = combined.sort_values("timestamp")
-            combined.to_csv(regimes_path, index=False)
+            # a newer snapshot is appended after reading only the file's last rows
+            merge_csv(regimes_path, out)
         if not args.quiet:
             print(f"✅ Wrote {len(out)} new rows → {regimes_path}")
     else:
@@ -3,11 +3,15 @@
 run_option_levels_scenario.py
 
 Simulates:
-  1) The scheduled fetcher Lambda (build & “store” today’s levels)
+  1) The scheduled fetcher Lambda (build & store today’s levels)
   2) An API retrieval of one ticker’s data
 
+Levels are written to the store selected by CACHE_BACKEND (dynamodb, sqlite
+or memory), the same one /api/option-levels?source=cache reads.
+
 Run:
   python run_option_levels_scenario.py
+  CACHE_BACKEND=sqlite python run_option_levels_scenario.py
 """
 
 import json
@@ -15,6 +19,7 @@ from datetime import datetime, timedelta
 from types import SimpleNamespace
 
 from services.option_service import build_option_levels
+from helpers.levels_store import get_store
 
 def run_scenario_oi():
     tickers = ["SPY", "QQQ", "^SPX"]
@@ -46,9 +51,15 @@ def run_scenario_oi():
         all_data[t] = data or {"error": "no data"}
     print(json.dumps(all_data, indent=2))
 
+    # one batch write for all tickers; failed ones are not published
+    store = get_store()
+    store.put_many(day_of_retrival.date, [
+        (t, day_of_retrival.expiry, data) for t, data in all_data.items() if "error" not in data
+    ])
+
     # 2) “API call” step (e.g. retrieving SPY levels)
     print(f"\n=== API returns for SPY on {day_of_retrival.date} ===")
-    print(json.dumps(all_data["SPY"], indent=2))
+    print(json.dumps(store.get(day_of_retrival.date, "SPY", day_of_retrival.expiry), indent=2, default=str))
 
 def run_scenario_gex():
     # 1) “Scheduled fetch” step
@@ -0,0 +1,98 @@
+import asyncio
+
+from data_helpers import GENERIC_TICKS, build_strike_result, field_status, wait_for_fields
+from helpers.contract_cache import get_contract_cache
+
+RIGHTS = ('C', 'P')
+
+
+class StrikeLadder:
+    """
+    Long-lived market-data subscriptions for one symbol's strike ladder.
+
+    The ladder stays subscribed between snapshot cycles; `update_window` only
+    subscribes strikes that entered the spot-centred window and cancels the
+    ones that left it, so a snapshot is read straight from the live tickers.
+    """
+
+    def __init__(self, ib, symbol, expiry, exchange="SMART", generic_ticks=GENERIC_TICKS, scheduler=None):
+        self.ib = ib
+        self.scheduler = scheduler
+        self.symbol = symbol
+        self.expiry = expiry
+        self.exchange = exchange
+        self.generic_ticks = generic_ticks
+        self.strikes = []
+        self._tickers = {}  # (strike, right) -> Ticker
+        self._unlisted = set()  # keys the chain does not list
+
+    async def update_window(self, strikes):
+        """Move the ladder to `strikes`; returns the (added, removed) strike/right keys"""
+        wanted = {(strike, right) for strike in strikes for right in RIGHTS}
+
+        removed = [key for key in self._tickers if key not in wanted]
+        for key in removed:
+            await self._throttle()
+            self.ib.cancelMktData(self._tickers.pop(key).contract)
+        if removed and self.scheduler:
+            await self.scheduler.release_lines(len(removed))
+
+        added = sorted(wanted - self._tickers.keys() - self._unlisted)
+        contracts = await get_contract_cache().options_async(
+            self.ib, self.symbol, self.expiry, sorted({s for s, _ in added}), exchange=self.exchange
+        ) if added else {}
+        # strikes the chain does not list are left out instead of timing out every cycle
+        self._unlisted.update(key for key in added if key not in contracts)
+        added = [key for key in added if key in contracts]
+        if added and self.scheduler:
+            await self.scheduler.hold_lines(len(added))
+        for strike, right in added:
+            await self._throttle()
+            contract = contracts[(strike, right)]
+            self._tickers[(strike, right)] = self.ib.reqMktData(
+                contract, genericTickList=self.generic_ticks, snapshot=False
+            )
+
+        self.strikes = sorted(strikes)
+        return added, removed
+
+    async def _throttle(self):
+        if self.scheduler:
+            await self.scheduler.throttle()
+
+    def pending(self, check_greeks=False):
+        return [t for t in self._tickers.values() if not all(field_status(t, check_greeks).values())]
+
+    async def wait_ready(self, check_greeks=False, timeout=10):
+        """Wait until every ticker has its fields; True if the ladder is complete"""
+        statuses = await asyncio.gather(
+            *(wait_for_fields(t, check_greeks, timeout) for t in self.pending(check_greeks))
+        )
+        return all(all(status.values()) for status in statuses)
+
+    def snapshot(self, gex_calculated=False):
+        """Build the per-strike rows from the current ticker state"""
+        results = []
+        for strike in self.strikes:
+            call_ticker = self._tickers.get((strike, 'C'))
+            put_ticker = self._tickers.get((strike, 'P'))
+            try:
+                result = build_strike_result(strike, call_ticker, put_ticker, gex_calculated)
+            except (TypeError, KeyError):
+                # incomplete strike – skipped, same as the batched fetch
+                continue
+            result['complete'] = {
+                'call': field_status(call_ticker, gex_calculated) if call_ticker else None,
+                'put': field_status(put_ticker, gex_calculated) if put_ticker else None,
+            }
+            results.append(result)
+        return results
+
+    async def close(self):
+        for ticker in self._tickers.values():
+            await self._throttle()
+            self.ib.cancelMktData(ticker.contract)
+        if self._tickers and self.scheduler:
+            await self.scheduler.release_lines(len(self._tickers))
+        self._tickers.clear()
+        self.strikes = []
@@ -12,4 +12,10 @@ setup(
         "boto3",
         "mangum"
     ],
+    extras_require={
+        # compact response formats (format=msgpack / arrow) and faster JSON
+        "compact": ["msgpack", "pyarrow", "orjson"],
+        # DAY_STORE=parquet / matrix: the scripts write and the API reads parquet days
+        "parquet": ["pyarrow", "pandas"],
+    },
 )
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""
+Cache-only Lambda handler for /api/option-levels?source=cache and
+/api/option-levels/batch?source=cache.
+
+Answers the same requests as main.api_handler from the levels store without
+importing FastAPI, pydantic or ib_insync, so a cold start only pays for the
+store backend. Point the cached routes of the API Gateway at
+`cache_handler.handler`; everything else stays on `main.api_handler`.
+"""
+
+import json
+import os
+import time
+
+from helpers.levels_encoding import json_default
+from helpers.levels_store import get_store
+
+BATCH_MAX_TICKERS = int(os.environ.get("BATCH_MAX_TICKERS", "20"))
+
+
+def _response(status, body):
+    return {
+        "statusCode": status,
+        "headers": {"content-type": "application/json"},
+        "body": json.dumps(body, default=json_default),
+        "isBase64Encoded": False,
+    }
+
+
+def _error(status, detail):
+    return _response(status, {"detail": detail})
+
+
+def _request(event):
+    """(path, query params) of an API Gateway REST (v1) or HTTP API (v2) event"""
+    path = event.get("rawPath") or event.get("path") or ""
+    return path.rstrip("/"), event.get("queryStringParameters") or {}
+
+
+def levels(params):
+    ticker, expiry, date = params.get("ticker"), params.get("expiry", "front"), params.get("date")
+    if not ticker or not date:
+        return _error(400, "'ticker' and 'date' are required")
+    payload = get_store().get(date, ticker, expiry)
+    if not payload:
+        return _error(404, "No cached data for given date/expiry")
+    return _response(200, payload)
+
+
+def batch(params):
+    symbols = [t.strip() for t in params.get("tickers", "").split(",") if t.strip()]
+    expiries = [e.strip() for e in params.get("expiry", "front").split(",")]
+    date = params.get("date")
+    if not date:
+        return _error(400, "'date' is required when source=cache")
+    if not symbols or len(symbols) > BATCH_MAX_TICKERS:
+        return _error(400, f"Give 1 to {BATCH_MAX_TICKERS} tickers")
+    if len(expiries) == 1:
+        expiries *= len(symbols)
+    elif len(expiries) != len(symbols):
+        return _error(400, "'expiry' needs one value or one per ticker")
+
+    started = time.perf_counter()
+    pairs = list(zip(symbols, expiries))
+    payloads = get_store().get_many(date, pairs)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    results = [{"ticker": t.upper(), "expiry_param": e, "status": "ok" if p else "missing",
+                "elapsed_ms": elapsed_ms, "data": p, "error": None}
+               for (t, e), p in zip(pairs, payloads)]
+    return _response(200, {"elapsed_ms": elapsed_ms, "results": results})
+
+
+ROUTES = {
+    "/api/option-levels": levels,
+    "/api/option-levels/batch": batch,
+}
+
+
+def handler(event, context=None):
+    path, params = _request(event)
+    route = next((f for p, f in ROUTES.items() if path.endswith(p)), None)
+    if route is None:
+        return _error(404, "Not Found")
+    if params.get("source", "cache").lower() != "cache":
+        return _error(400, "This endpoint serves source=cache only")
+    return route(params)
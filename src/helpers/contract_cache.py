@@ -0,0 +1,211 @@
+# helpers/contract_cache.py
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from ib_insync import Contract, Option, Stock, util
+
+CACHE_DIR = Path(os.environ.get("CONTRACT_CACHE_DIR", Path.home() / ".option_levels" / "contracts"))
+
+# Index underlyings: symbol -> (index exchange, option exchange, trading class for dailies)
+INDEXES = {
+    "SPX": ("CBOE", "CBOE", "SPXW"),
+    "NDX": ("NASDAQ", "SMART", "NDXP"),
+}
+WARM_EXPIRIES = 3     # expiries qualified by the daily warm-up
+WARM_WIDTH_PCT = 0.05  # ±5 % of spot when a spot is given to the warm-up
+
+
+def underlying_contract(symbol: str) -> Contract:
+    """Unqualified underlying for `symbol` (index contract for SPX/NDX, SMART stock otherwise)"""
+    symbol = symbol.upper()
+    if symbol in INDEXES:
+        return Contract(symbol=symbol, secType="IND", exchange=INDEXES[symbol][0], currency="USD")
+    return Stock(symbol, "SMART", "USD")
+
+
+def option_exchange(symbol: str) -> str:
+    symbol = symbol.upper()
+    return INDEXES[symbol][1] if symbol in INDEXES else "SMART"
+
+
+def default_trading_class(symbol: str) -> str:
+    symbol = symbol.upper()
+    return INDEXES[symbol][2] if symbol in INDEXES else symbol
+
+
+def _option_key(symbol, expiry, strike, right, trading_class):
+    return f"{symbol}|{expiry}|{float(strike)}|{right}|{trading_class}"
+
+
+def _underlying_key(symbol, sec_type):
+    return f"{symbol}|{sec_type}"
+
+
+class ContractCache:
+    """
+    conId cache for option and underlying contracts.
+
+    Options are keyed by (symbol, expiry, strike, right, tradingClass). Entries
+    live in memory and in one JSON file per trading day, so only the first
+    process of the day pays for qualification; `warm_async` fills the cache
+    for the nearest expiries from a single reqSecDefOptParams call.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, day: str = None):
+        self.cache_dir = Path(cache_dir)
+        self.day = day or datetime.now().strftime("%Y%m%d")
+        self._lock = threading.Lock()
+        self._contracts = {}   # key -> non-default contract fields
+        self._chains = {}      # symbol -> {"tradingClass", "exchange", "expirations", "strikes"}
+        self._dirty = False
+        self.load()
+
+    @property
+    def path(self) -> Path:
+        return self.cache_dir / f"contracts_{self.day}.json"
+
+    # ── persistence ───────────────────────────────────────────────────────────
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            self._contracts.update(data.get("contracts", {}))
+            self._chains.update(data.get("chains", {}))
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps({"day": self.day, "contracts": self._contracts, "chains": self._chains})
+            self._dirty = False
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(payload)
+        os.replace(tmp, self.path)
+
+    # ── lookups ───────────────────────────────────────────────────────────────
+    def _key_for(self, contract: Contract) -> str:
+        if contract.secType == "OPT":
+            return _option_key(contract.symbol, contract.lastTradeDateOrContractMonth, contract.strike,
+                               contract.right, contract.tradingClass or default_trading_class(contract.symbol))
+        return _underlying_key(contract.symbol, contract.secType)
+
+    def get(self, contract: Contract):
+        fields = self._contracts.get(self._key_for(contract))
+        return Contract.create(**fields) if fields else None
+
+    def put(self, contract: Contract):
+        fields = util.dataclassNonDefaults(contract)
+        with self._lock:
+            self._contracts[self._key_for(contract)] = fields
+            self._dirty = True
+
+    def chain(self, symbol: str):
+        return self._chains.get(symbol.upper())
+
+    # ── qualification ─────────────────────────────────────────────────────────
+    async def qualify_async(self, ib, *contracts):
+        """Qualify contracts, going to IB only for the ones not cached yet"""
+        resolved = [self.get(c) for c in contracts]
+        misses = [c for c, hit in zip(contracts, resolved) if hit is None]
+        if misses:
+            qualified = await ib.qualifyContractsAsync(*misses)
+            for contract in qualified:
+                if contract.conId:
+                    self.put(contract)
+            self.save()
+            resolved = [hit or self.get(c) for c, hit in zip(contracts, resolved)]
+        return [c for c in resolved if c is not None]
+
+    def qualify(self, ib, *contracts):
+        return util.run(self.qualify_async(ib, *contracts))
+
+    async def underlying_async(self, ib, symbol: str) -> Contract:
+        [contract] = await self.qualify_async(ib, underlying_contract(symbol))
+        return contract
+
+    def underlying(self, ib, symbol: str) -> Contract:
+        return util.run(self.underlying_async(ib, symbol))
+
+    async def options_async(self, ib, symbol, expiry, strikes, rights=("C", "P"), exchange=None, trading_class=None):
+        """Qualified options for every strike × right; returns {(strike, right): Option}"""
+        symbol = symbol.upper()
+        trading_class = trading_class or default_trading_class(symbol)
+        exchange = exchange or option_exchange(symbol)
+        wanted = [Option(symbol, expiry, s, r, exchange, tradingClass=trading_class) for s in strikes for r in rights]
+        qualified = await self.qualify_async(ib, *wanted)
+        return {(c.strike, c.right): c for c in qualified}
+
+    def options(self, ib, symbol, expiry, strikes, rights=("C", "P"), exchange=None, trading_class=None):
+        return util.run(self.options_async(ib, symbol, expiry, strikes, rights, exchange, trading_class))
+
+    # ── daily warm-up ─────────────────────────────────────────────────────────
+    async def chain_async(self, ib, symbol: str):
+        """Option chain parameters for `symbol`, fetched from IB once per day"""
+        symbol = symbol.upper()
+        chain = self.chain(symbol)
+        if chain:
+            return chain
+        underlying = await self.underlying_async(ib, symbol)
+        params = await ib.reqSecDefOptParamsAsync(underlying.symbol, "", underlying.secType, underlying.conId)
+        trading_class = default_trading_class(symbol)
+        exchange = option_exchange(symbol)
+        picked = (next((p for p in params if p.tradingClass == trading_class and p.exchange == exchange), None)
+                  or next((p for p in params if p.tradingClass == trading_class), None)
+                  or params[0])
+        chain = {
+            "tradingClass": picked.tradingClass,
+            "exchange": exchange,
+            "expirations": sorted(picked.expirations),
+            "strikes": sorted(picked.strikes),
+        }
+        with self._lock:
+            self._chains[symbol] = chain
+            self._dirty = True
+        self.save()
+        return chain
+
+    def chain_sync(self, ib, symbol: str):
+        return util.run(self.chain_async(ib, symbol))
+
+    async def warm_async(self, ib, symbol: str, spot: float = None, n_expiries: int = WARM_EXPIRIES,
+                         width_pct: float = WARM_WIDTH_PCT):
+        """Qualify the nearest expiries (strikes within ±width_pct of spot when given) once per day"""
+        chain = await self.chain_async(ib, symbol)
+        if chain.get("warmed"):
+            return chain
+        strikes = chain["strikes"]
+        if spot:
+            strikes = [s for s in strikes if abs(s - spot) <= spot * width_pct]
+        for expiry in chain["expirations"][:n_expiries]:
+            await self.options_async(ib, symbol, expiry, strikes, trading_class=chain["tradingClass"])
+        with self._lock:
+            chain["warmed"] = True
+            self._dirty = True
+        self.save()
+        return chain
+
+    def warm(self, ib, symbol: str, spot: float = None, n_expiries: int = WARM_EXPIRIES):
+        return util.run(self.warm_async(ib, symbol, spot, n_expiries))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_contract_cache() -> ContractCache:
+    """Process-wide cache, rolled over when the trading day changes"""
+    global _cache
+    with _cache_lock:
+        today = datetime.now().strftime("%Y%m%d")
+        if _cache is None or _cache.day != today:
+            _cache = ContractCache(day=today)
+        return _cache
@@ -0,0 +1,385 @@
+# helpers/gex_index.py
+
+import csv
+import io
+import math
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from pathlib import Path
+
+GEX_DATA_DIR = Path(os.environ.get("GEX_DATA_DIR", r"D:\TradingData"))
+GEX_INDEX_DAYS = int(os.environ.get("GEX_INDEX_DAYS", "30"))   # most recent trading days kept per symbol
+REFRESH_INTERVAL_S = float(os.environ.get("GEX_REFRESH_INTERVAL_S", "1"))
+GEX_STORE = os.environ.get("DAY_STORE", "csv")    # the pipeline's day store (scripts/day_store.py) to read
+SQLITE_FILE = "gex.sqlite"                          # scripts/day_store.SqliteDayStore
+EPOCH = datetime(1970, 1, 1)
+
+# Pipeline outputs, merged per timestamp (regimes columns win on overlap)
+KINDS = ("metrics", "regimes")
+
+TAIL_CHECK = 256  # bytes before the consumed offset compared to detect rewrites
+SEQ_SUFFIX = ".seq"  # commit record "<seq> <length>" published by the pipeline writers (scripts/atomic_io.py)
+
+
+def parse_timestamp(value: str) -> str:
+    """'2025-01-17T09:30[:ss]', '2025-01-17 09:30' or 'YYYYMMDDhhmm' -> 'YYYYMMDDhhmm'"""
+    value = value.strip()
+    if value.isdigit() and len(value) in (8, 12):
+        return value if len(value) == 12 else value + "0000"
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y%m%d%H%M")
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognised timestamp '{value}'")
+
+
+def iso_timestamp(ts: str) -> str:
+    return datetime.strptime(ts, "%Y%m%d%H%M").isoformat()
+
+
+def _committed(path: Path):
+    """(seq, committed length) of a pipeline file, or None for files written without a commit record"""
+    try:
+        seq, length = path.with_name(path.name + SEQ_SUFFIX).read_text().split()
+        return int(seq), int(length)
+    except (OSError, ValueError):
+        return None
+
+
+def _value(text: str):
+    if text == "":
+        return None
+    if text in ("True", "False"):
+        return text == "True"
+    try:
+        number = float(text)
+    except ValueError:
+        return text
+    if math.isnan(number) or math.isinf(number):
+        return None
+    return number
+
+
+class _FileState:
+    def __init__(self):
+        self.seq = None
+        self.parts = ()       # parquet: names of the live parts already read
+        self.mtime_ns = 0
+        self.size = 0
+        self.offset = 0       # bytes consumed, always at a line boundary
+        self.header = None
+        self.tail = b""       # last TAIL_CHECK bytes before offset
+
+
+class _SymbolIndex:
+    """Rows of one symbol keyed by 'YYYYMMDDhhmm', with the keys kept sorted"""
+
+    def __init__(self):
+        self.timestamps = []
+        self.rows = {}
+        self.files = {}       # path -> _FileState
+        self.checked_at = 0.0
+
+    def upsert(self, ts, row):
+        existing = self.rows.get(ts)
+        if existing is not None:
+            existing.update(row)
+            return
+        self.rows[ts] = row
+        if not self.timestamps or ts > self.timestamps[-1]:
+            self.timestamps.append(ts)
+        else:
+            self.timestamps.insert(bisect_left(self.timestamps, ts), ts)
+
+
+class GexIndex:
+    """
+    In-memory per-symbol index of the regimes / metrics CSVs under
+    GEX_DATA_DIR/YYYYMM/analysis. Files are re-checked at most every
+    REFRESH_INTERVAL_S; grown files are read from the last consumed byte,
+    rewritten ones (different bytes before that offset) are read again.
+    Files with a commit record are skipped while its seq is unchanged and are
+    read only up to the committed length.
+    """
+
+    def __init__(self, base_dir=GEX_DATA_DIR, days=GEX_INDEX_DAYS, refresh_interval=REFRESH_INTERVAL_S):
+        self.base_dir = Path(base_dir)
+        self.days = days
+        self.refresh_interval = refresh_interval
+        self._symbols = {}
+        self._lock = threading.Lock()
+
+    def _files(self, symbol):
+        found = []
+        for kind in KINDS:
+            paths = sorted(self.base_dir.glob(f"*/analysis/{symbol}_GEX_*_{kind}.csv"))
+            found.extend(paths[-self.days:])
+        return found
+
+    def _read(self, index, path, state):
+        record = _committed(path)
+        if record is not None and record[0] == state.seq:
+            return 0
+        stat = path.stat()
+        if record is None and stat.st_mtime_ns == state.mtime_ns and stat.st_size == state.size:
+            return 0
+        size = stat.st_size if record is None else min(stat.st_size, record[1])
+        with open(path, "rb") as f:
+            if state.header is not None:
+                f.seek(max(0, state.offset - len(state.tail)))
+                if size < state.offset or f.read(len(state.tail)) != state.tail:
+                    state.__init__()  # rewritten in place: start over
+            if state.header is None:
+                f.seek(0)
+                header = f.readline()
+                if not header.endswith(b"\n"):
+                    return 0      # header still being written
+                state.header = next(csv.reader([header.decode("utf-8-sig")]))
+                state.offset = len(header)
+            f.seek(state.offset)
+            chunk = f.read(max(0, size - state.offset))
+        # only complete lines; a partial last line is picked up next time
+        end = chunk.rfind(b"\n") + 1
+        chunk = chunk[:end]
+        state.offset += end
+        state.tail = (state.tail + chunk)[-TAIL_CHECK:]
+        state.mtime_ns, state.size = stat.st_mtime_ns, stat.st_size
+        state.seq = record[0] if record is not None else None
+        ts_col = state.header.index("timestamp")
+        count = 0
+        for values in csv.reader(io.StringIO(chunk.decode("utf-8"))):
+            if not values:
+                continue
+            row = {k: _value(v) for k, v in zip(state.header, values)}
+            ts = row["timestamp"] = values[ts_col].split(".")[0]
+            index.upsert(ts, row)
+            count += 1
+        return count
+
+    def refresh(self, symbol: str, force: bool = False):
+        symbol = symbol.upper()
+        with self._lock:
+            index = self._symbols.get(symbol)
+            if index is None:
+                index = self._symbols[symbol] = _SymbolIndex()
+            now = time.monotonic()
+            if not force and now - index.checked_at < self.refresh_interval:
+                return index
+            for path in self._files(symbol):
+                state = index.files.setdefault(path, _FileState())
+                try:
+                    self._read(index, path, state)
+                except (OSError, ValueError):
+                    continue
+            index.checked_at = now
+            return index
+
+    def latest(self, symbol: str):
+        index = self.refresh(symbol)
+        if not index.timestamps:
+            return None
+        return index.rows[index.timestamps[-1]]
+
+    def range(self, symbol: str, start: str = None, end: str = None, limit: int = None):
+        """Rows with start <= timestamp <= end (both 'YYYYMMDDhhmm', inclusive)"""
+        index = self.refresh(symbol)
+        ts = index.timestamps
+        lo = bisect_left(ts, start) if start else 0
+        hi = bisect_right(ts, end) if end else len(ts)
+        if limit is not None:
+            lo = max(lo, hi - limit)
+        return [index.rows[t] for t in ts[lo:hi]]
+
+    def symbols(self):
+        with self._lock:
+            return sorted(self._symbols)
+
+
+def _live_parts(folder: Path) -> list:
+    """Parquet parts of a day that readers use: the newest '-base' rewrite and the appends after it"""
+    parts = sorted(folder.glob("part-*.parquet"))
+    bases = [i for i, p in enumerate(parts) if p.stem.endswith("-base")]
+    return parts[bases[-1]:] if bases else parts
+
+
+class ParquetGexIndex(GexIndex):
+    """
+    GexIndex over the parquet day store, which also holds metrics and regimes
+    for the matrix store: GEX_DATA_DIR/parquet/{kind}/ticker=T/day=D. A day is
+    re-read only when its live parts change, and only its new parts when
+    parts were appended.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # pyarrow is optional for the API (the "parquet" extra): without it the
+        # startup check fails instead of every /gex request
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ImportError(f"DAY_STORE='{GEX_STORE}' needs pyarrow: pip install .[parquet]") from None
+        super().__init__(*args, **kwargs)
+
+    def _files(self, symbol):
+        found = []
+        for kind in KINDS:
+            days = sorted((self.base_dir / "parquet" / kind / f"ticker={symbol}").glob("day=*"))
+            found.extend(days[-self.days:])
+        return found
+
+    def _read(self, index, folder, state):
+        import pyarrow.parquet as pq
+        parts = _live_parts(folder)
+        names = tuple(p.name for p in parts)
+        if names == state.parts:
+            return 0
+        appended = names[:len(state.parts)] == state.parts
+        new = parts[len(state.parts):] if appended else parts
+        count = 0
+        for part in new:
+            for row in pq.read_table(part).to_pylist():
+                row = {k: None if isinstance(v, float) and (math.isnan(v) or math.isinf(v)) else v
+                       for k, v in row.items()}
+                ts = row["timestamp"] = (EPOCH + timedelta(minutes=int(row["timestamp"]))).strftime("%Y%m%d%H%M")
+                index.upsert(ts, row)
+                count += 1
+        state.parts = names
+        return count
+
+
+def _epoch_minutes(ts: str) -> int:
+    return (datetime.strptime(ts, "%Y%m%d%H%M") - EPOCH) // timedelta(minutes=1)
+
+
+class SqliteGexIndex:
+    """
+    GexIndex over the pipeline's SQLite store (DAY_STORE=sqlite): latest and
+    range are range scans of the (ticker, ts) index of the metrics and regimes
+    tables, so nothing is cached and no file is re-read.
+    """
+
+    def __init__(self, base_dir=GEX_DATA_DIR):
+        self.path = Path(base_dir) / SQLITE_FILE
+        self._conn = None
+        self._types = {}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None and self.path.exists():
+            uri = self.path.resolve().as_uri() + "?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return self._conn
+
+    def _rows(self, kind, symbol, lo, hi, limit):
+        conn = self._connect()
+        if conn is None:
+            return []
+        if kind not in self._types:
+            info = conn.execute(f'PRAGMA table_info("{kind}")').fetchall()
+            if not info:
+                return []
+            self._types[kind] = {name: decl for _, name, decl, *_ in info}
+        sql = f'SELECT * FROM "{kind}" WHERE ticker = ? AND ts BETWEEN ? AND ? ORDER BY ts DESC'
+        params = [symbol, lo, hi]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        cursor = conn.execute(sql, params)
+        names = [d[0] for d in cursor.description]
+        booleans = {n for n, decl in self._types[kind].items() if decl == "BOOLEAN"}
+        out = []
+        for values in cursor.fetchall():
+            row = {n: (bool(v) if n in booleans and v is not None else v) for n, v in zip(names, values)}
+            row.pop("ticker", None)
+            row["timestamp"] = (EPOCH + timedelta(minutes=row.pop("ts"))).strftime("%Y%m%d%H%M")
+            out.append(row)
+        return out
+
+    def range(self, symbol: str, start: str = None, end: str = None, limit: int = None):
+        """Rows with start <= timestamp <= end (both 'YYYYMMDDhhmm', inclusive)"""
+        lo = _epoch_minutes(start) if start else 0
+        hi = _epoch_minutes(end) if end else 2 ** 62
+        rows = {}
+        with self._lock:
+            for kind in KINDS:
+                for row in self._rows(kind, symbol.upper(), lo, hi, limit):
+                    rows.setdefault(row["timestamp"], {}).update(row)
+        ordered = [rows[ts] for ts in sorted(rows)]
+        return ordered[-limit:] if limit is not None else ordered
+
+    def latest(self, symbol: str):
+        rows = self.range(symbol, limit=1)
+        return rows[-1] if rows else None
+
+    def symbols(self):
+        with self._lock:
+            conn = self._connect()
+            found = set()
+            for kind in KINDS:
+                try:
+                    found.update(t for (t,) in conn.execute(f'SELECT DISTINCT ticker FROM "{kind}"'))
+                except (AttributeError, sqlite3.OperationalError):
+                    continue
+            return sorted(found)
+
+
+def gex_point(symbol: str, row: dict) -> dict:
+    """One row in the nested shape of API_DESIGN_PROPOSAL.md"""
+    g = row.get
+    return {
+        "symbol": symbol,
+        "timestamp": iso_timestamp(row["timestamp"]),
+        "data": {
+            "spot": g("spot"),
+            "zgamma": g("zgamma"),
+            "pin_band_pts": g("pin_band_pts"),
+            "in_pin_band": g("in_pin_band"),
+            "primary_regime": g("primary_regime"),
+            "signals": {
+                "breakout_ok": g("breakout_ok"),
+                "flip_risk": g("flip_risk"),
+                "wall_shift": g("wall_shift"),
+                "range_break": g("range_break"),
+                "shelf_pin": g("shelf_pin"),
+                "anomaly": g("anomaly"),
+            },
+            "levels": {
+                "nearest_wall_strike": g("nearest_wall_strike"),
+                "largest_call_wall_strike": g("largest_call_wall_strike"),
+                "largest_put_wall_strike": g("largest_put_wall_strike"),
+                "pin_anchor": g("pin_anchor"),
+            },
+            "metrics": {
+                "compression_score": g("compression_score"),
+                "ramp": g("ramp"),
+                "regime_score": g("regime_score"),
+                "total_net_gex": g("total_net_gex"),
+            },
+        },
+    }
+
+
+def flat_row(row: dict) -> dict:
+    return dict(row, timestamp=iso_timestamp(row["timestamp"]))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+INDEXES = {"csv": GexIndex, "parquet": ParquetGexIndex, "matrix": ParquetGexIndex, "sqlite": SqliteGexIndex}
+
+
+def get_gex_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            store = GEX_STORE.lower()
+            if store not in INDEXES:
+                raise ValueError(f"DAY_STORE='{GEX_STORE}' has no GEX index (choose from {', '.join(INDEXES)})")
+            _index = INDEXES[store]()
+        return _index
@@ -0,0 +1,160 @@
+# helpers/gex_stream.py
+
+import asyncio
+import os
+
+from .gex_index import get_gex_index, gex_point
+
+WATCH_INTERVAL_S = float(os.environ.get("GEX_WATCH_INTERVAL_S", "0.5"))
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get("GEX_SUBSCRIBER_QUEUE", "64"))
+
+# fields whose change makes a transition event
+TRANSITION_FIELDS = ("primary_regime", "breakout_ok", "flip_risk", "wall_shift", "range_break",
+                     "shelf_pin", "anomaly", "in_pin_band")
+
+MODES = ("rows", "transitions")
+
+
+class Subscriber:
+    """Bounded queue of one client; when full the oldest event is dropped"""
+
+    def __init__(self, mode: str, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.mode = mode
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def offer(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def next(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+def _transition(previous: dict, row: dict):
+    if previous is None:
+        return None
+    changes = {f: [previous.get(f), row.get(f)] for f in TRANSITION_FIELDS if previous.get(f) != row.get(f)}
+    return changes or None
+
+
+def replay_events(symbol: str, rows, mode: str, after: str):
+    """
+    The events the watcher would have published for `rows` (oldest first):
+    (event, timestamp, payload) for each regime row after `after`. Rows at or
+    before `after` only seed the transition diff.
+    """
+    previous = None
+    for row in rows:
+        if row.get("primary_regime") is None:
+            continue
+        changes = _transition(previous, row)
+        previous = row
+        if row["timestamp"] <= after:
+            continue
+        if mode == "rows":
+            yield "row", row["timestamp"], gex_point(symbol, row)
+        elif changes:
+            yield "transition", row["timestamp"], dict(gex_point(symbol, row), changes=changes)
+
+
+class _SymbolFeed:
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.subscribers = set()
+        self.task = None
+        self.primed = None    # set once the watcher has loaded the latest row
+        self.last_ts = None
+        self.last_row = None
+
+
+class GexBroadcaster:
+    """
+    Per-symbol fan-out of new regime rows. One watcher task per symbol polls
+    the GexIndex while it has subscribers and hands each new row (a timestamp
+    with primary_regime set) to every subscriber queue; subscribers in
+    "transitions" mode only get rows where a TRANSITION_FIELDS value changed.
+    A slow client only loses its own oldest events.
+    """
+
+    def __init__(self, index=None, interval: float = WATCH_INTERVAL_S):
+        self.index = index or get_gex_index()
+        self.interval = interval
+        self._feeds = {}
+
+    def _regime_rows(self, symbol, after):
+        rows = self.index.range(symbol, start=after)
+        return [r for r in rows if r.get("primary_regime") is not None and r["timestamp"] != after]
+
+    async def subscribe(self, symbol: str, mode: str = "rows") -> Subscriber:
+        symbol = symbol.upper()
+        feed = self._feeds.get(symbol)
+        if feed is None:
+            feed = self._feeds[symbol] = _SymbolFeed(symbol)
+        subscriber = Subscriber(mode)
+        feed.subscribers.add(subscriber)
+        if feed.task is None:
+            # started before the first await, so concurrent first subscribers share one watcher
+            feed.primed = asyncio.Event()
+            feed.task = asyncio.create_task(self._watch(feed, feed.primed))
+        try:
+            await feed.primed.wait()
+        except BaseException:
+            self.unsubscribe(symbol, subscriber)
+            raise
+        return subscriber
+
+    def unsubscribe(self, symbol: str, subscriber: Subscriber):
+        feed = self._feeds.get(symbol.upper())
+        if feed is None:
+            return
+        feed.subscribers.discard(subscriber)
+        if not feed.subscribers and feed.task is not None:
+            feed.task.cancel()
+            feed.task = None
+
+    def latest(self, symbol: str):
+        feed = self._feeds.get(symbol.upper())
+        return feed.last_row if feed else None
+
+    async def _watch(self, feed, primed):
+        try:
+            rows = await asyncio.to_thread(self._regime_rows, feed.symbol, None)
+            if rows:
+                feed.last_ts, feed.last_row = rows[-1]["timestamp"], dict(rows[-1])
+        except Exception as e:
+            print(f"⚠️ GEX watcher for {feed.symbol}: {e}")
+        finally:
+            primed.set()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                rows = await asyncio.to_thread(self._regime_rows, feed.symbol, feed.last_ts)
+            except Exception as e:
+                print(f"⚠️ GEX watcher for {feed.symbol}: {e}")
+                continue
+            for row in rows:
+                self._publish(feed, dict(row))
+
+    def _publish(self, feed, row):
+        point = gex_point(feed.symbol, row)
+        changes = _transition(feed.last_row, row)
+        feed.last_ts, feed.last_row = row["timestamp"], row
+        for subscriber in list(feed.subscribers):
+            if subscriber.mode == "rows":
+                subscriber.offer(("row", row["timestamp"], point))
+            elif changes:
+                subscriber.offer(("transition", row["timestamp"], dict(point, changes=changes)))
+
+
+_broadcaster = None
+
+
+def get_broadcaster() -> GexBroadcaster:
+    """Broadcaster of the serving event loop"""
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = GexBroadcaster()
+    return _broadcaster
@@ -1,17 +1,216 @@
-﻿from ib_insync import IB, Stock
+﻿import asyncio
+import atexit
+import os
+import queue
 import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from ib_insync import IB, Stock, util
+
+IB_HOST = os.environ.get("IB_HOST", "127.0.0.1")
+IB_PORT = int(os.environ.get("IB_PORT", "4001"))
+IB_CLIENT_ID = int(os.environ.get("IB_CLIENT_ID", "11"))     # legacy single connection; the pool uses the next ids
+IB_POOL_SIZE = int(os.environ.get("IB_POOL_SIZE", "4"))
+IB_POOL_TIMEOUT = float(os.environ.get("IB_POOL_TIMEOUT", "30"))  # max wait for a free connection
+HEALTH_CHECK_INTERVAL = 30.0   # seconds between round-trip checks of an idle connection
+HEALTH_CHECK_TIMEOUT = 2.0
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
 
 _ib = None
 _lock = threading.Lock()
+_session = ContextVar("ib_session", default=None)
+
+
+async def _connect_async(client_id: int) -> IB:
+    ib = IB()
+    await ib.connectAsync(IB_HOST, IB_PORT, clientId=client_id)
+    ib.reqMarketDataType(1)                     # live first
+    # warm‑up
+    ib.reqMktData(Stock('SPY','SMART','USD'), '', snapshot=True)
+    await asyncio.sleep(0.5)
+    return ib
+
+
+def _connect(client_id: int) -> IB:
+    return util.run(_connect_async(client_id))
+
+
+class _Slot:
+    """One pooled connection, used by one request at a time"""
+
+    def __init__(self, client_id: int, loop=None):
+        self.client_id = client_id
+        self.loop = loop    # own event loop for the threaded pool, None for the async pool
+        self.ib = None
+        self.failures = 0
+        self.retry_at = 0.0
+        self.checked_at = 0.0
+
+    async def healthy_async(self) -> bool:
+        if self.ib is None or not self.ib.isConnected():
+            return False
+        if time.monotonic() - self.checked_at < HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            await asyncio.wait_for(self.ib.reqCurrentTimeAsync(), HEALTH_CHECK_TIMEOUT)
+        except Exception:
+            return False
+        self.checked_at = time.monotonic()
+        return True
+
+    async def ensure_async(self) -> IB:
+        if await self.healthy_async():
+            return self.ib
+        now = time.monotonic()
+        if now < self.retry_at:
+            raise ConnectionError(f"IB client {self.client_id} reconnecting in {self.retry_at - now:.1f}s")
+        if self.ib is not None:
+            self.ib.disconnect()
+            self.ib = None
+        try:
+            self.ib = await _connect_async(self.client_id)
+        except Exception as exc:
+            self.failures += 1
+            self.retry_at = now + min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.failures - 1))
+            raise ConnectionError(f"IB client {self.client_id} failed to connect: {exc}") from exc
+        self.failures = 0
+        self.checked_at = time.monotonic()
+        return self.ib
+
+    def ensure(self) -> IB:
+        return util.run(self.ensure_async())
+
+
+class IBPool:
+    """
+    Fixed-size pool of IB connections with distinct client IDs.
+    Each request checks one connection out, so independent requests run in
+    parallel instead of queueing on a single socket.
+    """
+
+    def __init__(self, size=IB_POOL_SIZE, first_client_id=IB_CLIENT_ID + 1):
+        self.size = size
+        self._idle = queue.LifoQueue()
+        for i in range(size):
+            self._idle.put(_Slot(first_client_id + i, asyncio.new_event_loop()))
+
+    @contextmanager
+    def connection(self, timeout=IB_POOL_TIMEOUT):
+        try:
+            slot = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise ConnectionError(f"No free IB connection within {timeout}s (pool size {self.size})") from None
+        # ib_insync's sync calls run on the current thread's loop: point it at the slot's loop
+        asyncio.set_event_loop(slot.loop)
+        try:
+            yield slot.ensure()
+        finally:
+            asyncio.set_event_loop(None)
+            self._idle.put(slot)
+
+    def close(self):
+        while not self._idle.empty():
+            slot = self._idle.get_nowait()
+            if slot.ib is not None:
+                asyncio.set_event_loop(slot.loop)
+                slot.ib.disconnect()
+                asyncio.set_event_loop(None)
+
+
+class AsyncIBPool:
+    """
+    IBPool for the async API: connections live on the serving event loop and
+    a request awaits a free one instead of blocking a thread. Uses the client
+    IDs after the threaded pool's, so both can exist in one process.
+    """
+
+    def __init__(self, size=IB_POOL_SIZE, first_client_id=IB_CLIENT_ID + 1 + IB_POOL_SIZE):
+        # ib_insync finds its loop through the policy (util.getLoop); servers that
+        # build the loop with a factory (uvicorn) never register it there
+        asyncio.set_event_loop(asyncio.get_running_loop())
+        self.size = size
+        self._idle = asyncio.LifoQueue()
+        for i in range(size):
+            self._idle.put_nowait(_Slot(first_client_id + i))
+
+    @asynccontextmanager
+    async def connection(self, timeout=IB_POOL_TIMEOUT):
+        try:
+            slot = await asyncio.wait_for(self._idle.get(), timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionError(f"No free IB connection within {timeout}s (pool size {self.size})") from None
+        try:
+            yield await slot.ensure_async()
+        finally:
+            self._idle.put_nowait(slot)
+
+    def close(self):
+        while not self._idle.empty():
+            slot = self._idle.get_nowait()
+            if slot.ib is not None:
+                slot.ib.disconnect()
+
+
+_pool = None
+_async_pool = None
+
+
+def get_pool() -> IBPool:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = IBPool()
+            atexit.register(_pool.close)
+        return _pool
+
+
+def get_async_pool() -> AsyncIBPool:
+    """The async pool, created on first use from the serving event loop"""
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = AsyncIBPool()
+    return _async_pool
+
+
+def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        _async_pool.close()
+        _async_pool = None
+
+
+@asynccontextmanager
+async def ib_session_async():
+    """Await a pooled connection for the duration of one async request"""
+    async with get_async_pool().connection() as ib:
+        token = _session.set(ib)
+        try:
+            yield ib
+        finally:
+            _session.reset(token)
+
+
+@contextmanager
+def ib_session():
+    """Check a pooled connection out for the duration of one request"""
+    with get_pool().connection() as ib:
+        token = _session.set(ib)
+        try:
+            yield ib
+        finally:
+            _session.reset(token)
+
 
 def get_ib():
+    """The connection of the current `ib_session`, else the single shared connection"""
+    ib = _session.get()
+    if ib is not None:
+        return ib
     global _ib
     with _lock:
         if _ib is None or not _ib.isConnected():
-            _ib = IB()
-            _ib.connect('127.0.0.1', 4001, clientId=11)   # one dedicated ID
-            _ib.reqMarketDataType(1)                     # live first
-            # warm‑up
-            _ib.reqMktData(Stock('SPY','SMART','USD'), '', snapshot=True)
-            _ib.sleep(0.5)
+            _ib = _connect(IB_CLIENT_ID)   # one dedicated ID
         return _ib
@@ -1,50 +1,74 @@
-﻿from ib_insync import Option, Stock, Contract
+﻿from ib_insync import util
+
 from .ib_connection import get_ib
+from .contract_cache import get_contract_cache
+from .last_trade_or_prev_close import last_trade_or_prev_close_async
+from .market_data import OI_TICKS, OPTION_TICKS, option_oi, has_greeks, stream_until_ready_async
 
-def fetch_chain_ib(ticker:str, expiry:str):
-    ib = get_ib()
+CHAIN_TIMEOUT = 10.0  # seconds to wait for the window's OI / greeks to arrive
 
-    # 1) Qualify underlying
-    if ticker == 'SPX':
-        underlying = Contract(symbol='SPX', secType='IND', exchange='CBOE', currency='USD')
-    else:
-        underlying = Stock(ticker, 'SMART', 'USD')
-    underlying = ib.qualifyContracts(underlying)[0]
 
-    # 2) Get strikes for chosen expiry
-    params = ib.reqSecDefOptParams(underlying.symbol, '', underlying.secType, underlying.conId)
-    chain = next(c for c in params if expiry in c.expirations)
-    strikes = sorted(chain.strikes)
+async def fetch_chain_ib_async(ib, ticker:str, expiry:str, center:float = None, width:float = None,
+                               strike_filter=None, include_greeks:bool = True, spot:float = None):
+    """
+    Per-strike OI (plus IV and GEX when include_greeks) for one expiry.
+    Only strikes with |strike - center| <= width, or accepted by strike_filter,
+    are requested; the whole chain is fetched only when neither is given.
+    """
+    cache = get_contract_cache()
 
-    # 3) Build Option contracts
-    options = [
-        Option(underlying.symbol, expiry, s, r, 'SMART')
-        for s in strikes for r in ('C','P')
-    ]
-    details = ib.qualifyContracts(*options)
+    # 1) Strikes for chosen expiry (chain parameters cached for the day)
+    chain = await cache.chain_async(ib, ticker)
+    if expiry not in chain['expirations']:
+        raise ValueError(f"Expiry '{expiry}' not in available expirations: {chain['expirations']}")
+    strikes = chain['strikes']
+    if strike_filter is None and center is not None and width is not None:
+        strike_filter = lambda s: abs(s - center) <= width
+    if strike_filter is not None:
+        strikes = [s for s in strikes if strike_filter(s)]
+    if not strikes:
+        return []
 
-    # 4) Batch request snapshots with tick list 225 (OI, IV, greeks)
-    tickers = ib.reqTickers(*details, tickList='225')
+    # 2) Pre-qualified Option contracts, only unseen ones go to IB
+    options = await cache.options_async(ib, ticker, expiry, strikes, trading_class=chain['tradingClass'])
+    contracts = list(options.values())
 
-    # Wait briefly
-    ib.sleep(max(1, len(tickers)/50))
+    # 3) Stream the window and return as soon as every leg has its fields
+    if include_greeks:
+        ready = lambda t: option_oi(t) is not None and has_greeks(t)
+        ticks = OPTION_TICKS
+    else:
+        ready = lambda t: option_oi(t) is not None
+        ticks = OI_TICKS
+    tickers = await stream_until_ready_async(ib, contracts, ticks, ready, CHAIN_TIMEOUT)
 
-    # 5) Aggregate per‐strike
-    result = []
-    last = ib.reqMktData(underlying, '', snapshot=True)
-    ib.sleep(0.5)
-    S = last.last or last.close
+    # 4) Index legs by (strike, right) and aggregate per strike
+    legs = {(t.contract.strike, t.contract.right): t for t in tickers}
+    if include_greeks and spot is None:
+        spot, _ = await last_trade_or_prev_close_async(ib, ticker)
+    S = spot or 0
 
+    result = []
     for s in strikes:
-        call = next(t for t in tickers if t.contract.strike==s and t.contract.right=='C')
-        put  = next(t for t in tickers if t.contract.strike==s and t.contract.right=='P')
-        gex = ( (call.gamma or 0)*(call.openInterest or 0)
-                + (put.gamma  or 0)*(put.openInterest  or 0) ) * (S**2)*100
-        result.append({
+        call = legs.get((s, 'C'))
+        put  = legs.get((s, 'P'))
+        if call is None or put is None:
+            continue
+        row = {
             'strike': s,
-            'call_OI': call.openInterest or 0,
-            'put_OI' : put.openInterest  or 0,
-            'iv'     : ((call.impliedVol or 0)+(put.impliedVol or 0))/2,
-            'GEX'    : gex
-        })
+            'call_OI': int(option_oi(call) or 0),
+            'put_OI' : int(option_oi(put)  or 0),
+        }
+        if include_greeks:
+            cg, pg = call.modelGreeks, put.modelGreeks
+            row['iv'] = (((cg.impliedVol if cg else 0) or 0) + ((pg.impliedVol if pg else 0) or 0)) / 2
+            row['GEX'] = (((cg.gamma if cg else 0) or 0) * row['call_OI']
+                          + ((pg.gamma if pg else 0) or 0) * row['put_OI']) * (S**2) * 100
+        result.append(row)
     return result
+
+
+def fetch_chain_ib(ticker:str, expiry:str, center:float = None, width:float = None, strike_filter=None,
+                   include_greeks:bool = True, spot:float = None):
+    return util.run(fetch_chain_ib_async(get_ib(), ticker, expiry, center, width, strike_filter,
+                                         include_greeks, spot))
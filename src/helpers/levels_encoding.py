@@ -0,0 +1,139 @@
+# helpers/levels_encoding.py
+
+import hashlib
+import json
+import math
+from decimal import Decimal
+
+# format -> media type; "json" is the row-per-strike OptionLevelsResponse shape
+MEDIA_TYPES = {
+    "json": "application/json",
+    "columns": "application/vnd.option-levels.columns+json",
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+ACCEPT_ALIASES = {"application/x-msgpack": "msgpack"}
+
+# column -> type of the StrikeLevel / OptionLevelsResponse field, in model order
+STRIKE_TYPES = {"strike": float, "call_OI": int, "put_OI": int, "iv": float, "GEX": float}
+HEADER_TYPES = {"ticker": str, "expiry": str, "center_price": float, "width": int, "fetched_at": float}
+STRIKE_COLUMNS = tuple(STRIKE_TYPES)
+HEADER_FIELDS = tuple(HEADER_TYPES)
+
+
+class EncodingUnavailable(Exception):
+    """The requested format needs an optional package that is not installed"""
+
+
+def json_default(value):
+    # DynamoDB numbers come back as Decimal; encode them like FastAPI does
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def negotiate(format_param: str = None, accept: str = None) -> str:
+    """
+    Format named by `format_param`, else the first compact media type listed in
+    `accept`, else "json". Raises ValueError for an unknown `format_param`.
+    """
+    if format_param:
+        if format_param not in MEDIA_TYPES:
+            raise ValueError(f"format must be one of {', '.join(MEDIA_TYPES)}")
+        return format_param
+    by_type = {v: k for k, v in MEDIA_TYPES.items()}
+    by_type.update(ACCEPT_ALIASES)
+    for part in (accept or "").split(","):
+        fmt = by_type.get(part.split(";")[0].strip().lower())
+        if fmt is not None:
+            return fmt
+    return "json"
+
+
+def response(payload: dict) -> dict:
+    """
+    The OptionLevelsResponse body response_model validation used to produce:
+    every model field in order, typed like the model, with the optional strike
+    columns present as None when the payload (e.g. greeks=false) has none.
+    """
+    out = {k: _typed(payload.get(k), HEADER_TYPES[k]) for k in ("ticker", "expiry", "center_price", "width")}
+    out["strikes"] = [{c: _typed(r.get(c), t) for c, t in STRIKE_TYPES.items()}
+                      for r in payload.get("strikes") or []]
+    out["fetched_at"] = _typed(payload.get("fetched_at"), float)
+    return out
+
+
+def _typed(value, kind):
+    if value is None:
+        return None
+    if kind is float:
+        value = float(value)
+        return None if math.isnan(value) or math.isinf(value) else value
+    return kind(value)
+
+
+def columns(payload: dict) -> dict:
+    """Header fields plus one array per strike column"""
+    out = {k: payload.get(k) for k in HEADER_FIELDS}
+    rows = payload.get("strikes") or []
+    out["strikes"] = {c: [_plain(r.get(c)) for r in rows] for c in STRIKE_COLUMNS}
+    return out
+
+
+def _plain(value):
+    return json_default(value) if isinstance(value, Decimal) else value
+
+
+def _dumps(obj) -> bytes:
+    try:
+        import orjson
+    except ImportError:
+        return json.dumps(obj, separators=(",", ":"), default=json_default).encode()
+    return orjson.dumps(obj, default=json_default)
+
+
+def _arrow(payload: dict) -> bytes:
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise EncodingUnavailable("format 'arrow' needs pyarrow") from None
+    cols = columns(payload)["strikes"]
+    schema = pa.schema(
+        [("strike", pa.float64()), ("call_OI", pa.int64()), ("put_OI", pa.int64()),
+         ("iv", pa.float64()), ("GEX", pa.float64())],
+        metadata={k: str(payload[k]) for k in HEADER_FIELDS if payload.get(k) is not None})
+    table = pa.Table.from_pydict(cols, schema=schema)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode(payload: dict, fmt: str) -> bytes:
+    """Body bytes of `payload` in `fmt`; raises EncodingUnavailable if its package is missing"""
+    if fmt == "json":
+        return _dumps(response(payload))
+    if fmt == "columns":
+        return _dumps(columns(payload))
+    if fmt == "msgpack":
+        try:
+            import msgpack
+        except ImportError:
+            raise EncodingUnavailable("format 'msgpack' needs msgpack") from None
+        return msgpack.packb(columns(payload), default=json_default)
+    if fmt == "arrow":
+        return _arrow(payload)
+    raise ValueError(f"Unknown format '{fmt}'")
+
+
+def etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, tag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # weak comparison, as RFC 9110 asks for If-None-Match
+    return any(t.strip().removeprefix("W/") == tag for t in if_none_match.split(","))
@@ -0,0 +1,207 @@
+# helpers/levels_store.py
+
+import json
+import os
+import sqlite3
+import threading
+from decimal import Decimal
+from pathlib import Path
+
+from .response_cache import TTLCache
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "dynamodb")   # dynamodb | sqlite | memory
+DDB_TABLE_NAME = os.environ.get("DDB_TABLE_NAME", "OptionLevels")
+SQLITE_PATH = Path(os.environ.get("LEVELS_STORE_PATH", Path.home() / ".option_levels" / "levels.db"))
+STORE_READ_TTL_S = float(os.environ.get("STORE_READ_TTL_S", "60"))
+STORE_READ_CACHE_SIZE = int(os.environ.get("STORE_READ_CACHE_SIZE", "1024"))
+
+DDB_BATCH_GET_MAX = 100   # keys per BatchGetItem call
+DDB_BATCH_RETRIES = 5
+
+
+def item_key(date: str, ticker: str, expiry: str) -> dict:
+    """
+    Primary key of one stored payload: partition = date, sort = 'ticker#expiry'.
+    The ticker is used as given, as in the existing table's items.
+    """
+    return {"date": date, "ticker_exp": f"{ticker}#{expiry}"}
+
+
+class MemoryStore:
+    """Dict-backed store for tests and offline benchmarks"""
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._items.get((key["date"], key["ticker_exp"]))
+
+    def get_many(self, keys):
+        with self._lock:
+            return [self._items.get((k["date"], k["ticker_exp"])) for k in keys]
+
+    def put_many(self, items):
+        with self._lock:
+            for key, payload in items:
+                self._items[(key["date"], key["ticker_exp"])] = payload
+
+
+class SQLiteStore:
+    """Local single-file store with the DynamoDB table's key layout"""
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = Path(path)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS levels ("
+                " date TEXT NOT NULL, ticker_exp TEXT NOT NULL, payload TEXT NOT NULL,"
+                " PRIMARY KEY (date, ticker_exp))")
+        return self._conn
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        with self._lock:
+            found = {}
+            for key in keys:
+                row = self.conn.execute("SELECT payload FROM levels WHERE date = ? AND ticker_exp = ?",
+                                        (key["date"], key["ticker_exp"])).fetchone()
+                if row is not None:
+                    found[(key["date"], key["ticker_exp"])] = json.loads(row[0])
+        return [found.get((k["date"], k["ticker_exp"])) for k in keys]
+
+    def put_many(self, items):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO levels (date, ticker_exp, payload) VALUES (?, ?, ?)",
+                [(k["date"], k["ticker_exp"], json.dumps(payload)) for k, payload in items])
+
+
+class DynamoStore:
+    """
+    The OptionLevels table. boto3 is imported and the client built on first
+    use, so processes that never touch the table (or use another backend)
+    do not pay for it at import time.
+    """
+
+    def __init__(self, table_name=DDB_TABLE_NAME):
+        self.table_name = table_name
+        self._resource = None
+        self._table = None
+        self._lock = threading.Lock()
+
+    @property
+    def resource(self):
+        with self._lock:
+            if self._resource is None:
+                import boto3
+                self._resource = boto3.resource("dynamodb")
+            return self._resource
+
+    @property
+    def table(self):
+        if self._table is None:
+            self._table = self.resource.Table(self.table_name)
+        return self._table
+
+    def get(self, key):
+        item = self.table.get_item(Key=key).get("Item")
+        return item["payload"] if item else None
+
+    def get_many(self, keys):
+        found = {}
+        for i in range(0, len(keys), DDB_BATCH_GET_MAX):
+            request = {self.table_name: {"Keys": keys[i:i + DDB_BATCH_GET_MAX]}}
+            for _ in range(DDB_BATCH_RETRIES):
+                resp = self.resource.batch_get_item(RequestItems=request)
+                for item in resp["Responses"].get(self.table_name, []):
+                    found[(item["date"], item["ticker_exp"])] = item["payload"]
+                request = resp.get("UnprocessedKeys")
+                if not request:
+                    break
+            else:
+                print(f"⚠️ {len(request[self.table_name]['Keys'])} keys unprocessed after {DDB_BATCH_RETRIES} tries")
+        return [found.get((k["date"], k["ticker_exp"])) for k in keys]
+
+    def put_many(self, items):
+        with self.table.batch_writer(overwrite_by_pkeys=["date", "ticker_exp"]) as batch:
+            for key, payload in items:
+                # DynamoDB takes numbers as Decimal, not float
+                batch.put_item(Item=dict(key, payload=json.loads(json.dumps(payload), parse_float=Decimal)))
+
+
+class LevelsStore:
+    """
+    Read-through cache in front of a backend. Reads are answered from memory
+    for STORE_READ_TTL_S; `get_many` sends only the missing keys to the
+    backend in one batch, and writes update both.
+    """
+
+    def __init__(self, backend, ttl=STORE_READ_TTL_S, max_entries=STORE_READ_CACHE_SIZE):
+        self.backend = backend
+        self._cache = TTLCache(ttl, max_entries)
+
+    def get(self, date: str, ticker: str, expiry: str):
+        key = item_key(date, ticker, expiry)
+        return self._cache.get_or_load(_cache_key(key), lambda: self.backend.get(key))
+
+    def get_many(self, date: str, pairs):
+        """Payloads (None where missing) for [(ticker, expiry), ...] of one date, in order"""
+        keys = [item_key(date, t, e) for t, e in pairs]
+        payloads = [self._cache.get(_cache_key(k)) for k in keys]
+        missing = [i for i, p in enumerate(payloads) if p is None]
+        if missing:
+            # the same ticker/expiry asked twice is fetched once
+            unique = list({_cache_key(keys[i]): keys[i] for i in missing}.values())
+            fetched = dict(zip(map(_cache_key, unique), self.backend.get_many(unique)))
+            for i in missing:
+                payloads[i] = fetched[_cache_key(keys[i])]
+            for ck, payload in fetched.items():
+                if payload is not None:
+                    self._cache.put(ck, payload)
+        return payloads
+
+    def put(self, date: str, ticker: str, expiry: str, payload: dict):
+        self.put_many(date, [(ticker, expiry, payload)])
+
+    def put_many(self, date: str, items):
+        """Write [(ticker, expiry, payload), ...] of one date in one batch"""
+        keyed = [(item_key(date, t, e), payload) for t, e, payload in items]
+        self.backend.put_many(keyed)
+        for key, payload in keyed:
+            self._cache.put(_cache_key(key), payload)
+
+
+def _cache_key(key):
+    return key["date"], key["ticker_exp"]
+
+
+BACKENDS = {
+    "dynamodb": DynamoStore,
+    "sqlite": SQLiteStore,
+    "memory": MemoryStore,
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> LevelsStore:
+    """The process-wide store for CACHE_BACKEND"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if CACHE_BACKEND not in BACKENDS:
+                raise ValueError(f"CACHE_BACKEND must be one of {', '.join(BACKENDS)}, not '{CACHE_BACKEND}'")
+            _store = LevelsStore(BACKENDS[CACHE_BACKEND]())
+        return _store
@@ -0,0 +1,52 @@
+# helpers/market_data.py
+
+import asyncio
+import math
+import time
+
+from ib_insync import util
+
+OI_TICKS = "101"               # option open interest
+OPTION_TICKS = "100,101,106"   # volume, open interest, implied vol (greeks arrive with every option line)
+
+
+def _valid(value):
+    return value is not None and not math.isnan(value)
+
+
+def option_oi(ticker):
+    """Open interest of the ticker's own right, or None until it has arrived"""
+    value = ticker.callOpenInterest if ticker.contract.right == "C" else ticker.putOpenInterest
+    return value if _valid(value) else None
+
+
+def has_greeks(ticker):
+    greeks = ticker.modelGreeks
+    return bool(greeks) and _valid(greeks.gamma) and _valid(greeks.impliedVol)
+
+
+async def stream_until_ready_async(ib, contracts, generic_ticks, ready, timeout):
+    """
+    Subscribe all contracts at once and return their tickers as soon as
+    `ready(ticker)` holds for every one of them (or at the deadline).
+    The lines are cancelled before returning; tickers keep their last values.
+    """
+    tickers = [ib.reqMktData(c, generic_ticks, snapshot=False) for c in contracts]
+    deadline = time.monotonic() + timeout
+    try:
+        while not all(ready(t) for t in tickers):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(ib.updateEvent, remaining)
+            except asyncio.TimeoutError:
+                break
+    finally:
+        for c in contracts:
+            ib.cancelMktData(c)
+    return tickers
+
+
+def stream_until_ready(ib, contracts, generic_ticks, ready, timeout):
+    return util.run(stream_until_ready_async(ib, contracts, generic_ticks, ready, timeout))
@@ -0,0 +1,123 @@
+# helpers/response_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+
+class _Flight:
+    """One in-progress computation that concurrent callers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Thread-safe TTL cache with LRU eviction and single-flight loading.
+
+    `get_or_load(key, loader)` returns a fresh cached value, or runs `loader`
+    once while every concurrent caller for the same key waits for its result.
+    Failures are not cached; they are re-raised to all waiters of that flight.
+    `get_or_load_async` does the same for coroutine loaders: the load runs as
+    its own task, so a caller that gives up does not cancel it for the others.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._flights = {}             # key -> _Flight
+        self._tasks = {}               # key -> asyncio.Task of the async load in progress
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.coalesced = 0
+
+    def get(self, key):
+        with self._lock:
+            return self._get_locked(key)
+
+    def _get_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            self.put(key, flight.value)
+            return flight.value
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def get_or_load_async(self, key, loader, force: bool = False):
+        """`force` skips a fresh entry but still joins a load already in progress"""
+        import asyncio  # only the async API needs it; keeps the cache-only handler's import light
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            value = None if force else self._get_locked(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            task = self._tasks.get(key)
+            if task is None or task.get_loop() is not loop:
+                task = self._tasks[key] = loop.create_task(loader())
+                task.add_done_callback(partial(self._landed, key))
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _landed(self, key, task):
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+        if not task.cancelled() and task.exception() is None:
+            self.put(key, task.result())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "coalesced": self.coalesced}
@@ -1,61 +1,118 @@
 ﻿# helpers/select_expiry_ib.py
 
-from ib_insync import Stock, Contract
+import asyncio
+import math
+from datetime import datetime
+
+from ib_insync import util
+
 from .ib_connection import get_ib
+from .contract_cache import get_contract_cache
+from .last_trade_or_prev_close import last_trade_or_prev_close_async
+from .market_data import OI_TICKS, option_oi, stream_until_ready_async
 
-def select_expiry_ib(ticker: str, which: str = "front") -> str:
+PROBE_EXPIRIES = 3     # candidate expiries checked for open interest
+PROBE_STRIKES = 3      # strikes nearest the money probed per expiry
+PROBE_TIMEOUT = 5.0    # seconds to wait for OI on the probe contracts
+
+# (TICKER, YYYYMMDD trading day) -> expiry calendar
+_calendars = {}
+_building = {}  # same key -> future of the build in progress
+
+
+def _nearest_strikes(strikes, spot, n):
+    if spot is None or (isinstance(spot, float) and math.isnan(spot)):
+        mid = len(strikes) // 2
+        return strikes[max(0, mid - n // 2): mid - n // 2 + n]
+    return sorted(sorted(strikes, key=lambda s: abs(s - spot))[:n])
+
+
+async def _probe_open_interest(ib, contracts, timeout=PROBE_TIMEOUT):
+    """Stream OI for all contracts at once; returns {contract: oi} as soon as every OI is in"""
+    tickers = await stream_until_ready_async(ib, contracts, OI_TICKS, lambda t: option_oi(t) is not None, timeout)
+    return {t.contract: (option_oi(t) or 0) for t in tickers}
+
+
+async def _build_calendar(ib, ticker: str) -> dict:
+    cache = get_contract_cache()
+    chain = await cache.chain_async(ib, ticker)
+    expirations = chain["expirations"]
+    candidates = expirations[:PROBE_EXPIRIES]
+
+    spot, _ = await last_trade_or_prev_close_async(ib, ticker)
+    strikes = _nearest_strikes(chain["strikes"], spot, PROBE_STRIKES)
+
+    # one qualification call (mostly cache hits) and one concurrent OI probe for every candidate
+    contracts = []
+    for exp in candidates:
+        options = await cache.options_async(ib, ticker, exp, strikes, trading_class=chain["tradingClass"])
+        contracts.extend(options.values())
+    oi_by_contract = await _probe_open_interest(ib, contracts)
+
+    total_oi = {exp: 0 for exp in candidates}
+    for contract, oi in oi_by_contract.items():
+        total_oi[contract.lastTradeDateOrContractMonth] += oi
+
+    def first_with_oi(idxs):
+        for i in idxs:
+            if i < len(candidates) and total_oi[candidates[i]] > 0:
+                return candidates[i]
+        return expirations[0]
+
+    return {
+        "expirations": expirations,
+        "total_oi": total_oi,
+        "front": first_with_oi([0, 1, 2]),
+        "next": first_with_oi([1, 2, 0]),
+    }
+
+
+async def expiry_calendar_async(ib, ticker: str) -> dict:
+    """Expiry calendar for today, resolved from IB once per ticker per trading day"""
+    key = (ticker.upper(), datetime.now().strftime("%Y%m%d"))
+    calendar = _calendars.get(key)
+    if calendar is not None:
+        return calendar
+    # concurrent requests on the same loop share one build
+    loop = asyncio.get_running_loop()
+    building = _building.get(key)
+    if building is not None and building.get_loop() is loop:
+        return await asyncio.shield(building)
+    building = _building[key] = loop.create_task(_build_calendar(ib, ticker))
+    # the build settles itself, so a cancelled leader neither loses the calendar nor strands the key
+    building.add_done_callback(lambda task: _settle(key, task))
+    return await asyncio.shield(building)
+
+
+def _settle(key, task):
+    if _building.get(key) is task:
+        del _building[key]
+    if not task.cancelled() and task.exception() is None:
+        _calendars[key] = task.result()
+
+
+def expiry_calendar(ticker: str) -> dict:
+    return util.run(expiry_calendar_async(get_ib(), ticker))
+
+
+async def select_expiry_ib_async(ib, ticker: str, which: str = "front") -> str:
     """
     Pick an option expiry for `ticker`.
       - which="front" or "today" -> first non-zero-OI expiry
       - which="next" or "tomorrow"-> second non-zero-OI expiry
-      - otherwise must be an exact "YYYY-MM-DD"
+      - otherwise must be an exact "YYYY-MM-DD" (or YYYYMMDD)
     """
-    ib = get_ib()
-
-    # 1) Qualify underlying for reqSecDefOptParams
-    if ticker.upper() == "SPX":
-        underlying = Contract(symbol="SPX", secType="IND", exchange="CBOE", currency="USD")
-    else:
-        underlying = Stock(ticker, "SMART", "USD")
-    underlying = ib.qualifyContracts(underlying)[0]
-
-    # 2) Fetch all expiries
-    params = ib.reqSecDefOptParams(underlying.symbol, "", underlying.secType, underlying.conId)
-    # usually only one chain object matches symbol/secType
-    expirations = sorted(params[0].expirations)
-
-    # 3) If user passed an exact date, validate it
+    # Exact dates only need the chain parameters, not the OI probe
     if which not in ("front", "today", "next", "tomorrow"):
-        if which in expirations:
-            return which
+        expirations = (await get_contract_cache().chain_async(ib, ticker))["expirations"]
+        exp = which.replace("-", "")
+        if exp in expirations:
+            return exp
         raise ValueError(f"Expiry '{which}' not in available expirations: {expirations}")
 
-    # 4) Build candidate list: indices into `expirations`
-    if which in ("front", "today"):
-        idxs = [0, 1, 2]
-    else:  # next/tomorrow
-        idxs = [1, 2, 0]
-
-    # 5) Pick first expiry whose total OI > 0
-    for i in idxs:
-        exp = expirations[i]
-        chain = ib.reqSecDefOptParams(underlying.symbol, "", underlying.secType, underlying.conId)
-        # get that specific expiration’s chain
-        data = next(c for c in chain if c.expirations and c.expirations[0] == exp)
-        total_oi = 0
-        # sum OI across both calls and puts for that expiry
-        for strike in data.strikes:
-            # snapshot call & put each
-            for right in ("C", "P"):
-                opt = ib.qualifyContracts(
-                    Option(underlying.symbol, exp, strike, right, "SMART")
-                )[0]
-                ticker_data = ib.reqMktData(opt, "", snapshot=True)
-                ib.sleep(0.1)
-                total_oi += (ticker_data.openInterest or 0)
-                ib.cancelMktData(opt)
-        if total_oi > 0:
-            return exp
+    calendar = await expiry_calendar_async(ib, ticker)
+    return calendar["front"] if which in ("front", "today") else calendar["next"]
+
 
-    # fallback
-    return expirations[0]
+def select_expiry_ib(ticker: str, which: str = "front") -> str:
+    return util.run(select_expiry_ib_async(get_ib(), ticker, which))
@@ -0,0 +1,125 @@
+# helpers/spot_price.py
+
+import asyncio
+import math
+import threading
+
+from ib_insync import util
+
+from .contract_cache import get_contract_cache
+
+SPOT_DEADLINE = 3.0  # seconds to wait for a trade before falling back to the previous close
+
+
+def _valid(value):
+    return value is not None and not math.isnan(value) and value > 0
+
+
+class SpotPriceService:
+    """
+    One streaming market-data line per underlying, shared by every caller on
+    the same IB connection. A price is returned the moment a valid last trade
+    is on the ticker; the previous close is used only when none arrives
+    before the deadline.
+    """
+
+    def __init__(self, ib):
+        self.ib = ib
+        self._tickers = {}  # SYMBOL -> Ticker
+        self._opening = {}  # SYMBOL -> Task opening its line, shared by concurrent callers
+
+    async def _open_async(self, symbol: str):
+        contract = await get_contract_cache().underlying_async(self.ib, symbol)
+        ticker = self._tickers[symbol] = self.ib.reqMktData(contract, "", snapshot=False)
+        return ticker
+
+    async def subscribe_async(self, symbol: str):
+        symbol = symbol.upper()
+        ticker = self._tickers.get(symbol)
+        if ticker is not None:
+            return ticker
+        # Callers arriving while the contract is still resolving join the same
+        # task, so one symbol never gets two reqMktData lines
+        opening = self._opening.get(symbol)
+        if opening is None:
+            opening = self._opening[symbol] = asyncio.ensure_future(self._open_async(symbol))
+            opening.add_done_callback(lambda _: self._opening.pop(symbol, None))
+        # shielded: a caller giving up must not cancel the line for the others
+        return await asyncio.shield(opening)
+
+    async def _wait_for_last(self, ticker, deadline):
+        if _valid(ticker.last):
+            return True
+        arrived = asyncio.get_running_loop().create_future()
+
+        def on_update(t):
+            if not arrived.done() and _valid(t.last):
+                arrived.set_result(True)
+
+        ticker.updateEvent += on_update
+        try:
+            await asyncio.wait_for(arrived, deadline)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            ticker.updateEvent -= on_update
+        return True
+
+    async def get_async(self, symbol: str, deadline: float = SPOT_DEADLINE):
+        """Returns (price, source) where source is "live", "prevClose" or "unavailable"."""
+        ticker = await self.subscribe_async(symbol)
+        if await self._wait_for_last(ticker, deadline):
+            return ticker.last, "live"
+
+        # No trade in time: previous close from the stream, else a daily bar
+        if _valid(ticker.close):
+            return ticker.close, "prevClose"
+        bars = await self.ib.reqHistoricalDataAsync(
+            ticker.contract,
+            endDateTime="",
+            durationStr="2 D",
+            barSizeSetting="1 day",
+            whatToShow="TRADES",
+            useRTH=True,
+            formatDate=1,
+            keepUpToDate=False,
+            chartOptions=[]
+        )
+        if bars:
+            return bars[-1].close, "prevClose"
+        return None, "unavailable"
+
+    def get(self, symbol: str, deadline: float = SPOT_DEADLINE):
+        return util.run(self.get_async(symbol, deadline))
+
+    def close(self):
+        for opening in list(self._opening.values()):
+            opening.cancel()
+        if self.ib.isConnected():
+            for ticker in self._tickers.values():
+                self.ib.cancelMktData(ticker.contract)
+        self._tickers.clear()
+
+
+_services = {}
+_lock = threading.Lock()
+
+
+def _drop_service(ib):
+    """Forget the service of a connection that went away; its lines died with it"""
+    with _lock:
+        service = _services.get(id(ib))
+        if service is None or service.ib is not ib:
+            return
+        del _services[id(ib)]
+    service.close()
+
+
+def get_spot_service(ib) -> SpotPriceService:
+    """The spot service bound to this IB connection, dropped when it disconnects"""
+    with _lock:
+        service = _services.get(id(ib))
+        if service is None or service.ib is not ib:
+            service = _services[id(ib)] = SpotPriceService(ib)
+            ib.disconnectedEvent += lambda: _drop_service(ib)
+        return service
@@ -1,57 +1,333 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from mangum import Mangum
+import asyncio
+import json
 import os
-import boto3
+import re
+import sys
+import time
 
-from models import OptionLevelsResponse
-from services.option_service import build_option_levels
+from models import OptionLevelsResponse, BatchLevelsResponse
+from helpers.gex_index import get_gex_index, gex_point, flat_row, iso_timestamp, parse_timestamp
+from helpers.gex_stream import get_broadcaster, replay_events, MODES
+from helpers.levels_store import get_store
+from helpers.levels_encoding import MEDIA_TYPES, EncodingUnavailable, encode, etag, etag_matches, negotiate
+# services.option_service (and with it ib_insync) is imported by the live
+# endpoints on first use, so cold starts that only serve cached data skip it
 
-# DynamoDB table for cached data
-_dynamo = boto3.resource("dynamodb")
-_table = _dynamo.Table(os.environ.get("DDB_TABLE_NAME", "OptionLevels"))
+# Seconds a live request may take before answering 504
+REQUEST_DEADLINE_S = float(os.environ.get("REQUEST_DEADLINE_S", "20"))
+BATCH_MAX_TICKERS = int(os.environ.get("BATCH_MAX_TICKERS", "20"))
 
 
 app = FastAPI(title="Option Levels API")
 
+@app.on_event("startup")
+def start_prewarm():
+    # PREWARM_KEYS is read here so that without it the IB stack stays unloaded
+    if os.environ.get("PREWARM_KEYS"):
+        from services.prewarm import get_prewarmer
+        get_prewarmer().start()
+
+@app.on_event("startup")
+def check_gex_store():
+    # a DAY_STORE the API cannot read fails here, not on the first /gex request
+    get_gex_index()
+
+@app.on_event("shutdown")
+def close_ib_pool():
+    if "services.prewarm" in sys.modules:
+        from services.prewarm import get_prewarmer
+        get_prewarmer().stop()
+    if "helpers.ib_connection" in sys.modules:
+        from helpers.ib_connection import close_async_pool
+        close_async_pool()
+
 @app.get("/ping")
 def ping():
     return {"status": "ok"}
 
-@app.get("/api/option-levels", response_model=OptionLevelsResponse)
-def get_option_levels(
+@app.get("/api/prewarm")
+def prewarm_status():
+    """Hot set of the background pre-warmer and how long each snapshot stays servable"""
+    if "services.prewarm" not in sys.modules:
+        return {"enabled": False}
+    from services.prewarm import get_prewarmer
+    return {"enabled": True, **get_prewarmer().status()}
+
+@app.get(
+    "/api/option-levels",
+    response_model=OptionLevelsResponse,
+    responses={
+        200: {"content": {MEDIA_TYPES[f]: {} for f in ("columns", "msgpack", "arrow")},
+              "description": "format=json (default), or a compact format picked by format= or Accept"},
+        304: {"description": "Not modified: If-None-Match carried the body's ETag"},
+        406: {"description": "The requested format needs a package that is not installed"},
+    },
+)
+async def get_option_levels(
+        request: Request,
         ticker: str = Query(..., description="Ticker symbol, e.g. SPY"),
         expiry: str = Query("front", description="Expiry: 'front' for same-day, 'next' for next expiry, or exact YYYY-MM-DD"),
         center: float = Query(None, description="Center price (default = last close)"),
         width: int = Query(20, ge=1, description="Half-range in points"),
         greeks: bool = Query(False, description="Include implied vol & GEX"),
         source: str = Query("live", description="Data source: 'live' or 'cache'"),
-        date:   str = Query(None, description="YYYY-MM-DD for cached data")
+        date:   str = Query(None, description="YYYY-MM-DD for cached data"),
+        fmt:    str = Query(None, alias="format", description="json, columns, msgpack or arrow (default: from Accept, else json)")
 ):
+    try:
+        fmt = negotiate(fmt, request.headers.get("accept"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # Serve cached data if requested
     if source.lower() == "cache":
         if not date:
             raise HTTPException(status_code=400, detail="'date' is required when source=cache")
-        key = {"date": date, "ticker_exp": f"{ticker}#{expiry}"}
-        resp = _table.get_item(Key=key)
-        item = resp.get("Item")
-        if not item:
+        payload = await run_in_threadpool(get_store().get, date, ticker, expiry)
+        if not payload:
             raise HTTPException(status_code=404, detail="No cached data for given date/expiry")
-        return item["payload"]
+        return _encoded(request, payload, fmt)
 
 
-    result = build_option_levels(
-        ticker=ticker,
-        expiry_param=expiry,
-        center=center,
-        width=width,
-        include_greeks=greeks
-    )
+    from services.option_service import cached_option_levels_async
+    try:
+        result = await asyncio.wait_for(
+            cached_option_levels_async(
+                ticker=ticker,
+                expiry_param=expiry,
+                center=center,
+                width=width,
+                include_greeks=greeks
+            ),
+            REQUEST_DEADLINE_S
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"IB did not answer within {REQUEST_DEADLINE_S:g}s")
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     if not result.get("strikes"):
         raise HTTPException(status_code=404, detail="No strikes in range for given parameters")
 
-    return result
+    return _encoded(request, result, fmt)
+
+def _encoded(request, payload, fmt):
+    """
+    Payload in the negotiated format, bypassing response_model validation:
+    it was built here or stored by the fetcher, so it is already trusted.
+    format=json still has the response_model shape (levels_encoding.response).
+    Answers 304 when If-None-Match carries the body's ETag. The Age header
+    gives the seconds since the snapshot was fetched from IB.
+    """
+    try:
+        body = encode(payload, fmt)
+    except EncodingUnavailable as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    tag = etag(body)
+    headers = {"ETag": tag, "Vary": "Accept"}
+    if payload.get("fetched_at"):
+        headers["Age"] = str(max(0, int(time.time() - float(payload["fetched_at"]))))
+    if etag_matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+@app.get("/api/option-levels/batch", response_model=BatchLevelsResponse)
+async def get_option_levels_batch(
+        tickers: str = Query(..., description="Comma-separated tickers, e.g. SPY,QQQ,SPX"),
+        expiry: str = Query("front", description="One expiry for all tickers, or a comma-separated list matching tickers"),
+        width: int = Query(20, ge=1, description="Half-range in points"),
+        greeks: bool = Query(False, description="Include implied vol & GEX"),
+        source: str = Query("live", description="Data source: 'live' or 'cache'"),
+        date:   str = Query(None, description="YYYY-MM-DD for cached data")
+):
+    """Levels of several tickers at once, centred on spot; failures are reported per ticker"""
+    symbols = [t.strip() for t in tickers.split(",") if t.strip()]
+    expiries = [e.strip() for e in expiry.split(",")]
+    if not symbols or len(symbols) > BATCH_MAX_TICKERS:
+        raise HTTPException(status_code=400, detail=f"Give 1 to {BATCH_MAX_TICKERS} tickers")
+    if len(expiries) == 1:
+        expiries *= len(symbols)
+    elif len(expiries) != len(symbols):
+        raise HTTPException(status_code=400, detail="'expiry' needs one value or one per ticker")
+
+    started = time.perf_counter()
+    if source.lower() == "cache":
+        if not date:
+            raise HTTPException(status_code=400, detail="'date' is required when source=cache")
+        pairs = list(zip(symbols, expiries))
+        payloads = await run_in_threadpool(get_store().get_many, date, pairs)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        results = [{"ticker": t.upper(), "expiry_param": e, "elapsed_ms": elapsed_ms, "data": p,
+                    "status": "ok" if p else "missing"}
+                   for (t, e), p in zip(pairs, payloads)]
+        return {"elapsed_ms": elapsed_ms, "results": results}
+
+    from services.option_service import batch_option_levels_async
+    try:
+        results = await batch_option_levels_async(list(zip(symbols, expiries)), width, greeks,
+                                                  deadline=REQUEST_DEADLINE_S)
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"elapsed_ms": round((time.perf_counter() - started) * 1000, 1), "results": results}
+
+### GEX regimes (served from the pipeline CSVs) ###
+
+def _gex_symbol(symbol):
+    symbol = symbol.upper()
+    if not re.fullmatch(r"[A-Z0-9^.]{1,10}", symbol):
+        raise HTTPException(status_code=400, detail=f"Invalid symbol '{symbol}'")
+    return symbol
+
+def _gex_bounds(start, end):
+    try:
+        return (parse_timestamp(start) if start else None,
+                parse_timestamp(end) if end else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/gex/{symbol}/latest")
+def gex_latest(symbol: str):
+    symbol = _gex_symbol(symbol)
+    row = get_gex_index().latest(symbol)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"No GEX data for {symbol}")
+    return gex_point(symbol, row)
+
+@app.get("/gex/{symbol}/range")
+def gex_range(
+        symbol: str,
+        start: str = Query(..., description="e.g. 2025-01-17T09:30"),
+        end: str = Query(None, description="Inclusive; default = latest"),
+        limit: int = Query(None, ge=1, description="Keep only the last N points")
+):
+    symbol = _gex_symbol(symbol)
+    lo, hi = _gex_bounds(start, end)
+    rows = get_gex_index().range(symbol, lo, hi, limit)
+    points = [gex_point(symbol, r) for r in rows]
+    return {"symbol": symbol, "data": [dict(p["data"], timestamp=p["timestamp"]) for p in points]}
+
+@app.get("/gex/{symbol}/bulk")
+def gex_bulk(
+        symbol: str,
+        start: str = Query(None, description="e.g. 2025-01-17T09:30"),
+        end: str = Query(None, description="Inclusive; default = latest"),
+        limit: int = Query(None, ge=1, description="Keep only the last N rows")
+):
+    symbol = _gex_symbol(symbol)
+    lo, hi = _gex_bounds(start, end)
+    rows = get_gex_index().range(symbol, lo, hi, limit)
+    return {"symbol": symbol, "data": [flat_row(r) for r in rows]}
+
+### GEX push streams ###
+
+SSE_HEARTBEAT_S = 15.0
+SSE_REPLAY_LIMIT = 500   # rows replayed after Last-Event-ID on reconnect; more than that sends a reset first
+
+def _stream_mode(mode):
+    if mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(MODES)}")
+    return mode
+
+def _sse(event, ts, payload):
+    return f"event: {event}\nid: {ts}\ndata: {json.dumps(payload)}\n\n"
+
+@app.get("/gex/{symbol}/stream")
+async def gex_stream(
+        symbol: str,
+        request: Request,
+        mode: str = Query("rows", description="'rows' for every new regime row, 'transitions' for changes only")
+):
+    """
+    Server-Sent Events: the latest row first, then each new one as the pipeline
+    writes it. On reconnect with Last-Event-ID the rows since that id are
+    replayed as the mode would have sent them (rows, or transitions only); when
+    there are more than SSE_REPLAY_LIMIT, a "reset" event comes first and only
+    the last SSE_REPLAY_LIMIT follow (fetch the gap with /range).
+    """
+    symbol, mode = _gex_symbol(symbol), _stream_mode(mode)
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id:
+        try:
+            last_event_id = parse_timestamp(last_event_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Bad Last-Event-ID: {e}")
+    broadcaster = get_broadcaster()
+    subscriber = await broadcaster.subscribe(symbol, mode)
+
+    async def events():
+        replayed_to = None
+        try:
+            if last_event_id:
+                # one row more than the window tells whether anything before it is missing
+                rows = await run_in_threadpool(get_gex_index().range, symbol, last_event_id, None,
+                                               SSE_REPLAY_LIMIT + 1)
+                after = last_event_id
+                if len(rows) > SSE_REPLAY_LIMIT and rows[0]["timestamp"] != last_event_id:
+                    # the row before the window is not sent, it only seeds the transitions
+                    after = rows[-SSE_REPLAY_LIMIT - 1]["timestamp"]
+                    replay_from = iso_timestamp(rows[-SSE_REPLAY_LIMIT]["timestamp"])
+                    yield _sse("reset", last_event_id, {"symbol": symbol, "last_event_id": last_event_id,
+                                                        "replay_from": replay_from})
+                for event, ts, payload in replay_events(symbol, rows, mode, after):
+                    yield _sse(event, ts, payload)
+                # subscribed before the range was read: the queue may repeat replayed rows
+                replayed_to = rows[-1]["timestamp"] if rows else last_event_id
+            else:
+                latest = broadcaster.latest(symbol)
+                if latest is not None:
+                    yield _sse("snapshot", latest["timestamp"], gex_point(symbol, latest))
+            while True:
+                try:
+                    event, ts, payload = await subscriber.next(SSE_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if replayed_to is not None and ts <= replayed_to:
+                    continue
+                yield _sse(event, ts, payload)
+        finally:
+            broadcaster.unsubscribe(symbol, subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/gex/{symbol}/ws")
+async def gex_ws(websocket: WebSocket, symbol: str, mode: str = "rows"):
+    """WebSocket variant of /stream: JSON messages {"event", "timestamp", "data"}"""
+    symbol = symbol.upper()
+    if not re.fullmatch(r"[A-Z0-9^.]{1,10}", symbol) or mode not in MODES:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    broadcaster = get_broadcaster()
+    subscriber = await broadcaster.subscribe(symbol, mode)
+    receiver = asyncio.create_task(websocket.receive())
+    try:
+        latest = broadcaster.latest(symbol)
+        if latest is not None:
+            await websocket.send_json({"event": "snapshot", **gex_point(symbol, latest)})
+        while True:
+            getter = asyncio.create_task(subscriber.next())
+            await asyncio.wait({receiver, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver.done():
+                getter.cancel()
+                if receiver.result()["type"] == "websocket.disconnect":
+                    break
+                receiver = asyncio.create_task(websocket.receive())  # ignore client messages
+            if getter.done() and not getter.cancelled():
+                event, ts, payload = getter.result()
+                await websocket.send_json({"event": event, **payload})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        broadcaster.unsubscribe(symbol, subscriber)
 
 # Lambda handler for API Gateway
 api_handler = Mangum(app)
\ No newline at end of file
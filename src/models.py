@@ -14,3 +14,17 @@ class OptionLevelsResponse(BaseModel):
     center_price: float
     width: int
     strikes: List[StrikeLevel]
+    fetched_at: Optional[float] = None     # epoch seconds of the IB fetch; see the Age header
+
+class BatchLevelsItem(BaseModel):
+    ticker: str
+    expiry_param: str
+    status: str                 # ok | empty | timeout | error | missing (cache)
+    elapsed_ms: float
+    data_age_s: Optional[float] = None
+    data: Optional[OptionLevelsResponse] = None
+    error: Optional[str] = None
+
+class BatchLevelsResponse(BaseModel):
+    elapsed_ms: float
+    results: List[BatchLevelsItem]
@@ -1,29 +1,39 @@
-from typing import Dict
-from helpers.select_expiry_ib import select_expiry_ib
-from helpers.last_trade_or_prev_close import last_trade_or_prev_close
-from helpers.ib_option_fetcher import fetch_chain_ib
-from helpers.ib_connection import get_ib
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+from helpers.select_expiry_ib import select_expiry_ib, select_expiry_ib_async
+from helpers.last_trade_or_prev_close import last_trade_or_prev_close, last_trade_or_prev_close_async
+from helpers.ib_option_fetcher import fetch_chain_ib, fetch_chain_ib_async
+from helpers.ib_connection import get_ib, ib_session, ib_session_async
+from helpers.response_cache import TTLCache
+
+LEVELS_TTL_S = float(os.environ.get("LEVELS_TTL_S", "15"))
+LEVELS_CACHE_SIZE = int(os.environ.get("LEVELS_CACHE_SIZE", "256"))
+CENTER_BUCKET = float(os.environ.get("LEVELS_CENTER_BUCKET", "1"))  # points; centres in one bucket share an entry
+
+_levels_cache = TTLCache(LEVELS_TTL_S, LEVELS_CACHE_SIZE)
+_hot = {}   # cache key -> (valid_until epoch, payload), kept fresh by services.prewarm
+_serving = set()  # batch sessions still waiting for their pairs' loads before going back to the pool
 
 def build_option_levels(
         ticker: str,
         expiry_param: str,
         center: float,
-        width: int
+        width: int,
+        include_greeks: bool = False
 ) -> Dict:
-    exp = select_expiry_ib(ticker, expiry_param)
-    ib  = get_ib()
-    cp, _ = last_trade_or_prev_close(ib, ticker)
-    center_price = center or cp
-    raw = fetch_chain_ib(ticker, exp)
-    strikes = [s for s in raw if abs(s["strike"] - center_price) <= width]
-    strikes.sort(key=lambda x: x["strike"])
-    return {
-        "ticker": ticker,
-        "expiry": exp,
-        "center_price": center_price,
-        "width": width,
-        "strikes": strikes,
-    }
+    # one pooled connection per request; the helpers pick it up through get_ib()
+    with ib_session():
+        exp = select_expiry_ib(ticker, expiry_param)
+        ib  = get_ib()
+        cp, _ = last_trade_or_prev_close(ib, ticker)
+        center_price = center or cp
+        # only the strikes inside the window are requested from IB
+        strikes = fetch_chain_ib(ticker, exp, center=center_price, width=width,
+                                 include_greeks=include_greeks, spot=cp)
+    return _levels(ticker, exp, center_price, width, strikes)
     # exp = select_expiry(ticker, expiry_param)
     # cp  = center or get_latest_close(ticker)
     # df  = fetch_chain(ticker, exp)
@@ -44,3 +54,172 @@ def build_option_levels(
     #     "width": width,
     #     "strikes": strikes
     # }
+
+
+async def build_option_levels_async(
+        ticker: str,
+        expiry_param: str,
+        center: float,
+        width: int,
+        include_greeks: bool = False
+) -> Dict:
+    """build_option_levels on the async IB API; awaits a pooled connection instead of a thread"""
+    async with ib_session_async() as ib:
+        return await _build_on(ib, ticker, expiry_param, center, width, include_greeks)
+
+
+async def _build_on(ib, ticker, expiry_param, center, width, include_greeks) -> Dict:
+    exp = await select_expiry_ib_async(ib, ticker, expiry_param)
+    cp, _ = await last_trade_or_prev_close_async(ib, ticker)
+    center_price = center or cp
+    strikes = await fetch_chain_ib_async(ib, ticker, exp, center=center_price, width=width,
+                                         include_greeks=include_greeks, spot=cp)
+    return _levels(ticker, exp, center_price, width, strikes)
+
+
+def _levels(ticker, exp, center_price, width, strikes) -> Dict:
+    strikes.sort(key=lambda x: x["strike"])
+    return {
+        "ticker": ticker,
+        "expiry": exp,
+        "center_price": center_price,
+        "width": width,
+        "strikes": strikes,
+        "fetched_at": round(time.time(), 3),
+    }
+
+
+def _expiry_key(expiry_param: str) -> str:
+    """
+    Expiry part of the cache key. front/next resolve once per trading day
+    (see select_expiry_ib), so the alias plus today's date identifies the
+    resolved expiry without asking IB.
+    """
+    if expiry_param in ("front", "today"):
+        return "front@" + datetime.now().strftime("%Y%m%d")
+    if expiry_param in ("next", "tomorrow"):
+        return "next@" + datetime.now().strftime("%Y%m%d")
+    return expiry_param.replace("-", "")
+
+
+def bucket_center(center):
+    if not center:
+        return None
+    return round(center / CENTER_BUCKET) * CENTER_BUCKET
+
+
+async def cached_option_levels_async(
+        ticker: str,
+        expiry_param: str,
+        center: float,
+        width: int,
+        include_greeks: bool = False
+) -> Dict:
+    """Pre-warmed snapshot if there is one, else build_option_levels_async behind the TTL cache"""
+    ticker, center = ticker.upper(), bucket_center(center)
+    key = _cache_key(ticker, expiry_param, center, width, include_greeks)
+    return _hot_snapshot(key) or await _levels_cache.get_or_load_async(
+        key, lambda: build_option_levels_async(ticker, expiry_param, center, width, include_greeks))
+
+
+async def refresh_hot_levels_async(
+        ticker: str,
+        expiry_param: str,
+        width: int,
+        include_greeks: bool,
+        valid_until: float
+) -> Dict:
+    """
+    Fetch a spot-centred snapshot now and serve it to requests until
+    `valid_until` (epoch seconds). Joins a request's fetch of the same key
+    instead of starting a second one.
+    """
+    ticker = ticker.upper()
+    key = hot_levels_key(ticker, expiry_param, width, include_greeks)
+    payload = await _levels_cache.get_or_load_async(
+        key, lambda: build_option_levels_async(ticker, expiry_param, None, width, include_greeks), force=True)
+    _hot[key] = (valid_until, payload)
+    return payload
+
+
+def hot_levels_key(ticker: str, expiry_param: str, width: int, include_greeks: bool):
+    """Cache key a pre-warmed snapshot is served under; for front/next it changes with the date"""
+    return _cache_key(ticker.upper(), expiry_param, None, width, include_greeks)
+
+
+def _hot_snapshot(key):
+    entry = _hot.get(key)
+    if entry is not None and entry[0] > time.time():
+        return entry[1]
+    return None
+
+
+async def batch_option_levels_async(
+        items: List[Tuple[str, str]],
+        width: int,
+        include_greeks: bool = False,
+        deadline: float = None
+) -> List[Dict]:
+    """
+    Levels for several (ticker, expiry) pairs in one go. All pairs share one
+    pooled connection, and with it one expiry calendar and spot subscription
+    per underlying, and are fetched concurrently. Each pair gets its own
+    deadline and its own entry in the result, so one slow or failing symbol
+    does not fail the others.
+    """
+    items = [(t.upper(), e) for t, e in items]
+    keys = [_cache_key(t, e, None, width, include_greeks) for t, e in items]
+    hot = [_hot_snapshot(k) for k in keys]
+    loads = []  # cache loads started on this batch's connection
+
+    async def build(ib, ticker, expiry_param):
+        loads.append(asyncio.current_task())
+        return await _build_on(ib, ticker, expiry_param, None, width, include_greeks)
+
+    async def one(ib, ticker, expiry_param, key, hot_payload):
+        started = time.perf_counter()
+        entry = {"ticker": ticker, "expiry_param": expiry_param}
+        try:
+            entry["data"] = hot_payload or await asyncio.wait_for(
+                _levels_cache.get_or_load_async(key, lambda: build(ib, ticker, expiry_param)), deadline)
+            entry["data_age_s"] = round(time.time() - entry["data"]["fetched_at"], 1)
+            entry["status"] = "ok" if entry["data"]["strikes"] else "empty"
+        except asyncio.TimeoutError:
+            entry["status"], entry["error"] = "timeout", f"IB did not answer within {deadline:g}s"
+        except Exception as e:
+            entry["status"], entry["error"] = "error", str(e) or type(e).__name__
+        entry["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return entry
+
+    if all(hot):
+        # all pre-warmed: no connection needed
+        return await asyncio.gather(*(one(None, *item, k, h) for item, k, h in zip(items, keys, hot)))
+
+    async def serve(entries):
+        async with ib_session_async() as ib:
+            try:
+                results = await asyncio.gather(*(one(ib, *item, k, h) for item, k, h in zip(items, keys, hot)))
+                if not entries.done():  # cancelled when the caller went away
+                    entries.set_result(results)
+            finally:
+                # a timed-out pair's load keeps running on `ib` (shielded, so it still
+                # fills the cache): the connection goes back to the pool only after it
+                await asyncio.gather(*loads, return_exceptions=True)
+
+    def failed(task):
+        _serving.discard(task)
+        # always retrieved, so a failure nobody waits for any more is not logged as unhandled
+        error = None if task.cancelled() else task.exception()
+        if error is not None and not entries.done():
+            entries.set_exception(error)
+
+    # the response is ready at the deadline; the session is released in the background
+    entries = asyncio.get_running_loop().create_future()
+    serving = asyncio.ensure_future(serve(entries))
+    _serving.add(serving)
+    serving.add_done_callback(failed)
+    return await entries
+
+
+def _cache_key(ticker, expiry_param, center, width, include_greeks):
+    return ticker, _expiry_key(expiry_param), "spot" if center is None else center, width, include_greeks
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import time
+from datetime import datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+from services.option_service import hot_levels_key, refresh_hot_levels_async
+
+PREWARM_KEYS = os.environ.get("PREWARM_KEYS", "")          # e.g. "SPY:front,QQQ:front,SPX:next"; empty = off
+PREWARM_INTERVAL_S = float(os.environ.get("PREWARM_INTERVAL_S", "10"))
+PREWARM_WIDTH = int(os.environ.get("PREWARM_WIDTH", "20"))
+PREWARM_GREEKS = os.environ.get("PREWARM_GREEKS", "N").strip().upper().startswith("Y")
+PREWARM_MAX_AGE_S = float(os.environ.get("PREWARM_MAX_AGE_S", "60"))  # a snapshot is not served once older than this
+
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = dtime(9, 30)
+MARKET_CLOSE = dtime(16, 0)
+
+
+def parse_keys(value: str):
+    """'SPY:front,QQQ' -> [("SPY", "front"), ("QQQ", "front")]"""
+    keys = []
+    for part in value.split(","):
+        ticker, _, expiry = part.strip().partition(":")
+        if ticker:
+            keys.append((ticker.upper(), expiry.strip() or "front"))
+    return keys
+
+
+def market_open(now: datetime = None) -> bool:
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def next_open(now: datetime = None) -> datetime:
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    day = now.date() if now.time() < MARKET_OPEN else now.date() + timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return datetime.combine(day, MARKET_OPEN, tzinfo=MARKET_TZ)
+
+
+class Prewarmer:
+    """
+    Keeps a hot set of spot-centred (ticker, expiry) snapshots fresh so that
+    requests for them are answered without touching IB.
+
+    During market hours every key is refreshed each `interval` and a snapshot
+    is served for at most PREWARM_MAX_AGE_S; outside them a snapshot is
+    fetched once and served until the next open. Validity is tracked per
+    resolved cache key, so front/next are fetched again when the date in
+    their key rolls over at midnight. Refreshes go through the same
+    single-flight cache as requests, so a cold request and a refresh of one
+    key share a fetch.
+    """
+
+    def __init__(self, keys, interval=PREWARM_INTERVAL_S, width=PREWARM_WIDTH, include_greeks=PREWARM_GREEKS):
+        self.keys = list(keys)
+        self.interval = interval
+        self.width = width
+        self.include_greeks = include_greeks
+        self.valid_until = {}     # resolved cache key -> epoch seconds
+        self.errors = {}          # key -> last error
+        self._task = None
+
+    def _cache_key(self, key):
+        return hot_levels_key(*key, self.width, self.include_greeks)
+
+    async def _refresh(self, key, valid_until):
+        ticker, expiry = key
+        cache_key = self._cache_key(key)
+        try:
+            await refresh_hot_levels_async(ticker, expiry, self.width, self.include_greeks, valid_until)
+        except Exception as e:
+            self.errors[key] = f"{type(e).__name__}: {e}"
+            print(f"⚠️ Pre-warm {ticker} {expiry} failed: {self.errors[key]}")
+            return
+        self.errors.pop(key, None)
+        self.valid_until[cache_key] = valid_until
+
+    async def refresh_once(self):
+        now = time.time()
+        current = {k: self._cache_key(k) for k in self.keys}
+        # keys of a past date (front/next after midnight) are never asked for again
+        self.valid_until = {ck: v for ck, v in self.valid_until.items() if ck in current.values()}
+        if market_open():
+            due, valid_until = self.keys, now + PREWARM_MAX_AGE_S
+        else:
+            # closed: the last snapshot stays valid until the next open, or until its key's date changes
+            due = [k for k in self.keys if self.valid_until.get(current[k], 0) <= now]
+            valid_until = next_open().timestamp() + PREWARM_MAX_AGE_S
+        await asyncio.gather(*(self._refresh(k, valid_until) for k in due))
+
+    async def run(self):
+        print(f"🔥 Pre-warming {', '.join(f'{t}:{e}' for t, e in self.keys)} every {self.interval:g}s")
+        while True:
+            started = time.monotonic()
+            await self.refresh_once()
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def status(self) -> dict:
+        now = time.time()
+        return {
+            "market_open": market_open(),
+            "keys": [{"ticker": t, "expiry": e,
+                      "valid_for_s": round(max(0.0, self.valid_until.get(self._cache_key((t, e)), 0) - now), 1),
+                      "error": self.errors.get((t, e))} for t, e in self.keys],
+        }
+
+
+_prewarmer = None
+
+
+def get_prewarmer() -> Prewarmer:
+    """Pre-warmer of the serving event loop for PREWARM_KEYS"""
+    global _prewarmer
+    if _prewarmer is None:
+        _prewarmer = Prewarmer(parse_keys(PREWARM_KEYS))
+    return _prewarmer